@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+altered.py
+
+One command line entry point for every tool in this folder:
+
+    python altered.py <command> [arguments...]
+    altered <command> [arguments...]          (with altered.bat from the repo root on your PATH)
+
+Each command runs the matching script exactly as if it had been started on its
+own, with the same arguments and output. Nothing heavy is imported here, a
+command only pays for PIL/NumPy if its own script imports them, so byte
+shuffling jobs like savebit or swapbytes start as fast as Python itself.
+
+    python altered.py --list                  list the commands
+    python altered.py startup-check           time the startup of a light command against the budget
+"""
+
+import os
+import sys
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# command name -> (script, one line description)
+COMMANDS = {
+    'artifact-pack':      ('artifact_pack.py', 'Keep intermediate build products in one pack file'),
+    'asset-db':           ('asset_db.py', 'Index a ROM set into SQLite and query it'),
+    'asset-diff':         ('asset_diff.py', 'Compare the decoded assets of two ROM sets'),
+    'bitplanes':          ('bitplanes.py', 'Merge three bitplane ROMs into 4bpp linear chars'),
+    'combine-images':     ('combine_images.py', 'Combine PNG images side by side'),
+    'decode-streams':     ('decode_streams.py', 'Decode the RLE level map streams from code.bin'),
+    'dummy':              ('dummy.py', 'Create a file filled with one byte value'),
+    'encode-streams':     ('encode_streams.py', 'Encode level maps back into the ROM RLE streams'),
+    'expand-palettes':    ('expand_palettes.py', 'Expand 14 colour palettes to 16 colours'),
+    'generic-plotter':    ('generic_plotter.py', 'Plot a map of any width with the char set'),
+    'map-detect':         ('map_detect.py', 'Guess the width, tile mask and char offset of map data'),
+    'map-renderer':       ('map_renderer_offset.py', 'Render level map screens into wide PNGs'),
+    'merge-binaries':     ('merge-binaries.py', 'Interleave two binaries in N byte chunks'),
+    'misc-batch':         ('misc_batch.py', 'Build the misc title/beast/eyeball images from a manifest'),
+    'palette5bit-to-8bit': ('palette5bit_to_8bit.py', 'Convert System 16 palette words to 8-bit RGB'),
+    'palette-atlas':      ('palette_atlas.py', 'Render every char with its banked palette'),
+    'palette-image':      ('palette_image2.py', 'Draw a sheet of 14 colour palettes'),
+    'palette-sheet':      ('palette_sheet.py', 'Palette sheet with usage counts, unused palettes flagged'),
+    'panorama':           ('panorama.py', 'Stream many images into one captioned poster PNG'),
+    'png-import':         ('png_import.py', 'Import level images back into a level map'),
+    'pointer-scan':       ('pointer_scan.py', 'Find pointer and offset tables in code.bin'),
+    'rom-coverage':       ('rom_coverage.py', 'Map which ROM bytes are accounted for and the unknown gaps'),
+    'rom-view':           ('rom_view.py', 'Draw any byte range of a ROM as pixels'),
+    'savebit':            ('savebit.py', 'Save a byte range of a file'),
+    'scan-streams':       ('scan_streams.py', 'Scan code.bin for RLE level map streams'),
+    'scroll-export':      ('scroll_export.py', 'Export a level scrolling as APNG/GIF/raw frames'),
+    'sprite-atlas':       ('sprite_atlas_numbered.py', 'Build the sprite atlas with palette variations'),
+    'sprite-lines':       ('sprite_lines.py', 'Decode the sprite table with hardware line ends'),
+    'sprite-transform':   ('sprite_transform.py', 'Render flipped and zoomed variants of a sprite'),
+    'swapbytes':          ('swapbytes.py', 'Swap groups of bytes in place'),
+    'swapnybbles':        ('swapnybbles.py', 'Swap the nybbles of every byte'),
+    'tile-extractor':     ('tile_extractor.py', 'Extract header prefixed tile map blocks'),
+    'tiled-export':       ('tiled_export.py', 'Export a level as a Tiled TMX/JSON map and tileset'),
+    'tilemap-view':       ('tilemap_view.py', 'Play levels through a System 16 style tilemap'),
+}
+
+# Startup budget for a command that doesn't need PIL or NumPy
+STARTUP_BUDGET_MS = 50
+STARTUP_COMMAND = ['savebit']
+HEAVY_MODULES = ('PIL', 'numpy')
+
+
+def find_command(name):
+    """Accept the command name, the script name, or underscores for hyphens."""
+    name = name.lower()
+    if name.endswith('.py'):
+        name = name[:-3]
+    name = name.replace('_', '-')
+    if name in COMMANDS:
+        return name
+    for command, (script, _) in COMMANDS.items():
+        if script[:-3].replace('_', '-') == name:
+            return command
+    return None
+
+
+def run_command(command, args):
+    """
+    Run a tool script as __main__ with args, the same as `python script.py args`.
+    runpy puts the script in sys.modules['__main__'] while it runs, so functions
+    it hands to a process pool pickle by name and resolve in the workers under
+    both fork and spawn.
+    """
+    import runpy
+
+    script = os.path.join(TOOLS_DIR, COMMANDS[command][0])
+    sys.argv = [script] + list(args)
+    runpy.run_path(script, run_name='__main__')
+
+
+def print_commands():
+    print("Usage: altered <command> [arguments...]")
+    print("\nCommands:")
+    for command, (script, description) in sorted(COMMANDS.items()):
+        print(f"  {command:<20} {description} ({script})")
+    print("\n  startup-check        Measure startup time against the budget")
+    print("\nRun 'altered <command>' without arguments to see each tool's own usage.")
+
+
+def startup_check(runs=20):
+    """
+    Time `altered savebit` (which just prints its usage) in fresh interpreters,
+    compare the median against STARTUP_BUDGET_MS, and run it once more under
+    `python -X importtime` to show what was imported and check PIL/NumPy weren't.
+    """
+    import statistics
+    import subprocess
+    import time
+
+    cmd = [sys.executable, os.path.abspath(__file__)] + STARTUP_COMMAND
+    baseline_cmd = [sys.executable, '-c', 'pass']
+
+    def median_ms(argv):
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run(argv, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            times.append((time.perf_counter() - start) * 1000)
+        return statistics.median(times)
+
+    baseline = median_ms(baseline_cmd)
+    measured = median_ms(cmd)
+
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + cmd[1:],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if not fields[0].strip().isdigit():
+            continue  # column header
+        module = fields[2].rstrip()
+        depth = len(module) - len(module.lstrip()) - 1
+        imports.append((int(fields[1]), int(fields[0]), module.strip(), depth))
+
+    top_level = [entry for entry in imports if entry[3] == 0]
+    total_us = sum(entry[0] for entry in top_level)
+    heavy = [module for _, _, module, _ in imports if module.split('.')[0] in HEAVY_MODULES]
+
+    print(f"Startup check: altered {' '.join(STARTUP_COMMAND)} (median of {runs} runs)")
+    print(f"  python -c pass     {baseline:6.1f} ms")
+    print(f"  altered savebit    {measured:6.1f} ms   budget {STARTUP_BUDGET_MS} ms")
+    print(f"  -X importtime      {total_us / 1000:6.1f} ms in {len(imports)} imports, slowest top level:")
+    for cumulative_us, _, module, _ in sorted(top_level, reverse=True)[:5]:
+        print(f"      {cumulative_us / 1000:6.2f} ms  {module}")
+
+    ok = True
+    if heavy:
+        print(f"  FAIL: heavy modules imported: {', '.join(sorted(set(heavy)))}")
+        ok = False
+    if measured > STARTUP_BUDGET_MS:
+        print(f"  FAIL: over budget by {measured - STARTUP_BUDGET_MS:.1f} ms")
+        ok = False
+    if ok:
+        print("  OK")
+    return ok
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] in ('-h', '--help', '--list'):
+        print_commands()
+        sys.exit(0 if len(sys.argv) >= 2 else 1)
+
+    if sys.argv[1] == 'startup-check':
+        sys.exit(0 if startup_check() else 1)
+
+    command = find_command(sys.argv[1])
+    if command is None:
+        print(f"Error: unknown command '{sys.argv[1]}'")
+        print_commands()
+        sys.exit(1)
+
+    run_command(command, sys.argv[2:])
+
+
+if __name__ == '__main__':
+    main()
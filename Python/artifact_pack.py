@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+artifact_pack.py
+
+One file for the intermediate build products the batch file otherwise writes,
+reads back and deletes one by one (stream1low.bin..stream5high.bin,
+misc_images_*_WxH.bin, swapped_epr-*, sprites1-4.bin, the .pal files), so a
+whole build can be kept and looked at later.
+
+Layout:
+  · header - magic, version, offset and size of the current index (64 bytes)
+  · blobs  - raw data, each starting on a 64 byte boundary
+  · index  - JSON list of blobs: name, offset, size, dtype, shape and metadata
+             (e.g. width/height from a tile_extractor header, ROM offset)
+
+The pack is append-only: adding blobs writes them after everything already in
+the file, then a new index, and only then points the header at it, so a run
+that dies halfway leaves the previous index intact. Adding a name again
+replaces it in the index (the old data stays as dead space).
+
+Reads go through mmap: a blob is a memoryview, or a NumPy array if it has a
+dtype, straight onto the mapped file, nothing is copied.
+
+Usage:
+    python artifact_pack.py build Rom build.pack
+    python artifact_pack.py tiles build.pack code.bin misc_images 26c20 14
+    python artifact_pack.py add build.pack palettes_level1-3.pal --dtype u1 --shape 1024 3
+    python artifact_pack.py list build.pack
+    python artifact_pack.py extract build.pack level1map misc_images_1_40x28 --output-dir out
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+
+import numpy as np
+
+MAGIC = b'ABPK'
+VERSION = 1
+ALIGN = 64
+HEADER = struct.Struct('<4sHHQQ')      # magic, version, reserved, index offset, index size
+HEADER_SIZE = ALIGN
+
+
+def align(n: int) -> int:
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+# =============================================================================
+# Pack file
+# =============================================================================
+
+class ArtifactPack:
+    """
+    A pack file opened for reading ('r') or for reading and appending ('a',
+    created if missing).
+    - entries: name -> index entry (offset, size, dtype, shape, meta)
+    """
+
+    def __init__(self, path, mode='r'):
+        if mode not in ('r', 'a'):
+            raise ValueError(f"Mode must be 'r' or 'a', got '{mode}'")
+        self.path = path
+        self.mode = mode
+        self.entries = {}
+        self._map = None
+        self._old_maps = []
+        self._dirty = False
+
+        if mode == 'a' and not os.path.exists(path):
+            with open(path, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, VERSION, 0, 0, 0).ljust(HEADER_SIZE, b'\0'))
+        self._file = open(path, 'rb' if mode == 'r' else 'r+b')
+        try:
+            self._read_index()
+        except Exception:
+            self._file.close()
+            raise
+
+    def _read_index(self):
+        header = self._file.read(HEADER_SIZE)
+        if len(header) < HEADER.size:
+            raise ValueError(f"{self.path}: too short for a pack header")
+        magic, version, _, index_offset, index_size = HEADER.unpack_from(header)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path}: not an artifact pack")
+        if version != VERSION:
+            raise ValueError(f"{self.path}: pack version {version}, expected {VERSION}")
+        if index_size:
+            self._file.seek(index_offset)
+            index = json.loads(self._file.read(index_size).decode('utf-8'))
+            self.entries = {entry['name']: entry for entry in index['blobs']}
+
+    # -------------------------------------------------------------------------
+    # Reading
+    # -------------------------------------------------------------------------
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _mapped(self, end: int) -> mmap.mmap:
+        """The file mapping, remapped if blobs were added past its end."""
+        if self._map is None or len(self._map) < end:
+            if self._map is not None:
+                # views onto the old mapping may still be in use, keep it open
+                self._old_maps.append(self._map)
+            self._file.flush()
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def raw(self, name) -> memoryview:
+        """The bytes of a blob, as a read-only view onto the file."""
+        try:
+            entry = self.entries[name]
+        except KeyError:
+            raise KeyError(f"{self.path}: no blob named '{name}'") from None
+        start = entry['offset']
+        return memoryview(self._mapped(start + entry['size']))[start:start + entry['size']]
+
+    def __getitem__(self, name):
+        """A blob as a NumPy array view if it was stored with a dtype, else a memoryview."""
+        entry = self.entries.get(name)
+        data = self.raw(name)
+        if entry['dtype'] is None:
+            return data
+        return np.frombuffer(data, dtype=entry['dtype']).reshape(entry['shape'])
+
+    def meta(self, name) -> dict:
+        return self.entries[name]['meta']
+
+    # -------------------------------------------------------------------------
+    # Appending
+    # -------------------------------------------------------------------------
+
+    def add(self, name, data, dtype=None, shape=None, **meta):
+        """
+        Append a blob. `data` is anything with the buffer protocol; a NumPy
+        array keeps its dtype and shape unless they're given. Metadata must be
+        JSON values. The index is written on flush() / close().
+        """
+        if self.mode != 'a':
+            raise ValueError(f"{self.path}: opened read-only")
+        if isinstance(data, np.ndarray):
+            dtype = dtype or data.dtype.str
+            shape = shape or data.shape
+            data = np.ascontiguousarray(data)
+        data = memoryview(data).cast('B')
+        if dtype is not None:
+            dtype = np.dtype(dtype).str
+            shape = list(shape) if shape is not None else [len(data) // np.dtype(dtype).itemsize]
+            if int(np.prod(shape)) * np.dtype(dtype).itemsize != len(data):
+                raise ValueError(f"{name}: {len(data)} bytes don't fit dtype {dtype} shape {shape}")
+
+        self._file.seek(0, os.SEEK_END)
+        offset = align(self._file.tell())
+        self._file.seek(offset)
+        self._file.write(data)
+        self.entries[name] = {'name': name, 'offset': offset, 'size': len(data),
+                              'dtype': dtype, 'shape': shape, 'meta': meta}
+        self._dirty = True
+
+    def flush(self):
+        """Write the index after the blobs, then point the header at it."""
+        if not self._dirty:
+            return
+        index = json.dumps({'blobs': list(self.entries.values())}, separators=(',', ':')).encode('utf-8')
+        self._file.seek(0, os.SEEK_END)
+        index_offset = align(self._file.tell())
+        self._file.seek(index_offset)
+        self._file.write(index)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+        self._file.seek(0)
+        self._file.write(HEADER.pack(MAGIC, VERSION, 0, index_offset, len(index)))
+        self._file.flush()
+        self._dirty = False
+
+    def close(self):
+        if self._file.closed:
+            return
+        if self.mode == 'a':
+            self.flush()
+        for m in self._old_maps + [self._map]:
+            if m is None:
+                continue
+            try:
+                m.close()
+            except BufferError:
+                pass        # an array still points into it, it goes when that does
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# =============================================================================
+# Filling a pack
+# =============================================================================
+
+def add_rom_set(pack: ArtifactPack, rom_dir):
+    """The batch file's products for a ROM set: code, chars, sprites, level maps, palettes."""
+    from rom_set import (RomSet, CODE_ROMS, LEVEL_CHAR_OFFSET, LEVEL_PALETTE, LEVEL_PALETTES, BASE_PALETTE,
+                         SPRITE_PALETTES)
+    from decode_streams import LEVEL_OFFSETS
+    from tile_bank import CHAR_SIZE
+    from level_map import LevelMap
+
+    rom = RomSet.load(rom_dir)
+    pack.add('code', rom.code, source=CODE_ROMS[0])
+    pack.add('chars', rom.chars, chars=len(rom.chars) // CHAR_SIZE)
+    pack.add('sprites', rom.sprites)
+    for level, map_data in enumerate(rom.level_maps, start=1):
+        if map_data is None:
+            print(f"Level {level}: stream doesn't decode, skipped")
+            continue
+        words = LevelMap(map_data).words
+        pack.add(f'level{level}map', words, rom_offset=LEVEL_OFFSETS[level - 1], level=level,
+                 screens=len(words), char_offset=LEVEL_CHAR_OFFSET[level - 1], palette=LEVEL_PALETTE[level - 1])
+    for name, rgb in rom.palettes.items():
+        rgb = np.frombuffer(rgb, dtype=np.uint8).reshape(-1, 3)
+        if name in LEVEL_PALETTES:
+            # the base palette followed by the level's extra colours
+            pack.add(f'palettes_{name}', rgb, rom_offset=LEVEL_PALETTES[name][0], base_offset=BASE_PALETTE[0])
+        else:
+            pack.add(f'palettes_{name}', rgb, rom_offset=SPRITE_PALETTES[0])
+
+
+def add_tile_blocks(pack: ArtifactPack, code_data: bytes, base_name, start_offset: int, count: int):
+    """tile_extractor.py blocks as (height, width) big-endian word arrays, named like its files."""
+    from misc_batch import read_tile_blocks, HEADER_SIZE as BLOCK_HEADER_SIZE
+
+    offset = start_offset
+    for i, words in enumerate(read_tile_blocks(code_data, start_offset, count), start=1):
+        height, width = words.shape
+        name = f"{base_name}_{i}_{width}x{height}"
+        pack.add(name, words, rom_offset=offset, data_offset=offset + BLOCK_HEADER_SIZE,
+                 width=width, height=height)
+        offset += BLOCK_HEADER_SIZE + words.nbytes
+        print(f"Added {name} ({width}x{height}, {words.nbytes} bytes)")
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+def list_pack(pack: ArtifactPack):
+    total = sum(entry['size'] for entry in pack.entries.values())
+    width = max([len(name) for name in pack.entries] + [4])
+    print(f"{'name':<{width}}  {'offset':>8}  {'size':>8}  {'dtype':<5}  {'shape':<14}  meta")
+    for name, entry in pack.entries.items():
+        shape = 'x'.join(str(n) for n in entry['shape']) if entry['shape'] else ''
+        meta = ", ".join(f"{k}={v:X}h" if k.endswith('offset') and isinstance(v, int) else f"{k}={v}"
+                         for k, v in entry['meta'].items() if v is not None)
+        print(f"{name:<{width}}  {entry['offset']:>8X}  {entry['size']:>8}  {entry['dtype'] or '':<5}  "
+              f"{shape:<14}  {meta}")
+    print(f"{len(pack)} blobs, {total} bytes of data, file {os.path.getsize(pack.path)} bytes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Keep intermediate build products in one mmap-able pack file')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('list', help='List the blobs in a pack')
+    p.add_argument('pack', help='Pack file')
+
+    p = sub.add_parser('extract', help='Write blobs out as files')
+    p.add_argument('pack', help='Pack file')
+    p.add_argument('names', nargs='*', help='Blobs to extract (default: all)')
+    p.add_argument('--output-dir', default='.', help='Where to write them (default: .)')
+    p.add_argument('--ext', default='.bin', help='File extension added to blob names (default: .bin)')
+
+    p = sub.add_parser('add', help='Add a file as a blob')
+    p.add_argument('pack', help='Pack file (created if missing)')
+    p.add_argument('file', help='File to add')
+    p.add_argument('--name', help='Blob name (default: file name without extension)')
+    p.add_argument('--dtype', help='NumPy dtype of the data, e.g. u1, >u2, <u2')
+    p.add_argument('--shape', type=int, nargs='+', help='Array shape for --dtype')
+    p.add_argument('--rom-offset', help='ROM offset the data came from (hex)')
+
+    p = sub.add_parser('tiles', help='Add tile_extractor style blocks from a ROM')
+    p.add_argument('pack', help='Pack file (created if missing)')
+    p.add_argument('input_file', help='ROM file (code.bin)')
+    p.add_argument('base_name', help='Blob name prefix (e.g. misc_images)')
+    p.add_argument('start_offset', help='Offset of the first block header (hex)')
+    p.add_argument('count', type=int, help='Number of blocks')
+
+    p = sub.add_parser('build', help='Add everything built from a ROM set')
+    p.add_argument('rom_dir', help='Folder with the ROM dumps or the built files')
+    p.add_argument('pack', help='Pack file (created if missing)')
+
+    args = parser.parse_args()
+    try:
+        if args.command == 'list':
+            with ArtifactPack(args.pack) as pack:
+                list_pack(pack)
+
+        elif args.command == 'extract':
+            os.makedirs(args.output_dir, exist_ok=True)
+            with ArtifactPack(args.pack) as pack:
+                for name in args.names or list(pack):
+                    path = os.path.join(args.output_dir, name + args.ext)
+                    with open(path, 'wb') as f:
+                        f.write(pack.raw(name))
+                    print(f"Saved {path} ({pack.entries[name]['size']} bytes)")
+
+        elif args.command == 'add':
+            with open(args.file, 'rb') as f:
+                data = f.read()
+            name = args.name or os.path.splitext(os.path.basename(args.file))[0]
+            rom_offset = int(args.rom_offset, 16) if args.rom_offset else None
+            with ArtifactPack(args.pack, 'a') as pack:
+                pack.add(name, data, dtype=args.dtype, shape=args.shape, source=os.path.basename(args.file),
+                         rom_offset=rom_offset)
+            print(f"Added {name} ({len(data)} bytes) to {args.pack}")
+
+        elif args.command == 'tiles':
+            with open(args.input_file, 'rb') as f:
+                code_data = f.read()
+            with ArtifactPack(args.pack, 'a') as pack:
+                add_tile_blocks(pack, code_data, args.base_name, int(args.start_offset, 16), args.count)
+
+        elif args.command == 'build':
+            with ArtifactPack(args.pack, 'a') as pack:
+                add_rom_set(pack, args.rom_dir)
+                pack.flush()
+                list_pack(pack)
+
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+asset_db.py
+
+Indexes a ROM set into a SQLite database so questions like "which screens use
+char 1A40h?" or "which sprites use palette 09h?" are one query instead of a
+script that decodes everything again.
+
+Tables:
+  · chars           - number, blake2b hash, bank (which 0x20000 half of BG1.bin),
+                      palette group a bank 0 map word with that number gets, blank
+  · map_cells       - level, screen, x, y, map word, tile (word & 0x1FFF), char
+                      (number in BG1.bin after the level's char offset),
+                      palette group and priority bits (word >> 13)
+  · sprites         - number, width, height, master table entry, data offset, hash
+  · sprite_palettes - sprite, palette (from all_sprite_palettes.txt)
+  · palettes        - palette name, group, colour, r, g, b
+
+The ROM set is built in memory (rom_set.py), rows go in with executemany into
+a fresh file, and the indexes are created after the load.
+
+Usage:
+    python asset_db.py build Rom assets.db --palette-map all_sprite_palettes.txt
+    python asset_db.py screens assets.db 1A40
+    python asset_db.py palette assets.db 09
+    python asset_db.py level assets.db 4
+    python asset_db.py sql assets.db "SELECT level, COUNT(DISTINCT char) FROM map_cells GROUP BY level"
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+from rom_set import RomSet, LEVEL_CHAR_OFFSET
+from asset_diff import hash_chunks, sprite_hash, sprite_table
+from level_map import LevelMap, CHARS_PER_BANK
+from tile_bank import CHAR_SIZE, BANK_MASK, CHARS_PER_PALETTE, COLORS_PER_PALETTE
+from sprite_atlas_numbered import read_sprite_data, load_palette_assignments
+
+MASTER_TABLE_OFFSET = 0x255E0
+MASTER_ENTRY_SIZE = 6
+
+SCHEMA = """
+CREATE TABLE chars (
+    number INTEGER PRIMARY KEY,
+    hash BLOB NOT NULL,
+    bank INTEGER NOT NULL,
+    palette_group INTEGER NOT NULL,
+    blank INTEGER NOT NULL
+);
+CREATE TABLE map_cells (
+    level INTEGER NOT NULL,
+    screen INTEGER NOT NULL,
+    x INTEGER NOT NULL,
+    y INTEGER NOT NULL,
+    word INTEGER NOT NULL,
+    tile INTEGER NOT NULL,
+    char INTEGER NOT NULL,
+    palette_group INTEGER NOT NULL,
+    priority INTEGER NOT NULL
+);
+CREATE TABLE sprites (
+    number INTEGER PRIMARY KEY,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    table_offset INTEGER NOT NULL,
+    data_offset INTEGER NOT NULL,
+    hash BLOB NOT NULL
+);
+CREATE TABLE sprite_palettes (
+    sprite INTEGER NOT NULL,
+    palette INTEGER NOT NULL
+);
+CREATE TABLE palettes (
+    name TEXT NOT NULL,
+    palette_group INTEGER NOT NULL,
+    color INTEGER NOT NULL,
+    r INTEGER NOT NULL,
+    g INTEGER NOT NULL,
+    b INTEGER NOT NULL
+);
+"""
+
+# created once the rows are in, which is much faster than keeping them up to date
+INDEXES = """
+CREATE INDEX chars_hash ON chars (hash);
+CREATE INDEX map_cells_char ON map_cells (char, level, screen);
+CREATE INDEX map_cells_level ON map_cells (level, screen);
+CREATE INDEX map_cells_group ON map_cells (palette_group);
+CREATE INDEX sprites_hash ON sprites (hash);
+CREATE INDEX sprite_palettes_palette ON sprite_palettes (palette, sprite);
+CREATE INDEX sprite_palettes_sprite ON sprite_palettes (sprite);
+CREATE INDEX palettes_name ON palettes (name, palette_group);
+"""
+
+
+# =============================================================================
+# Rows
+# =============================================================================
+
+def char_rows(rom: RomSet):
+    hashes = hash_chunks(rom.chars, CHAR_SIZE)
+    raw = np.frombuffer(rom.chars, dtype=np.uint8, count=len(hashes) * CHAR_SIZE).reshape(-1, CHAR_SIZE)
+    numbers = np.arange(len(hashes))
+    bank = numbers // CHARS_PER_BANK
+    group = (numbers & BANK_MASK) // CHARS_PER_PALETTE
+    blank = ~raw.any(axis=1)
+    return zip(numbers.tolist(), hashes, bank.tolist(), group.tolist(), blank.tolist())
+
+
+def map_cell_rows(rom: RomSet):
+    for level, map_data in enumerate(rom.level_maps, start=1):
+        if map_data is None:
+            continue
+        level_map = LevelMap(map_data, LEVEL_CHAR_OFFSET[level - 1])
+        screen, y, x = np.indices(level_map.words.shape).reshape(3, -1)
+        columns = (np.full(screen.size, level), screen, x, y, level_map.words, level_map.tile,
+                   level_map.char, level_map.palette_group, level_map.priority)
+        columns = [np.ravel(column) for column in columns]
+        yield from zip(*(column.tolist() for column in columns))
+
+
+def sprite_rows(rom: RomSet):
+    for number, (xsize, ysize, data_offset) in sprite_table(rom).items():
+        data = read_sprite_data(rom.sprites, data_offset, xsize, ysize)
+        yield (number, xsize, ysize, MASTER_TABLE_OFFSET + number * MASTER_ENTRY_SIZE, data_offset,
+               sprite_hash(xsize, ysize, data))
+
+
+def palette_rows(rom: RomSet):
+    for name, rgb in rom.palettes.items():
+        colors = 16 if name == 'sprites' else COLORS_PER_PALETTE
+        values = np.frombuffer(rgb, dtype=np.uint8, count=len(rgb) // 3 * 3).reshape(-1, 3)
+        index = np.arange(len(values))
+        yield from zip([name] * len(values), (index // colors).tolist(), (index % colors).tolist(),
+                       *values.T.tolist())
+
+
+def build_database(rom_dir, db_file, palette_file=None):
+    """Index a ROM set into a new SQLite database at db_file (replaced if it exists)."""
+    start = time.perf_counter()
+    rom = RomSet.load(rom_dir)
+    palette_map = load_palette_assignments(palette_file) if palette_file else {}
+    loaded = time.perf_counter()
+
+    # build under a temporary name, so a failed run never leaves half a database
+    tmp_file = f"{db_file}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_file):
+        os.remove(tmp_file)
+    db = sqlite3.connect(tmp_file)
+    try:
+        db.execute("PRAGMA journal_mode = OFF")
+        db.execute("PRAGMA synchronous = OFF")
+        db.executescript(SCHEMA)
+        with db:
+            db.executemany("INSERT INTO chars VALUES (?, ?, ?, ?, ?)", char_rows(rom))
+            db.executemany("INSERT INTO map_cells VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", map_cell_rows(rom))
+            db.executemany("INSERT INTO sprites VALUES (?, ?, ?, ?, ?, ?)", sprite_rows(rom))
+            db.executemany("INSERT INTO sprite_palettes VALUES (?, ?)",
+                           ((sprite, palette) for sprite, palettes in sorted(palette_map.items())
+                            for palette in palettes))
+            db.executemany("INSERT INTO palettes VALUES (?, ?, ?, ?, ?, ?)", palette_rows(rom))
+        inserted = time.perf_counter()
+        db.executescript(INDEXES)
+        db.execute("ANALYZE")
+        counts = {table: db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                  for table in ('chars', 'map_cells', 'sprites', 'sprite_palettes', 'palettes')}
+    except BaseException:
+        db.close()
+        os.remove(tmp_file)
+        raise
+    db.close()
+    os.replace(tmp_file, db_file)
+
+    print(f"Indexed {rom.name} into {db_file}: " + ", ".join(f"{k} {v}" for k, v in counts.items()))
+    print(f"Decode {loaded - start:.2f} s, insert {inserted - loaded:.2f} s, "
+          f"indexes {time.perf_counter() - inserted:.2f} s")
+
+
+# =============================================================================
+# Queries
+# =============================================================================
+
+# name: (help, argument help, SQL with one parameter)
+QUERIES = {
+    'screens': ("Screens using a char", "char number (hex)",
+                "SELECT level, screen, COUNT(*) AS cells FROM map_cells WHERE char = ? "
+                "GROUP BY level, screen ORDER BY level, screen"),
+    'palette': ("Sprites using a sprite palette", "palette number (hex)",
+                "SELECT s.number, s.width, s.height, s.data_offset FROM sprite_palettes p "
+                "JOIN sprites s ON s.number = p.sprite WHERE p.palette = ? ORDER BY s.number"),
+    'level': ("Unique chars and tiles a level uses", "level (1-5)",
+              "SELECT COUNT(DISTINCT char) AS chars, COUNT(DISTINCT word) AS words, "
+              "COUNT(DISTINCT palette_group) AS palette_groups FROM map_cells WHERE level = ?"),
+}
+
+
+def run_query(db_file, sql, params=()):
+    if not os.path.exists(db_file):
+        raise FileNotFoundError(f"{db_file}: no such database, run 'build' first")
+    db = sqlite3.connect(db_file)
+    try:
+        start = time.perf_counter()
+        cursor = db.execute(sql, params)
+        rows = cursor.fetchall()
+        elapsed = time.perf_counter() - start
+        names = [column[0] for column in cursor.description or []]
+    finally:
+        db.close()
+
+    def format_value(name, value):
+        if isinstance(value, bytes):
+            return value.hex()
+        if isinstance(value, int) and name.endswith('offset'):
+            return f"{value:X}"
+        return str(value)
+
+    formatted = [[format_value(name, value) for name, value in zip(names, row)] for row in rows]
+    widths = [max([len(name)] + [len(row[i]) for row in formatted]) for i, name in enumerate(names)]
+    print("  ".join(name.rjust(width) for name, width in zip(names, widths)))
+    for row in formatted:
+        print("  ".join(value.rjust(width) for value, width in zip(row, widths)))
+    print(f"{len(rows)} rows in {elapsed * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Index a ROM set into SQLite and query it')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('build', help='Build (or rebuild) the database from a ROM set folder')
+    p.add_argument('rom_dir', help='Folder with the ROM dumps or the built files')
+    p.add_argument('db_file', help='SQLite database to write')
+    p.add_argument('--palette-map', help='Sprite palette assignments (all_sprite_palettes.txt)')
+
+    for name, (description, value_help, _) in QUERIES.items():
+        p = sub.add_parser(name, help=description)
+        p.add_argument('db_file', help='SQLite database')
+        p.add_argument('value', help=value_help)
+
+    p = sub.add_parser('sql', help='Run any SQL query')
+    p.add_argument('db_file', help='SQLite database')
+    p.add_argument('query', help='SQL to run')
+
+    args = parser.parse_args()
+    try:
+        if args.command == 'build':
+            build_database(args.rom_dir, args.db_file, args.palette_map)
+        elif args.command == 'sql':
+            run_query(args.db_file, args.query)
+        else:
+            value = int(args.value, 10 if args.command == 'level' else 16)
+            run_query(args.db_file, QUERIES[args.command][2], (value,))
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+asset_diff.py
+
+Compares two ROM sets (board revisions, bootlegs, hacks) asset by asset
+instead of rendering both and diffing PNGs by eye.
+
+Both sets are built in memory with rom_set.py, then every decoded asset gets a
+content hash (blake2b, 8 bytes):
+  · chars     - each 8x8 char of BG1.bin
+  · screens   - each 64x32 screen of each level map
+  · sprites   - each sprite bitmap (with its size) from the master table at 0x255E0
+  · palettes  - each 8 colour group of the level palettes, each 16 colour sprite palette
+Assets are matched by number; the report lists what was added, removed and
+changed, and for a changed one whether the new contents exist elsewhere in
+the old set (moved). Only changed assets are ever rendered (--render).
+
+Usage:
+    python asset_diff.py Rom Rom_bootleg
+    python asset_diff.py Rom Rom_bootleg --render diff_out --palette-map all_sprite_palettes.txt
+"""
+
+import argparse
+import hashlib
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+from rom_set import RomSet, LEVEL_PALETTE, LEVEL_CHAR_OFFSET
+from tile_bank import TileBank, decode_chars, build_palette_lut, CHAR_SIZE, COLORS_PER_PALETTE
+from level_map import LevelMap, SCREEN_BYTES
+from sprite_atlas_numbered import (get_sprite_info, read_sprite_data, read_palette, sprite_rgba,
+                                   load_palette_assignments)
+from image_writer import ImageWriter
+
+SPRITE_COUNT = 648          # sprites 0-287h, as in sprite_atlas_numbered.py
+DIGEST_SIZE = 8
+
+DIFF_COLOR = (255, 0, 0, 255)
+CHAR_SCALE = 4
+
+
+# =============================================================================
+# Hashing
+# =============================================================================
+
+def hash_chunks(data: bytes, size: int) -> list:
+    """Digest of every whole `size` byte chunk of data."""
+    view = memoryview(data)
+    return [hashlib.blake2b(view[i:i + size], digest_size=DIGEST_SIZE).digest()
+            for i in range(0, len(data) // size * size, size)]
+
+
+def sprite_hash(xsize: int, ysize: int, data: bytes) -> bytes:
+    """Digest of a sprite bitmap together with its size."""
+    return hashlib.blake2b(struct.pack('>HH', xsize, ysize) + data, digest_size=DIGEST_SIZE).digest()
+
+
+def sprite_table(rom: RomSet) -> dict:
+    """sprite number -> (xsize, ysize, data_offset) for every sprite with data."""
+    sprites = {}
+    for sprite_num in range(SPRITE_COUNT):
+        try:
+            xsize, ysize, data_offset = get_sprite_info(rom.code, sprite_num)
+        except IndexError:
+            continue
+        size = (xsize * ysize + 1) // 2
+        if xsize > 0 and ysize > 0 and data_offset + size <= len(rom.sprites):
+            sprites[sprite_num] = (xsize, ysize, data_offset)
+    return sprites
+
+
+def asset_hashes(rom: RomSet) -> dict:
+    """
+    Hash every asset of a ROM set.
+    Returns {kind: {key: digest}} where key is the asset number (or a tuple).
+    """
+    hashes = {'chars': dict(enumerate(hash_chunks(rom.chars, CHAR_SIZE)))}
+
+    screens = {}
+    for level, map_data in enumerate(rom.level_maps, start=1):
+        if map_data is not None:
+            for screen, digest in enumerate(hash_chunks(map_data, SCREEN_BYTES)):
+                screens[(level, screen)] = digest
+    hashes['screens'] = screens
+
+    sprites = {}
+    for sprite_num, (xsize, ysize, data_offset) in sprite_table(rom).items():
+        data = read_sprite_data(rom.sprites, data_offset, xsize, ysize)
+        sprites[sprite_num] = sprite_hash(xsize, ysize, data)
+    hashes['sprites'] = sprites
+
+    palettes = {}
+    for name, rgb in rom.palettes.items():
+        colors = 16 if name == 'sprites' else COLORS_PER_PALETTE
+        for group, digest in enumerate(hash_chunks(rgb, colors * 3)):
+            palettes[(name, group)] = digest
+    hashes['palettes'] = palettes
+    return hashes
+
+
+def compare(old: dict, new: dict) -> dict:
+    """Added, removed, changed and moved keys between two {key: digest} dicts."""
+    old_by_digest = {}
+    for key, digest in old.items():
+        old_by_digest.setdefault(digest, key)
+
+    changed = [key for key in old if key in new and old[key] != new[key]]
+    return {
+        'added': [key for key in new if key not in old],
+        'removed': [key for key in old if key not in new],
+        'changed': changed,
+        'moved': {key: old_by_digest[new[key]] for key in changed if new[key] in old_by_digest},
+    }
+
+
+# =============================================================================
+# Rendering the changes
+# =============================================================================
+
+def diff_overlay(changed: np.ndarray, new_rgba: np.ndarray) -> np.ndarray:
+    """The new image faded, with every changed pixel (bool mask) in DIFF_COLOR."""
+    overlay = new_rgba.copy()
+    overlay[..., 3] //= 4
+    overlay[changed] = DIFF_COLOR
+    return overlay
+
+
+def render_chars(old: RomSet, new: RomSet, numbers: list) -> np.ndarray:
+    """One row per char: old, new and changed pixels, as grey levels scaled up."""
+    old_tiles, new_tiles = decode_chars(old.chars), decode_chars(new.chars)
+    grey = np.zeros((16, 4), dtype=np.uint8)
+    grey[:, :3] = (np.arange(16) * 255 // 7).clip(0, 255)[:, None]
+    grey[:, 3] = 255
+
+    rows = []
+    for number in numbers:
+        a, b = old_tiles[number], new_tiles[number]
+        cells = [grey[a], grey[b], diff_overlay(a != b, grey[b])]
+        row = np.concatenate([np.pad(cell, ((1, 1), (1, 1), (0, 0))) for cell in cells], axis=1)
+        rows.append(row)
+    sheet = np.concatenate(rows)
+    return sheet.repeat(CHAR_SCALE, axis=0).repeat(CHAR_SCALE, axis=1)
+
+
+def render_screen(rom: RomSet, banks: dict, level: int, screen: int) -> (np.ndarray, np.ndarray):
+    """(indexed pixels, RGBA) of one screen, as map_renderer_offset.py draws it."""
+    grid = LevelMap(rom.level_maps[level - 1]).words[screen]
+    char_offset = LEVEL_CHAR_OFFSET[level - 1]
+    if char_offset not in banks:
+        banks[char_offset] = TileBank(decode_chars(rom.chars)[char_offset // CHAR_SIZE:], char_offset)
+    pixels, _ = banks[char_offset].render_indexed(grid)
+    return pixels, build_palette_lut(rom.palettes[LEVEL_PALETTE[level - 1]])[pixels]
+
+
+def render_sprite(rom: RomSet, table: dict, sprite_num: int, palette_num: int) -> np.ndarray:
+    xsize, ysize, data_offset = table[sprite_num]
+    data = read_sprite_data(rom.sprites, data_offset, xsize, ysize)
+    return sprite_rgba(data, read_palette(rom.palettes['sprites'], palette_num), xsize, ysize)
+
+
+def side_by_side(images: list, gap=4) -> np.ndarray:
+    """Images next to each other, top aligned, on a transparent background."""
+    height = max(image.shape[0] for image in images)
+    width = sum(image.shape[1] for image in images) + gap * (len(images) - 1)
+    out = np.zeros((height, width, 4), dtype=np.uint8)
+    x = 0
+    for image in images:
+        out[:image.shape[0], x:x + image.shape[1]] = image
+        x += image.shape[1] + gap
+    return out
+
+
+def render_palettes(old: RomSet, new: RomSet, keys: list, swatch=16) -> np.ndarray:
+    """One row per palette group: old colours, then new colours."""
+    rows = []
+    for name, group in keys:
+        colors = 16 if name == 'sprites' else COLORS_PER_PALETTE
+        cells = []
+        for rom in (old, new):
+            rgb = np.frombuffer(rom.palettes[name], dtype=np.uint8, count=colors * 3,
+                                offset=group * colors * 3).reshape(1, colors, 3)
+            cells.append(np.concatenate((rgb, np.full((1, colors, 1), 255, np.uint8)), axis=2))
+        rows.append(side_by_side([cell.repeat(swatch, axis=0).repeat(swatch, axis=1) for cell in cells], swatch))
+    width = max(row.shape[1] for row in rows)
+    return np.concatenate([np.pad(row, ((0, 0), (0, width - row.shape[1]), (0, 0))) for row in rows])
+
+
+def render_changes(old: RomSet, new: RomSet, results: dict, output_dir: str, palette_map: dict, limit: int):
+    """Write images of the changed assets only."""
+    os.makedirs(output_dir, exist_ok=True)
+    written = []
+    with ImageWriter() as writer:
+        chars = results['chars']['changed'][:limit]
+        if chars:
+            written.append(writer.save(render_chars(old, new, chars), os.path.join(output_dir, 'chars.png')))
+
+        old_banks, new_banks = {}, {}
+        for level, screen in results['screens']['changed'][:limit]:
+            old_pixels, old_rgba = render_screen(old, old_banks, level, screen)
+            new_pixels, new_rgba = render_screen(new, new_banks, level, screen)
+            image = np.concatenate((old_rgba, new_rgba, diff_overlay(old_pixels != new_pixels, new_rgba)))
+            written.append(writer.save(image, os.path.join(output_dir, f"level{level}_screen{screen:02d}.png")))
+
+        old_table, new_table = sprite_table(old), sprite_table(new)
+        for sprite_num in results['sprites']['changed'][:limit]:
+            palette_num = palette_map.get(sprite_num, [0])[0]
+            old_rgba = render_sprite(old, old_table, sprite_num, palette_num)
+            new_rgba = render_sprite(new, new_table, sprite_num, palette_num)
+            images = [old_rgba, new_rgba]
+            if old_rgba.shape == new_rgba.shape:
+                images.append(diff_overlay((old_rgba != new_rgba).any(axis=2), new_rgba))
+            written.append(writer.save(side_by_side(images), os.path.join(output_dir, f"sprite_{sprite_num:03X}.png")))
+
+        palettes = results['palettes']['changed'][:limit]
+        if palettes:
+            written.append(writer.save(render_palettes(old, new, palettes), os.path.join(output_dir, 'palettes.png')))
+    return written
+
+
+# =============================================================================
+# Report
+# =============================================================================
+
+def format_key(kind, key):
+    if kind == 'screens':
+        return f"level {key[0]} screen {key[1]}"
+    if kind == 'palettes':
+        return f"{key[0]} #{key[1]:02X}"
+    return f"{key:X}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the decoded assets of two ROM sets')
+    parser.add_argument('old_set', help='Folder with the first ROM set (dumps or built files)')
+    parser.add_argument('new_set', help='Folder with the second ROM set')
+    parser.add_argument('--render', metavar='DIR', help='Write images of the changed assets to DIR')
+    parser.add_argument('--palette-map', help='Sprite palette assignments (all_sprite_palettes.txt) for rendering')
+    parser.add_argument('--list', type=int, default=20, help='Assets listed per kind and change (default: 20)')
+    parser.add_argument('--limit', type=int, default=256, help='Most changed assets rendered per kind (default: 256)')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        old, new = RomSet.load(args.old_set), RomSet.load(args.new_set)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    loaded = time.perf_counter()
+
+    old_hashes, new_hashes = asset_hashes(old), asset_hashes(new)
+    results = {kind: compare(old_hashes[kind], new_hashes[kind]) for kind in old_hashes}
+    hashed = time.perf_counter()
+
+    print(f"{'Asset':<9}  {'Old':>6}  {'New':>6}  {'Same':>6}  {'Changed':>7}  {'Moved':>5}  {'Added':>5}  {'Removed':>7}")
+    for kind, result in results.items():
+        same = len(old_hashes[kind]) - len(result['changed']) - len(result['removed'])
+        print(f"{kind:<9}  {len(old_hashes[kind]):>6}  {len(new_hashes[kind]):>6}  {same:>6}  "
+              f"{len(result['changed']):>7}  {len(result['moved']):>5}  {len(result['added']):>5}  "
+              f"{len(result['removed']):>7}")
+
+    for kind, result in results.items():
+        for change in ('changed', 'added', 'removed'):
+            keys = result[change]
+            if not keys:
+                continue
+            shown = []
+            for key in keys[:args.list]:
+                text = format_key(kind, key)
+                if key in result['moved']:
+                    text += f" (= old {format_key(kind, result['moved'][key])})"
+                shown.append(text)
+            more = f", ... {len(keys) - args.list} more" if len(keys) > args.list else ""
+            print(f"\n{kind} {change}: {', '.join(shown)}{more}")
+
+    if args.render:
+        palette_map = load_palette_assignments(args.palette_map) if args.palette_map else {}
+        written = render_changes(old, new, results, args.render, palette_map, args.limit)
+        print(f"\nRendered {len(written)} images of changed assets to {args.render}")
+
+    print(f"\nLoad {loaded - start:.2f} s, hash and compare {hashed - loaded:.2f} s, "
+          f"total {time.perf_counter() - start:.2f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -170,7 +170,11 @@ def main():
 
         # Decode high‐bitplane from immediately after the low data
         high_start = consumed_bytes
-        high_decoded, _ = decode_high_plane(rom_data, high_start)
+        high_decoded, high_end = decode_high_plane(rom_data, high_start)
+        if os.environ.get('ALTERED_COVERAGE'):
+            from rom_coverage import record
+            record(input_path, level_offset, high_start, f"stream{idx}low.bin")
+            record(input_path, high_start, high_end, f"stream{idx}high.bin")
 
         # Write outputs to files
         low_fname = f"stream{idx}low.bin"
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+encode_streams.py
+
+The other direction of decode_streams.py: packs a level map (levelNmap.bin) back
+into the two RLE streams the 68000 code decodes, so edited maps can be put back
+into code.bin.
+
+  · low plane  (first stream)  - pairs [run_length, value], value written run_length+1 times
+  · high plane (second stream) - nonzero bytes are literals, 0 is followed by a count:
+                                 [0, 0] is one zero, [0, n] is n+1 zeros
+
+levelNmap.bin is merge-binaries of streamNhigh.bin and streamNlow.bin, so the
+even bytes of the map are the high plane stream and the odd bytes the low plane.
+
+Both encoders give the smallest possible stream. Every token only ever repeats
+one value (low plane) or one run of zeros (high plane) and covers at most 256
+bytes for a fixed cost, so a run of L equal bytes can't take fewer than
+ceil(L / 256) tokens, and runs of different values can't share a token. The
+shortest-path DP over positions therefore always picks full 256 byte tokens
+and a remainder, which is what's computed here, over all runs at once.
+
+Usage:
+    python encode_streams.py encode level1map.bin level1_streams.bin
+    python encode_streams.py inject code.bin 1 level1map.bin code_modified.bin
+    python encode_streams.py verify code.bin [--repeat 20]
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from decode_streams import decode_low_plane, decode_high_plane, LEVEL_OFFSETS, NUM_ENTRIES, INITIAL_D1
+
+MAX_RUN = 256              # a count byte covers 1..256 writes
+STREAM_SIZE = INITIAL_D1 + 1
+
+
+# =============================================================================
+# Encoders
+# =============================================================================
+
+def _runs(values: np.ndarray) -> (np.ndarray, np.ndarray):
+    """Start index and length of every run of equal values."""
+    starts = np.flatnonzero(np.concatenate(([True], values[1:] != values[:-1])))
+    lengths = np.diff(np.append(starts, len(values)))
+    return starts, lengths
+
+
+def _split_runs(starts: np.ndarray, lengths: np.ndarray) -> (np.ndarray, np.ndarray):
+    """Cut runs into chunks of at most MAX_RUN: (chunk_starts, chunk_lengths)."""
+    n_chunks = (lengths + MAX_RUN - 1) // MAX_RUN
+    run_of_chunk = np.repeat(np.arange(len(starts)), n_chunks)
+    chunk_in_run = np.arange(len(run_of_chunk)) - np.repeat(np.cumsum(n_chunks) - n_chunks, n_chunks)
+    chunk_starts = starts[run_of_chunk] + chunk_in_run * MAX_RUN
+    chunk_lengths = np.minimum(lengths[run_of_chunk] - chunk_in_run * MAX_RUN, MAX_RUN)
+    return chunk_starts, chunk_lengths
+
+
+def encode_low_plane(decoded: bytes) -> bytes:
+    """
+    Encode bytes as [run_length, value] pairs for the routine at 0x0016BE.
+    Returns the shortest stream that decode_low_plane turns back into `decoded`.
+    """
+    values = np.frombuffer(decoded, dtype=np.uint8)
+    if len(values) == 0:
+        return b''
+    chunk_starts, chunk_lengths = _split_runs(*_runs(values))
+
+    out = np.empty((len(chunk_starts), 2), dtype=np.uint8)
+    out[:, 0] = chunk_lengths - 1
+    out[:, 1] = values[chunk_starts]
+    return out.tobytes()
+
+
+def encode_high_plane(decoded: bytes) -> bytes:
+    """
+    Encode bytes as literals and zero runs for the routine at 0x0016DE.
+    Returns the shortest stream that decode_high_plane turns back into `decoded`.
+    """
+    values = np.frombuffer(decoded, dtype=np.uint8)
+    if len(values) == 0:
+        return b''
+
+    # zero runs become [0, n-1] tokens of up to 256 zeros, everything else is a literal
+    starts, lengths = _runs(values == 0)
+    zero_runs = values[starts] == 0
+    zero_starts, zero_lengths = _split_runs(starts[zero_runs], lengths[zero_runs])
+    literal_starts = np.flatnonzero(values)
+
+    # tokens in stream order, 2 bytes for zero runs and 1 for literals
+    token_starts = np.concatenate((zero_starts, literal_starts))
+    order = np.argsort(token_starts, kind='stable')
+    is_zero_run = np.concatenate((np.ones(len(zero_starts), bool), np.zeros(len(literal_starts), bool)))[order]
+    first_byte = np.concatenate((np.zeros(len(zero_starts), np.uint8), values[literal_starts]))[order]
+    second_byte = (zero_lengths - 1).astype(np.uint8)
+
+    sizes = np.where(is_zero_run, 2, 1)
+    offsets = np.cumsum(sizes) - sizes
+    out = np.empty(sizes.sum(), dtype=np.uint8)
+    out[offsets] = first_byte
+    out[offsets[is_zero_run] + 1] = second_byte
+    return out.tobytes()
+
+
+def split_level_map(map_data: bytes) -> (bytes, bytes):
+    """Undo merge-binaries: (low plane stream, high plane stream) of a levelNmap.bin."""
+    if len(map_data) != STREAM_SIZE * 2:
+        raise ValueError(f"Level map must be {STREAM_SIZE * 2} bytes, got {len(map_data)}")
+    return map_data[1::2], map_data[0::2]
+
+
+def encode_level(map_data: bytes) -> (bytes, bytes):
+    """Encode a whole level map: (low plane stream, high plane stream), stored back to back in ROM."""
+    low, high = split_level_map(map_data)
+    return encode_low_plane(low), encode_high_plane(high)
+
+
+def decode_level(rom_data: bytes, offset: int) -> (bytes, bytes, int):
+    """Decode a level as decode_streams.py does: (low, high, bytes consumed from offset)."""
+    low, high_start = decode_low_plane(rom_data, offset)
+    high, end = decode_high_plane(rom_data, high_start)
+    return low, high, end - offset
+
+
+# =============================================================================
+# Commands
+# =============================================================================
+
+def cmd_encode(args):
+    with open(args.map_bin, 'rb') as f:
+        map_data = f.read()
+    low_stream, high_stream = encode_level(map_data)
+    with open(args.output_bin, 'wb') as f:
+        f.write(low_stream + high_stream)
+    print(f"Encoded {args.map_bin}: low {len(low_stream)} bytes + high {len(high_stream)} bytes "
+          f"= {len(low_stream) + len(high_stream)} bytes written to '{args.output_bin}'")
+
+
+def cmd_inject(args):
+    with open(args.code_bin, 'rb') as f:
+        rom_data = bytearray(f.read())
+    with open(args.map_bin, 'rb') as f:
+        map_data = f.read()
+
+    if not 1 <= args.level <= NUM_ENTRIES:
+        print(f"Error: level must be 1-{NUM_ENTRIES}")
+        sys.exit(1)
+    level_offset = LEVEL_OFFSETS[args.level - 1]
+
+    # the slot is what the original streams occupy, anything after may be other data
+    _, _, slot_size = decode_level(rom_data, level_offset)
+    low_stream, high_stream = encode_level(map_data)
+    packed = low_stream + high_stream
+    if len(packed) > slot_size:
+        print(f"Error: encoded level is {len(packed)} bytes, original slot at {hex(level_offset)} "
+              f"is only {slot_size} bytes")
+        sys.exit(1)
+
+    rom_data[level_offset:level_offset + len(packed)] = packed
+
+    # make sure the game's decoder will read back exactly this map
+    low, high, _ = decode_level(rom_data, level_offset)
+    if (low, high) != split_level_map(map_data):
+        print("Error: round trip through the decoder failed")
+        sys.exit(1)
+
+    with open(args.output_bin, 'wb') as f:
+        f.write(rom_data)
+    print(f"Level {args.level}: {len(packed)} of {slot_size} bytes used at {hex(level_offset)}, "
+          f"saved to '{args.output_bin}'")
+
+
+def cmd_verify(args):
+    with open(args.code_bin, 'rb') as f:
+        rom_data = f.read()
+
+    print(f"{'Level':>5}  {'Offset':>8}  {'ROM low':>7}  {'ROM high':>8}  {'ROM total':>9}  "
+          f"{'New low':>7}  {'New high':>8}  {'New total':>9}  {'Saved':>6}  Round trip")
+    total_decoded = 0
+    total_encode_time = 0.0
+    all_ok = True
+
+    for idx, level_offset in enumerate(LEVEL_OFFSETS[:NUM_ENTRIES], start=1):
+        if level_offset >= len(rom_data):
+            print(f"Warning: Level {idx} offset {hex(level_offset)} is beyond file size. Skipping.")
+            continue
+
+        low, low_end = decode_low_plane(rom_data, level_offset)
+        high, high_end = decode_high_plane(rom_data, low_end)
+        rom_low, rom_high = low_end - level_offset, high_end - low_end
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            new_low = encode_low_plane(low)
+            new_high = encode_high_plane(high)
+        total_encode_time += time.perf_counter() - start
+        total_decoded += (len(low) + len(high)) * args.repeat
+
+        # decode the new streams with the original routines, they must match byte for byte
+        packed = new_low + new_high
+        check_low, check_end = decode_low_plane(packed, 0)
+        check_high, _ = decode_high_plane(packed, check_end)
+        ok = check_low == low and check_high == high and check_end == len(new_low)
+        all_ok &= ok
+
+        new_total = len(new_low) + len(new_high)
+        print(f"{idx:>5}  {level_offset:>8X}  {rom_low:>7}  {rom_high:>8}  {rom_low + rom_high:>9}  "
+              f"{len(new_low):>7}  {len(new_high):>8}  {new_total:>9}  {rom_low + rom_high - new_total:>6}  "
+              f"{'ok' if ok else 'MISMATCH'}")
+
+    if total_encode_time:
+        print(f"\nEncode throughput: {total_decoded / total_encode_time / 1e6:.1f} MB/s of decoded data "
+              f"({args.repeat} passes)")
+    if not all_ok:
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Encode level maps back into the ROM RLE stream format')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('encode', help='Encode a level map into low+high streams')
+    p.add_argument('map_bin', help='Level map binary (levelNmap.bin)')
+    p.add_argument('output_bin', help='Output file, low plane stream followed by high plane stream')
+    p.set_defaults(func=cmd_encode)
+
+    p = sub.add_parser('inject', help='Encode a level map and write it over the level in code.bin')
+    p.add_argument('code_bin', help='Game code binary')
+    p.add_argument('level', type=int, help=f'Level number (1-{NUM_ENTRIES})')
+    p.add_argument('map_bin', help='Level map binary (levelNmap.bin)')
+    p.add_argument('output_bin', help='Modified code binary to write')
+    p.set_defaults(func=cmd_inject)
+
+    p = sub.add_parser('verify', help='Re-encode every level in code.bin, compare sizes and round trip')
+    p.add_argument('code_bin', help='Game code binary')
+    p.add_argument('--repeat', type=int, default=20, help='Encode passes for the throughput figure (default: 20)')
+    p.set_defaults(func=cmd_verify)
+
+    args = parser.parse_args()
+    try:
+        args.func(args)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,9 @@
 import os
 import sys
 import math
+import numpy as np
 from PIL import Image
+from tile_bank import TileBank, build_palette_lut, BANK_MASK, CHAR_SIZE, INVALID_INDEX
 
 def plot_map_with_offset(map_file, char_file, palette_file, output_file, 
                         width=64, height=None, char_offset_hex=0):
@@ -14,11 +16,6 @@ def plot_map_with_offset(map_file, char_file, palette_file, output_file,
     """
     # Constants
     TILE_SIZE = 8  # 8x8 pixels
-    CHAR_SIZE = 32  # 8x8 4bpp
-    BANK_MASK = 0x1FFF
-    CHARS_PER_PALETTE = 64
-    COLORS_PER_PALETTE = 8
-    BYTES_PER_COLOR = 3  # RGB
 
     # Convert hex offset to decimal
     try:
@@ -27,10 +24,9 @@ def plot_map_with_offset(map_file, char_file, palette_file, output_file,
         print(f"Error: Invalid hex offset '{char_offset_hex}'")
         return
 
-    # Load all data
+    # Load all data (chars come decoded from the shared tile bank)
     try:
-        with open(char_file, 'rb') as f:
-            chars = f.read()
+        bank = TileBank.load(char_file, char_offset)
         with open(palette_file, 'rb') as f:
             palette_data = f.read()
         with open(map_file, 'rb') as f:
@@ -51,63 +47,29 @@ def plot_map_with_offset(map_file, char_file, palette_file, output_file,
     elif len(map_data) > expected_size:
         print(f"Warning: Map data larger than expected, truncating ({len(map_data)} > {expected_size} bytes)")
 
-    # Create output image
-    img_width = width * TILE_SIZE
-    img_height = height * TILE_SIZE
-    img = Image.new('RGBA', (img_width, img_height))
-    pixels = img.load()
+    # Read tile numbers (little-endian), missing entries on truncated data stay empty
+    present = min(len(map_data) // 2, width * height)
+    words = np.zeros(width * height, dtype=np.uint16)
+    words[:present] = np.frombuffer(map_data, dtype='<u2', count=present)
+    grid = words.reshape(height, width)
 
-    # Process each tile
-    for tile_idx in range(width * height):
-        entry_offset = tile_idx * 2
-        if entry_offset + 1 >= len(map_data):
-            break  # Handle truncated data
+    pixels, invalid = bank.render_indexed(grid)
+    missing = np.arange(width * height).reshape(height, width) >= present
+    pixels.reshape(height, TILE_SIZE, width, TILE_SIZE).transpose(0, 2, 1, 3)[missing] = INVALID_INDEX
 
-        # Read tile number (little-endian)
-        tile_number = map_data[entry_offset] | (map_data[entry_offset + 1] << 8)
+    for tile_idx in np.flatnonzero(invalid & ~missing):
+        entry_offset = tile_idx * 2
+        tile_number = int(words[tile_idx])
         banked_tile = tile_number & BANK_MASK
-
-        # Calculate character data location with offset
         effective_char_offset = char_offset + (banked_tile * CHAR_SIZE)
-        
-        if effective_char_offset + CHAR_SIZE > len(chars):
-            print(f"Invalid tile at position {tile_idx} (offset {entry_offset:04X}h): "
-                  f"Tile {tile_number:04X}h (Banked: {banked_tile:04X}h) "
-                  f"Char offset: {effective_char_offset:04X}h")
-            continue
-
-        # Calculate palette group
-        palette_group = banked_tile // CHARS_PER_PALETTE
-        palette_offset = palette_group * COLORS_PER_PALETTE * BYTES_PER_COLOR
-
-        # Get palette colors
-        palette = []
-        for i in range(COLORS_PER_PALETTE):
-            offset = palette_offset + i * BYTES_PER_COLOR
-            if offset + 2 < len(palette_data):
-                r, g, b = palette_data[offset:offset+3]
-                a = 0 if i == 0 else 255  # Transparent for color 0
-                palette.append((r, g, b, a))
-            else:
-                palette.append((255, 0, 255, 255))  # Error color
-
-        # Calculate position
-        tile_x = (tile_idx % width) * TILE_SIZE
-        tile_y = (tile_idx // width) * TILE_SIZE
-
-        # Render character
-        for byte_pos in range(CHAR_SIZE):
-            byte = chars[effective_char_offset + byte_pos]
-            px = (byte_pos % 4) * 2  # Two pixels per byte
-            py = byte_pos // 4
-
-            for nibble_pos, shift in [(0, 4), (1, 0)]:
-                pixel_val = (byte >> shift) & 0x07
-                if pixel_val >= len(palette):
-                    pixel_val = 7  # Fallback
-                pixels[tile_x + px + nibble_pos, tile_y + py] = palette[pixel_val]
+        print(f"Invalid tile at position {tile_idx} (offset {entry_offset:04X}h): "
+              f"Tile {tile_number:04X}h (Banked: {banked_tile:04X}h) "
+              f"Char offset: {effective_char_offset:04X}h")
 
     # Save output
+    img_width = width * TILE_SIZE
+    img_height = height * TILE_SIZE
+    img = Image.fromarray(build_palette_lut(palette_data)[pixels], 'RGBA')
     img.save(output_file)
     print(f"Saved map to {output_file} ({width}x{height} tiles, {img_width}x{img_height} pixels)")
     print(f"Used character offset: {char_offset:04X}h")
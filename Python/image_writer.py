@@ -0,0 +1,182 @@
+"""
+image_writer.py
+
+Output backend for the renderers. Encoding a big RGBA image with Image.save()
+takes longer than rendering it, so ImageWriter encodes and writes finished
+images on background threads while the caller renders the next one (zlib and
+the numpy filter pass both release the GIL).
+
+Formats:
+  · png  - own encoder: the same filter (none/sub/up) on every row, then zlib at
+           the chosen level and strategy. Level 0 gives an uncompressed PNG.
+  · pil  - PIL's encoder (adaptive filter per row, what Image.save() does)
+  · npy  - the (height, width, 4) array as .npy, for intermediate files that
+           only other scripts read back (np.load, optionally memory-mapped)
+
+The format options are shared by the tools through add_writer_arguments().
+"""
+
+import io
+import os
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+FORMATS = ('png', 'pil', 'npy')
+PNG_FILTERS = {'none': 0, 'sub': 1, 'up': 2}
+ZLIB_STRATEGIES = {
+    'default': zlib.Z_DEFAULT_STRATEGY,
+    'filtered': zlib.Z_FILTERED,
+    'huffman': zlib.Z_HUFFMAN_ONLY,
+    'rle': zlib.Z_RLE,
+    'fixed': zlib.Z_FIXED,
+}
+
+
+def png_chunk(chunk_type: bytes, payload: bytes) -> bytes:
+    return (struct.pack('>I', len(payload)) + chunk_type + payload +
+            struct.pack('>I', zlib.crc32(chunk_type + payload) & 0xFFFFFFFF))
+
+
+# =============================================================================
+# PNG encoding
+# =============================================================================
+
+class PNGStreamWriter:
+    """
+    Writes an RGBA PNG a band of rows at a time. Rows are filtered and
+    deflated as they arrive, only the last row is kept between bands.
+    - png_filter: 'none', 'sub' or 'up', used for every row
+    - strategy: zlib strategy name (see ZLIB_STRATEGIES)
+    """
+
+    def __init__(self, fp, width, height, compress_level=6, png_filter='up', strategy='default'):
+        self.fp = fp
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self.filter_type = PNG_FILTERS[png_filter]
+        self.deflater = zlib.compressobj(compress_level, zlib.DEFLATED, 15, 9, ZLIB_STRATEGIES[strategy])
+        self.prev_row = np.zeros((1, width * 4), dtype=np.uint8)
+
+        fp.write(PNG_SIGNATURE)
+        fp.write(png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)))
+
+    def write(self, rows: np.ndarray):
+        flat = rows.reshape(len(rows), -1)
+        filtered = np.empty((len(rows), flat.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0] = self.filter_type
+        if self.filter_type == 1:    # Sub: left pixel
+            filtered[:, 1:5] = flat[:, :4]
+            np.subtract(flat[:, 4:], flat[:, :-4], out=filtered[:, 5:])
+        elif self.filter_type == 2:  # Up: row above
+            previous = np.concatenate([self.prev_row, flat[:-1]])
+            np.subtract(flat, previous, out=filtered[:, 1:])
+        else:
+            filtered[:, 1:] = flat
+        self.prev_row = flat[-1:].copy()
+        self.rows_written += len(rows)
+
+        data = self.deflater.compress(filtered.tobytes())
+        if data:
+            self.fp.write(png_chunk(b'IDAT', data))
+
+    def close(self):
+        if self.rows_written != self.height:
+            raise ValueError(f"Wrote {self.rows_written} rows, header says {self.height}")
+        self.fp.write(png_chunk(b'IDAT', self.deflater.flush()))
+        self.fp.write(png_chunk(b'IEND', b''))
+
+
+def encode_png(rgba: np.ndarray, compress_level=6, png_filter='up', strategy='default') -> bytes:
+    """Encode a (height, width, 4) uint8 array as a PNG file in memory."""
+    height, width = rgba.shape[:2]
+    out = io.BytesIO()
+    writer = PNGStreamWriter(out, width, height, compress_level, png_filter, strategy)
+    writer.write(np.ascontiguousarray(rgba))
+    writer.close()
+    return out.getvalue()
+
+
+# =============================================================================
+# Background writer
+# =============================================================================
+
+class ImageWriter:
+    """
+    Saves RGBA arrays in the chosen format on a pool of threads.
+    save() returns straight away; use it as a context manager (or call
+    close()) to wait for everything to be on disk. At most 2 * threads
+    images are held in memory, save() waits for the oldest beyond that.
+    """
+
+    def __init__(self, fmt='png', compress_level=6, png_filter='up', strategy='default', threads=None):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown image format '{fmt}', use one of {', '.join(FORMATS)}")
+        self.fmt = fmt
+        self.compress_level = compress_level
+        self.png_filter = png_filter
+        self.strategy = strategy
+        self.threads = threads or min(4, os.cpu_count() or 1)
+        self.pool = ThreadPoolExecutor(max_workers=self.threads)
+        self.pending = []
+
+    def output_path(self, path: str) -> str:
+        """The file name actually written for path (.npy for the npy format)."""
+        if self.fmt == 'npy':
+            return os.path.splitext(path)[0] + '.npy'
+        return path
+
+    def _write(self, rgba, path):
+        if self.fmt == 'npy':
+            np.save(path, rgba)
+        elif self.fmt == 'pil':
+            from PIL import Image
+            Image.fromarray(rgba, 'RGBA').save(path, compress_level=self.compress_level)
+        else:
+            data = encode_png(rgba, self.compress_level, self.png_filter, self.strategy)
+            with open(path, 'wb') as f:
+                f.write(data)
+        return path
+
+    def save(self, rgba: np.ndarray, path: str) -> str:
+        """Queue a (height, width, 4) uint8 array to be written. Returns the output path."""
+        while len(self.pending) >= 2 * self.threads:
+            self.pending.pop(0).result()
+        path = self.output_path(path)
+        self.pending.append(self.pool.submit(self._write, rgba, path))
+        return path
+
+    def close(self):
+        """Wait for all queued images; errors from the threads are raised here."""
+        try:
+            for future in self.pending:
+                future.result()
+        finally:
+            self.pending = []
+            self.pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def add_writer_arguments(parser):
+    """Add the output format options to an argparse parser."""
+    parser.add_argument('--format', choices=FORMATS, default='png',
+                        help='Image output: png (own encoder), pil (Image.save) or npy arrays (default: png)')
+    parser.add_argument('--png-level', type=int, default=6, help='zlib level, 0 = uncompressed (default: 6)')
+    parser.add_argument('--png-filter', choices=PNG_FILTERS, default='up', help='PNG row filter (default: up)')
+    parser.add_argument('--png-strategy', choices=ZLIB_STRATEGIES, default='default',
+                        help='zlib strategy (default: default)')
+    parser.add_argument('--writer-threads', type=int, help='Images encoded at once (default: up to 4)')
+
+
+def writer_from_args(args) -> ImageWriter:
+    return ImageWriter(args.format, args.png_level, args.png_filter, args.png_strategy, args.writer_threads)
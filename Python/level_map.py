@@ -0,0 +1,131 @@
+"""
+level_map.py
+
+One shared view of a levelNmap.bin: the little-endian map words as a
+(screens, 32, 64) uint16 NumPy array straight over the buffer they came in
+(bytes, mmap, artifact pack blob), without copying or re-parsing them.
+
+Word layout, as render_maps draws it:
+  · tile          - word & 0x1FFF, the char number after the level's char offset
+  · palette group - tile // 64, 8 colours each
+  · priority      - word >> 13, the top 3 bits
+  · char          - tile + char_offset // 32, the char number in BG1.bin
+  · bank          - char // 4096, which 0x20000 half of BG1.bin it comes from
+
+Screens are stored one after another and drawn side by side, so "strip"
+coordinates below are tile (or pixel) positions in that row of screens.
+"""
+
+import numpy as np
+
+from tile_bank import BANK_MASK, CHAR_SIZE, CHARS_PER_PALETTE, TILE_SIZE
+
+SCREEN_WIDTH = 64        # tiles per screen
+SCREEN_HEIGHT = 32
+SCREEN_WORDS = SCREEN_WIDTH * SCREEN_HEIGHT
+SCREEN_BYTES = SCREEN_WORDS * 2
+PRIORITY_SHIFT = 13
+CHARS_PER_BANK = 0x20000 // CHAR_SIZE
+
+
+class LevelMap:
+    """
+    Map words of a level as a (screens, 32, 64) '<u2' view.
+    - words: the view (read-only if the buffer is)
+    - char_offset: byte offset into BG1.bin the level's chars start at
+    - trailing: bytes after the last whole screen, left out of the view
+    """
+
+    def __init__(self, data, char_offset: int = 0):
+        if isinstance(data, np.ndarray) and data.ndim == 3:
+            words = data
+            self.trailing = 0
+        else:
+            buffer = memoryview(data).cast('B')
+            screens = len(buffer) // SCREEN_BYTES
+            words = np.frombuffer(buffer, dtype='<u2', count=screens * SCREEN_WORDS)
+            words = words.reshape(screens, SCREEN_HEIGHT, SCREEN_WIDTH)
+            self.trailing = len(buffer) - screens * SCREEN_BYTES
+        self.words = words
+        self.char_offset = char_offset
+
+    @classmethod
+    def load(cls, map_file: str, char_offset: int = 0) -> 'LevelMap':
+        with open(map_file, 'rb') as f:
+            return cls(f.read(), char_offset)
+
+    def __len__(self):
+        return len(self.words)
+
+    @property
+    def screens(self) -> int:
+        return len(self.words)
+
+    # -------------------------------------------------------------------------
+    # Fields of every word, as arrays shaped like words
+    # -------------------------------------------------------------------------
+
+    @property
+    def tile(self) -> np.ndarray:
+        return self.words & BANK_MASK
+
+    @property
+    def palette_group(self) -> np.ndarray:
+        return self.tile // CHARS_PER_PALETTE
+
+    @property
+    def priority(self) -> np.ndarray:
+        return self.words >> PRIORITY_SHIFT
+
+    @property
+    def char(self) -> np.ndarray:
+        return self.tile.astype(np.int64) + self.char_offset // CHAR_SIZE
+
+    @property
+    def bank(self) -> np.ndarray:
+        return self.char // CHARS_PER_BANK
+
+    # -------------------------------------------------------------------------
+    # Slicing
+    # -------------------------------------------------------------------------
+
+    def screen_range(self, start: int, stop: int = None) -> 'LevelMap':
+        """Screens start..stop-1 as a LevelMap view."""
+        return LevelMap(self.words[start:stop], self.char_offset)
+
+    def strip(self, start: int = 0, stop: int = None) -> np.ndarray:
+        """Screens start..stop-1 side by side as one (32, n * 64) grid (a copy)."""
+        words = self.words[start:stop]
+        return words.transpose(1, 0, 2).reshape(SCREEN_HEIGHT, -1)
+
+    def rect(self, x: int, y: int, width: int, height: int) -> np.ndarray:
+        """
+        The words of every tile touching a pixel rectangle of the strip, in one
+        gather. The grid starts at tile (x // 8, y // 8), so the rectangle
+        starts x % 8, y % 8 pixels into its render.
+        """
+        if width <= 0 or height <= 0:
+            raise ValueError(f"Empty rectangle {width}x{height}")
+        cols = np.arange(x // TILE_SIZE, (x + width + TILE_SIZE - 1) // TILE_SIZE)
+        rows = np.arange(y // TILE_SIZE, (y + height + TILE_SIZE - 1) // TILE_SIZE)
+        if cols[-1] >= self.screens * SCREEN_WIDTH or rows[-1] >= SCREEN_HEIGHT or x < 0 or y < 0:
+            raise IndexError(f"Rectangle {width}x{height} at ({x},{y}) is outside the map")
+        return self.words[cols // SCREEN_WIDTH, rows[:, None], cols % SCREEN_WIDTH]
+
+    def offset_of(self, screen: int, x: int, y: int) -> int:
+        """Byte offset of a word in the map file."""
+        return screen * SCREEN_BYTES + (y * SCREEN_WIDTH + x) * 2
+
+    # -------------------------------------------------------------------------
+    # Statistics
+    # -------------------------------------------------------------------------
+
+    def histogram(self) -> np.ndarray:
+        """How often each tile number (0-1FFFh) is used in the level."""
+        return np.bincount(self.tile.ravel(), minlength=BANK_MASK + 1)
+
+    def used_tiles(self) -> np.ndarray:
+        return np.flatnonzero(self.histogram())
+
+    def tobytes(self) -> bytes:
+        return self.words.astype('<u2').tobytes()
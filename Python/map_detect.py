@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+map_detect.py
+
+Guesses the layout of unknown tile map data instead of trial-and-error
+generic_plotter.py runs: the map width, which bits are the tile number and
+which char offset the tiles point at, with a preview of the best guesses.
+
+  · width       - the word stream is a signal: a map W tiles wide repeats
+                  itself at lag W. Words themselves often don't (a block of
+                  consecutive chars goes on with new chars below), the steps
+                  from one word to the next do, so the lags where steps most
+                  often equal the step `lag` places later are the likely
+                  widths. The equality autocorrelation is computed for every
+                  lag at once, with one FFT per common step value. Horizontal
+                  repeats (blocks every 8 tiles) peak too, so several widths
+                  are listed and previewed.
+  · tile mask and char offset
+                - ranked by how well the chars join up: for every pair of
+                  neighbouring map cells the touching pixel columns (rows) of
+                  their chars are compared. Real neighbours mostly continue
+                  each other, wrong guesses look like noise. Each distinct pair
+                  is checked once per guess.
+
+Usage:
+    python map_detect.py unknown.bin --chars BG1.bin --palette palettes_level1-3.pal --preview guess.png
+    python map_detect.py code.bin --offset 26c26 --length 8c0 --big-endian --chars BG1.bin
+    python map_detect.py code.bin --offset 199a --length 320 --word-size 1 --high-byte A5 --chars BG1.bin
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from tile_bank import TileBank, build_palette_lut, BANK_MASK, CHAR_SIZE, TILE_SIZE
+
+TOP_VALUES = 32          # values whose repeats are counted exactly
+MIN_SCORE = 0.01         # a width must repeat at 1% more of the entries than its neighbour lags
+FOLD_SCORE = 0.25        # a whole fraction of a width must stand out this much as well
+TILE_MASKS = (0x07FF, 0x0FFF, 0x1FFF, 0x3FFF, 0xFFFF)
+
+
+# =============================================================================
+# Width
+# =============================================================================
+
+def equality_autocorrelation(values: np.ndarray, max_lag: int, background=None,
+                             top_values: int = TOP_VALUES) -> np.ndarray:
+    """
+    For every lag 0..max_lag, the fraction of positions i where
+    values[i] == values[i + lag], leaving out the background value (it would
+    match at every lag; default: the most common value). Each of the
+    top_values most common other values gets the autocorrelation of its 0/1
+    indicator from one FFT; rarer values hardly move the sums and are left out.
+    """
+    unique, inverse, counts = np.unique(values, return_inverse=True, return_counts=True)
+    if background is None:
+        background = unique[np.argmax(counts)]
+    counts = np.where(unique == background, -1, counts)
+    order = np.argsort(-counts, kind='stable')[:top_values]
+    order = order[counts[order] > 0]
+    n = len(values)
+    size = 1 << int(2 * n - 1).bit_length()
+    total = np.zeros(max_lag + 1)
+    for chunk in np.array_split(order, max(1, len(order) // 8)):
+        indicators = (inverse[None, :] == chunk[:, None]).astype(np.float32)
+        spectrum = np.fft.rfft(indicators, size, axis=1)
+        total += np.fft.irfft(np.abs(spectrum) ** 2, size, axis=1)[:, :max_lag + 1].sum(axis=0)
+    return np.maximum(np.round(total), 0) / (n - np.arange(max_lag + 1))
+
+
+def rank_widths(words: np.ndarray, min_width: int = 4, max_width: int = 512, top: int = 5) -> list:
+    """
+    Likely map widths as [(width, same word below, score)], best first.
+    The signal is the step from each word to the next: a block of chars
+    continues on the row below with the same steps even where the chars
+    themselves change, so steps repeat at the width. The score is how far a
+    lag stands out from the lags either side of it. A width whose whole
+    fraction (W/2, W/3, ...) repeats at least as often is replaced by it, a
+    map read 2 or 3 rows at a time repeats as well as the real one.
+    """
+    max_width = min(max_width, len(words) // 2 - 1)
+    if max_width <= min_width:
+        raise ValueError(f"{len(words)} words is too short to find a width of {min_width} or more")
+    steps = np.diff(words.astype(np.int32))
+    corr = equality_autocorrelation(steps, max_width + 1, background=0)
+    same = equality_autocorrelation(words, max_width + 1)
+    lags = np.arange(min_width, max_width + 1)
+    score = np.zeros(max_width + 2)
+    score[lags] = corr[lags] - (corr[lags - 1] + corr[lags + 1]) / 2
+
+    ranked = []
+    for lag in lags[np.argsort(-score[lags], kind='stable')]:
+        if len(ranked) == top or score[lag] < MIN_SCORE:
+            break
+        for parts in range(lag // min_width, 1, -1):
+            if lag % parts == 0 and score[lag // parts] >= score[lag] * FOLD_SCORE and corr[lag // parts] >= corr[lag]:
+                lag //= parts
+                break
+        if lag not in [width for width, _, _ in ranked]:
+            ranked.append((int(lag), float(same[lag]), float(score[lag])))
+    return sorted(ranked, key=lambda r: -r[2])
+
+
+# =============================================================================
+# Tile mask and char offset
+# =============================================================================
+
+def neighbour_pairs(grid: np.ndarray) -> dict:
+    """Distinct (left, right) and (top, bottom) word pairs of a grid, with counts."""
+    pairs = {}
+    for name, a, b in (('h', grid[:, :-1], grid[:, 1:]), ('v', grid[:-1], grid[1:])):
+        keys = (a.astype(np.uint32) << 16) | b
+        unique, counts = np.unique(keys, return_counts=True)
+        pairs[name] = (unique >> 16, unique & 0xFFFF, counts)
+    return pairs
+
+
+def rank_char_layouts(grid: np.ndarray, tiles: np.ndarray, char_offsets, masks=TILE_MASKS) -> list:
+    """
+    Every (tile mask, char offset) guess as a dict with the fraction of
+    touching pixels that differ ('mismatch'), of cells past the end of the
+    char data ('invalid') and of cells on an empty char ('blank'), best first.
+    tiles: all chars of the char file, (n, 8, 8), low 3 bits used
+    """
+    pixels = tiles & 0x07
+    blank = ~pixels.reshape(len(pixels), -1).any(axis=1)
+    pairs = neighbour_pairs(grid)
+    words, cell_counts = np.unique(grid, return_counts=True)
+
+    results = []
+    for mask in masks:
+        for char_offset in char_offsets:
+            base = char_offset // CHAR_SIZE
+
+            def chars(w):
+                c = base + (w & mask).astype(np.int64)
+                return c, c < len(pixels)
+
+            differ = touching = 0
+            for name, edge_a, edge_b in (('h', (slice(None), -1), (slice(None), 0)),
+                                         ('v', (-1, slice(None)), (0, slice(None)))):
+                a, b, counts = pairs[name]
+                (ca, va), (cb, vb) = chars(a), chars(b)
+                ok = va & vb
+                left = pixels[ca[ok]][(slice(None),) + edge_a]
+                right = pixels[cb[ok]][(slice(None),) + edge_b]
+                differ += int(((left != right).sum(axis=1) * counts[ok]).sum())
+                touching += int(counts[ok].sum()) * TILE_SIZE
+
+            c, valid = chars(words)
+            results.append({
+                'mask': mask,
+                'char_offset': char_offset,
+                'mismatch': differ / touching if touching else 1.0,
+                'invalid': float(cell_counts[~valid].sum() / grid.size),
+                'blank': float(cell_counts[valid][blank[c[valid]]].sum() / grid.size),
+            })
+    # a guess that leaves most cells invalid can't win on the few that are left
+    results.sort(key=lambda r: r['mismatch'] + r['invalid'])
+    return results
+
+
+# =============================================================================
+# Preview
+# =============================================================================
+
+def preview_panel(words: np.ndarray, width: int, bank: TileBank = None, lut: np.ndarray = None,
+                  mask: int = BANK_MASK, max_rows: int = 64) -> np.ndarray:
+    """
+    RGBA render of the words at a width: chars if a bank and palette are
+    given, otherwise one pixel per word in a colour per value, 4x.
+    """
+    rows = min(len(words) // width, max_rows)
+    grid = words[:rows * width].reshape(rows, width)
+    if bank is not None and lut is not None:
+        pixels, _ = bank.render_indexed(grid, mask)
+        return lut[pixels]
+    rng = np.random.default_rng(0)
+    colors = rng.integers(0, 256, (0x10000, 4), dtype=np.uint8)
+    colors[:, 3] = 255
+    return colors[grid].repeat(4, axis=0).repeat(4, axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Guess the width, tile mask and char offset of map data')
+    parser.add_argument('map_file', help='File with the map data (a map file or a ROM)')
+    parser.add_argument('--offset', default="0", help='Start of the map data in the file (hex, default: 0)')
+    parser.add_argument('--length', help='Bytes of map data (hex, default: to the end)')
+    parser.add_argument('--big-endian', action='store_true', help='Words are big-endian (as in code.bin)')
+    parser.add_argument('--word-size', type=int, choices=(1, 2), default=2,
+                        help='Bytes per map entry, 1 for low byte only maps like the beast (default: 2)')
+    parser.add_argument('--high-byte', default="0", help='High byte added to 1 byte entries (hex, default: 0)')
+    parser.add_argument('--min-width', type=int, default=4, help='Narrowest width tried (default: 4)')
+    parser.add_argument('--max-width', type=int, default=512, help='Widest width tried (default: 512)')
+    parser.add_argument('--top', type=int, default=5, help='Candidates listed and previewed (default: 5)')
+    parser.add_argument('--chars', help='Char data (BG1.bin) to rank tile masks and char offsets')
+    parser.add_argument('--offset-step', default="20000",
+                        help='Char offsets tried are multiples of this (hex, default: 20000)')
+    parser.add_argument('--palette', help='Level palette (.pal) for a rendered preview')
+    parser.add_argument('--preview', help='Write a contact sheet of the top widths')
+    args = parser.parse_args()
+
+    try:
+        with open(args.map_file, 'rb') as f:
+            raw = f.read()
+        offset = int(args.offset, 16)
+        length = int(args.length, 16) if args.length else len(raw) - offset
+        data = raw[offset:offset + length]
+        if args.word_size == 1:
+            words = np.frombuffer(data, dtype=np.uint8).astype(np.uint16) | (int(args.high_byte, 16) << 8)
+        else:
+            words = np.frombuffer(data, dtype='>u2' if args.big_endian else '<u2',
+                                  count=len(data) // 2).astype(np.uint16)
+        start = time.perf_counter()
+        widths = rank_widths(words, args.min_width, args.max_width, args.top)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    if not widths:
+        print(f"No width stands out in {len(words)} words, this may not be map data")
+        sys.exit(1)
+    width_time = time.perf_counter() - start
+
+    print(f"{len(words)} entries from {offset:X}h, width candidates ({width_time * 1000:.1f} ms):")
+    print("  width  height  same  score")
+    for width, match, score in widths:
+        print(f"  {width:>5}  {len(words) // width:>6}  {match:>4.0%}  {score:.3f}")
+
+    best = None
+    bank = None
+    if args.chars:
+        bank = TileBank.load(args.chars)
+        width = widths[0][0]
+        grid = words[:len(words) // width * width].reshape(-1, width)
+        step = int(args.offset_step, 16)
+        char_offsets = range(0, len(bank) * CHAR_SIZE, step)
+        start = time.perf_counter()
+        layouts = rank_char_layouts(grid, np.asarray(bank.tiles), char_offsets)
+        print(f"\nTile mask / char offset at width {width} ({(time.perf_counter() - start) * 1000:.1f} ms):")
+        print("   mask  char offset  edges differ  invalid  blank")
+        for layout in layouts[:args.top]:
+            print(f"  {layout['mask']:04X}h  {layout['char_offset']:>10X}h  {layout['mismatch']:>12.1%}  "
+                  f"{layout['invalid']:>7.1%}  {layout['blank']:>5.1%}")
+        best = layouts[0]
+        print(f"Suggested: --char-offset {best['char_offset']:X}, tile = word & {best['mask']:04X}h")
+
+    if args.preview:
+        from rom_view import contact_sheet
+        from image_writer import ImageWriter
+        lut = None
+        render_bank = None
+        if bank is not None and args.palette:
+            with open(args.palette, 'rb') as f:
+                lut = build_palette_lut(f.read())
+            render_bank = TileBank.load(args.chars, best['char_offset'])
+        mask = best['mask'] if best else BANK_MASK
+        panels = [preview_panel(words, width, render_bank, lut, mask) for width, _, _ in widths]
+        with ImageWriter() as writer:
+            output = writer.save(contact_sheet(panels, [f"{w} wide" for w, _, _ in widths]), args.preview)
+        print(f"Preview saved to {output}")
+
+
+if __name__ == '__main__':
+    main()
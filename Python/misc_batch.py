@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+misc_batch.py
+
+Builds the title, beast transformation and eyeball images in one go from a
+manifest, instead of running tile_extractor.py, swapbytes.py, generic_plotter.py
+and combine_images.py once per block.
+
+Everything stays in memory: block headers are read straight from code.bin, the
+big-endian map words are read as such (no swapbytes pass), and every block is
+plotted against the one TileBank loaded from BG1.bin.
+
+Manifest (JSON):
+    {
+      "chars":   "BG1.bin",                  char data, shared by all blocks
+      "palette": "palettes_level1-3.pal",    default palette
+      "blocks": [
+        {"name": "misc_images", "offset": "26c20", "count": 14},
+        {"name": "beast", "offset": "199a", "length": "320", "high_byte": "A5", "width": 40}
+      ],
+      "images": [
+        {"output": "altered_logo.png", "combine": ["misc_images:1", "misc_images:2"]}
+      ]
+    }
+
+A block with "count" is a run of tile_extractor style blocks (6 byte header,
+width-1 and height-1 words, then width*height big-endian map words), referred
+to as "name:N" starting at 1 like the misc_images_N_WxH.bin files. A block with
+"length" is a run of single bytes (low byte only maps, like the beast) combined
+with a fixed "high_byte" and plotted "width" tiles wide.
+Any block may also give its own "palette" and "char_offset" (hex).
+
+Usage:
+    python misc_batch.py code.bin misc_images.json
+    python misc_batch.py code.bin misc_images.json --output-dir out
+"""
+
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+from tile_bank import TileBank, build_palette_lut
+
+HEADER_SIZE = 6
+
+
+def read_tile_blocks(code_data: bytes, start_offset: int, count: int) -> list:
+    """
+    Read `count` tile_extractor style blocks starting at start_offset.
+    Returns a list of (rows, cols) grids of map words, already byte-swapped
+    to native order.
+    """
+    blocks = []
+    p = start_offset
+    for i in range(count):
+        if p + HEADER_SIZE > len(code_data):
+            raise ValueError(f"End of file at block {i + 1} (offset {p:X}h)")
+
+        width = struct.unpack('>H', code_data[p + 2:p + 4])[0] + 1
+        height = struct.unpack('>H', code_data[p + 4:p + 6])[0] + 1
+        p += HEADER_SIZE
+
+        data_size = width * height * 2
+        if p + data_size > len(code_data):
+            raise ValueError(f"Tile data truncated in block {i + 1} (offset {p:X}h)")
+
+        # swapbytes.py with count 1 is just a big-endian read
+        words = np.frombuffer(code_data, dtype='>u2', count=width * height, offset=p)
+        blocks.append(words.reshape(height, width))
+        p += data_size
+    return blocks
+
+
+def read_byte_map(code_data: bytes, start_offset: int, length: int, high_byte: int, width: int) -> np.ndarray:
+    """
+    Read a low byte only map (savebit + dummy + merge-binaries in the batch
+    file) and return it as a (rows, width) grid of map words.
+    """
+    low = np.frombuffer(code_data, dtype=np.uint8, count=length, offset=start_offset)
+    words = low.astype(np.uint16) | (high_byte << 8)
+    height = len(words) // width
+    return words[:width * height].reshape(height, width)
+
+
+def run_manifest(code_file, manifest_file, output_dir="."):
+    """
+    Extract, plot and compose every image listed in the manifest.
+    Paths in the manifest are relative to the current directory, like the
+    batch file.
+    """
+    with open(manifest_file, 'r') as f:
+        manifest = json.load(f)
+    with open(code_file, 'rb') as f:
+        code_data = f.read()
+
+    start = time.perf_counter()
+
+    # Shared char banks and palette LUTs, loaded once per file/offset
+    tile_banks = {}
+    luts = {}
+
+    def tile_bank(char_offset):
+        if char_offset not in tile_banks:
+            tile_banks[char_offset] = TileBank.load(manifest['chars'], char_offset)
+        return tile_banks[char_offset]
+
+    def palette_lut(palette_file):
+        if palette_file not in luts:
+            with open(palette_file, 'rb') as f:
+                luts[palette_file] = build_palette_lut(f.read())
+        return luts[palette_file]
+
+    # Plot every block to RGBA
+    plotted = {}
+    for block in manifest['blocks']:
+        name = block['name']
+        offset = int(block['offset'], 16)
+        bank = tile_bank(int(block.get('char_offset', "0"), 16))
+        lut = palette_lut(block.get('palette', manifest['palette']))
+
+        if 'count' in block:
+            grids = read_tile_blocks(code_data, offset, block['count'])
+            keys = [f"{name}:{i}" for i in range(1, len(grids) + 1)]
+        else:
+            grids = [read_byte_map(code_data, offset, int(block['length'], 16),
+                                   int(block.get('high_byte', "0"), 16), block['width'])]
+            keys = [name]
+
+        for key, grid in zip(keys, grids):
+            indexed, invalid = bank.render_indexed(grid)
+            plotted[key] = lut[indexed]
+            rows, cols = grid.shape
+            skipped = f", skipped {invalid.sum()} tiles" if invalid.any() else ""
+            print(f"Plotted {key} ({cols}x{rows} tiles{skipped})")
+
+    # Compose and save the final images
+    from PIL import Image
+
+    os.makedirs(output_dir, exist_ok=True)
+    for image in manifest['images']:
+        parts = [plotted[key] for key in image['combine']]
+        heights = {part.shape[0] for part in parts}
+        if len(heights) > 1:
+            raise ValueError(f"{image['output']}: images have different heights: {heights}")
+
+        combined = np.hstack(parts)
+        output_path = os.path.join(output_dir, image['output'])
+        Image.fromarray(combined, 'RGBA').save(output_path)
+        print(f"Output: {output_path} ({combined.shape[1]}x{combined.shape[0]}) from {', '.join(image['combine'])}")
+
+    print(f"Built {len(manifest['images'])} images from {len(plotted)} blocks "
+          f"in {time.perf_counter() - start:.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Extract, plot and combine the misc images from a manifest')
+    parser.add_argument('code_bin', help='Game code binary (code.bin)')
+    parser.add_argument('manifest', help='Manifest JSON (e.g. misc_images.json)')
+    parser.add_argument('--output-dir', default=".", help='Where to write the images (default: current directory)')
+    args = parser.parse_args()
+
+    try:
+        run_manifest(args.code_bin, args.manifest, args.output_dir)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,9 @@
 import os
 import sys
 import math
+import numpy as np
 from PIL import Image
+from tile_bank import TileBank, build_palette_lut, TILE_SIZE, BANK_MASK, CHARS_PER_PALETTE
 
 def generate_banked_atlas(char_file, palette_file, output_file):
     """
@@ -9,18 +11,12 @@ def generate_banked_atlas(char_file, palette_file, output_file):
     Palette offset = (character_index & 0x1FFF) // 64
     """
     # Constants
-    CHAR_SIZE = 32  # 8x8 pixels at 4bpp
-    TILE_SIZE = 8
     GRID_WIDTH = 1920
-    BANK_MASK = 0x1FFF  # Character index mask
-    CHARS_PER_PALETTE = 64
-    COLORS_PER_PALETTE = 8
     BYTES_PER_COLOR = 3  # RGB
 
-    # Read files
+    # Read files (chars come decoded from the shared tile bank)
     try:
-        with open(char_file, 'rb') as f:
-            char_data = f.read()
+        bank = TileBank.load(char_file)
         with open(palette_file, 'rb') as f:
             palette_data = f.read()
     except FileNotFoundError as e:
@@ -28,7 +24,7 @@ def generate_banked_atlas(char_file, palette_file, output_file):
         return
 
     # Calculate character count
-    num_chars = len(char_data) // CHAR_SIZE
+    num_chars = len(bank)
     print(f"Processing {num_chars} characters")
     print(f"Palette contains {len(palette_data)//BYTES_PER_COLOR} colors")
 
@@ -37,45 +33,12 @@ def generate_banked_atlas(char_file, palette_file, output_file):
     cols = max(16, cols)
     rows = math.ceil(num_chars / cols)
 
-    # Create output image
-    img = Image.new('RGBA', (cols*TILE_SIZE, rows*TILE_SIZE))
-    pixels = img.load()
-
-    # Process each character
-    for char_idx in range(num_chars):
-        # Apply banking mask
-        banked_idx = char_idx & BANK_MASK
-        palette_group = banked_idx // CHARS_PER_PALETTE
-        palette_offset = palette_group * COLORS_PER_PALETTE * BYTES_PER_COLOR
-
-        # Get palette colors (8 colors per group)
-        palette = []
-        for i in range(COLORS_PER_PALETTE):
-            offset = palette_offset + i*BYTES_PER_COLOR
-            if offset + 2 < len(palette_data):
-                r, g, b = palette_data[offset:offset+3]
-                a = 0 if i == 0 else 255  # Transparent for color 0
-                palette.append((r, g, b, a))
-            else:
-                palette.append((255, 0, 255, 255))  # Error color
-
-        # Character position in grid
-        x = (char_idx % cols) * TILE_SIZE
-        y = (char_idx // cols) * TILE_SIZE
-
-        # Decode character data
-        char_offset = char_idx * CHAR_SIZE
-        for byte_pos in range(CHAR_SIZE):
-            byte = char_data[char_offset + byte_pos]
-            px = (byte_pos % 4) * 2  # Two pixels per byte
-            py = byte_pos // 4
-
-            # Unpack nibbles (only lower 3 bits used)
-            for nibble_pos, shift in [(0, 4), (1, 0)]:
-                pixel_val = (byte >> shift) & 0x07
-                if pixel_val >= len(palette):
-                    pixel_val = 7  # Fallback to last color
-                pixels[x+px+nibble_pos, y+py] = palette[pixel_val]
+    # Every character in order, palette group from the banked index;
+    # cells past the last character point past the bank and stay transparent
+    grid = np.arange(rows * cols, dtype=np.uint32).reshape(rows, cols)
+    pixels, _ = bank.render_indexed(grid, tile_mask=0xFFFFFFFF)
+    img = Image.fromarray(build_palette_lut(palette_data)[pixels], 'RGBA')
+    palette_group = ((num_chars - 1) & BANK_MASK) // CHARS_PER_PALETTE
 
     # Save output
     img.save(output_file)
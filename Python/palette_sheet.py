@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+palette_sheet.py
+
+Palette sheets built as arrays instead of one draw.rectangle per colour and
+two textbbox calls per palette (palette_image2.py), plus which palettes the
+levels and sprites actually use.
+
+  · swatches - the (n, colors, 3) palette array broadcast to swatch size and
+               reshaped into blocks, one block per palette, laid out in
+               columns top to bottom like palette_image2.py
+  · labels   - the 16 hex digits, '$' and space are drawn once with PIL and
+               cached; every label ("$1F  31") is a row of glyph indexes
+               worked out with shifts and divisions for all palettes at once,
+               and one gather of the glyph cache draws them all
+  · usage    - a bincount of the palette group (tile // 64) of every word of
+               the given level maps, and of the sprite palette assignments
+               (the palette text file sprite_atlas_numbered.py reads). Unused
+               palettes get a red label on the sheet and are listed.
+
+Level palettes are 8 colours per group (--colors 8, so palette i is group i),
+the expanded sprite palettes 16 per palette (--colors 16, the numbers in the
+assignments file); raw 14 colour dumps are what palette_image2.py draws.
+
+Usage:
+    python palette_sheet.py sprite_palettes.pal sprites.png --colors 16 --columns 4 --sprite-palettes palettes.txt
+    python palette_sheet.py palettes_level1-3.pal level1-3.png --colors 8 --columns 4 --level-maps level1map.bin level2map.bin level3map.bin
+    python palette_sheet.py palettes_level4-5.pal level4-5.png --colors 8 --usage-json usage.json --level-maps level4map.bin level5map.bin
+"""
+
+import argparse
+import functools
+import json
+import sys
+import time
+
+import numpy as np
+
+from image_writer import add_writer_arguments, writer_from_args
+from tile_bank import BANK_MASK, CHARS_PER_PALETTE
+
+SWATCH = 24
+COLUMN_GAP = 32
+ROW_GAP = 4
+GLYPHS = "0123456789ABCDEF$ "
+DOLLAR = GLYPHS.index('$')
+SPACE = GLYPHS.index(' ')
+LABEL_DIGITS = 4         # "$" + up to 4 hex digits, then the decimal number
+UNUSED_COLOR = (220, 0, 0)
+
+
+# =============================================================================
+# Glyphs and labels
+# =============================================================================
+
+@functools.lru_cache(maxsize=None)
+def glyph_cache(height: int) -> np.ndarray:
+    """(len(GLYPHS), height, width) coverage of every glyph, all in cells of one width."""
+    from PIL import Image, ImageDraw, ImageFont
+    try:
+        font = ImageFont.truetype("arial.ttf", max(height * 3 // 4, 6))
+    except IOError:
+        font = ImageFont.load_default()
+    boxes = [font.getbbox(ch) for ch in GLYPHS]
+    width = max(box[2] for box in boxes) + 1
+    top = min(box[1] for box in boxes if box[3] > box[1])
+    bottom = max(box[3] for box in boxes)
+    glyphs = np.zeros((len(GLYPHS), height, width), dtype=np.uint8)
+    for i, ch in enumerate(GLYPHS):
+        cell = Image.new('L', (width, height), 0)
+        ImageDraw.Draw(cell).text((0, (height - (bottom - top)) // 2 - top), ch, font=font, fill=255)
+        glyphs[i] = np.asarray(cell)
+    return glyphs
+
+
+def digit_codes(numbers: np.ndarray, base: int, digits: int, pad: int = None) -> np.ndarray:
+    """(n, digits) glyph indexes of numbers, most significant first; leading zeros as `pad` if given."""
+    powers = base ** np.arange(digits - 1, -1, -1)
+    codes = numbers[:, None] // powers % base
+    if pad is not None:
+        leading = (numbers[:, None] < powers) & (powers > 1)
+        codes = np.where(leading, pad, codes)
+    return codes
+
+
+def render_labels(numbers: np.ndarray, height: int) -> np.ndarray:
+    """(n, height, width) coverage of "$hex dec" labels for every number, one gather."""
+    count = int(numbers.max()) + 1 if len(numbers) else 1
+    hex_digits = max(2, min(LABEL_DIGITS, ((count - 1).bit_length() + 3) // 4))
+    dec_digits = len(str(count - 1))
+    codes = np.concatenate([
+        np.full((len(numbers), 1), DOLLAR),
+        digit_codes(numbers, 16, hex_digits),
+        np.full((len(numbers), 1), SPACE),
+        digit_codes(numbers, 10, dec_digits, pad=SPACE),
+        np.full((len(numbers), 1), SPACE),
+    ], axis=1)
+    glyphs = glyph_cache(height)
+    return glyphs[codes].transpose(0, 2, 1, 3).reshape(len(numbers), height, -1)
+
+
+# =============================================================================
+# The sheet
+# =============================================================================
+
+def load_palettes(data: bytes, n_colors: int) -> np.ndarray:
+    """(n, n_colors, 3) palettes of an 8-bit RGB dump."""
+    if len(data) % (n_colors * 3):
+        raise ValueError(f"Input size is not a multiple of {n_colors * 3} (colors x 3 bytes)")
+    return np.frombuffer(data, dtype=np.uint8).reshape(-1, n_colors, 3)
+
+
+def header_strip(n_colors: int, label_width: int, swatch: int) -> np.ndarray:
+    """The colour numbers above one column of palettes, as coverage."""
+    glyphs = glyph_cache(swatch)
+    strip = np.zeros((swatch, label_width + n_colors * swatch), dtype=np.uint8)
+    for c in range(n_colors):
+        codes = digit_codes(np.array([c]), 16, max(1, ((n_colors - 1).bit_length() + 3) // 4))[0]
+        text = np.concatenate([glyphs[code] for code in codes], axis=1)[:, :swatch]
+        x = label_width + c * swatch + (swatch - text.shape[1]) // 2
+        strip[:, x:x + text.shape[1]] = text
+    return strip
+
+
+def pack_rgba(rgb: np.ndarray) -> np.ndarray:
+    """(..., 3) uint8 colours as opaque RGBA uint32s (byte order R, G, B, A in memory)."""
+    rgb = rgb.astype(np.uint32)
+    return (rgb[..., 0] | rgb[..., 1] << 8 | rgb[..., 2] << 16 | 0xFF000000).astype('<u4')
+
+
+def ink_lut(color) -> np.ndarray:
+    """Packed colour of glyph coverage 0-255 drawn in `color` on white."""
+    coverage = np.arange(256, dtype=np.int32)[:, None]
+    return pack_rgba(255 - coverage * (255 - np.array(color, dtype=np.int32)) // 255)
+
+
+def palette_sheet(palettes: np.ndarray, columns: int = 1, swatch: int = SWATCH, unused: np.ndarray = None) -> np.ndarray:
+    """
+    RGBA sheet of (n, colors, 3) palettes, `columns` columns filled top to
+    bottom. unused: optional bool per palette, drawn with a red label.
+    Drawn as packed uint32 pixels, so every swatch and glyph row is one word
+    per pixel copy.
+    """
+    n, n_colors = palettes.shape[:2]
+    rows = max((n + columns - 1) // columns, 1)
+    labels = render_labels(np.arange(n), swatch)
+    label_width = labels.shape[2] + swatch // 2
+    block_width = label_width + n_colors * swatch + COLUMN_GAP
+    block_height = swatch + ROW_GAP
+    black = ink_lut((0, 0, 0))
+    white = black[0]
+
+    sheet = np.full((swatch + ROW_GAP + rows * block_height, columns * block_width), white, dtype='<u4')
+    header = black[np.pad(header_strip(n_colors, label_width, swatch), ((0, 0), (0, COLUMN_GAP)))]
+    sheet[:swatch] = np.tile(header, (1, columns))
+
+    # palette i is in column i // rows, row i % rows: one slice of blocks per column
+    blocks = sheet[swatch + ROW_GAP:].reshape(rows, block_height, columns, block_width)
+    lines = pack_rgba(palettes).repeat(swatch, axis=1)
+    ink = black[labels]
+    if unused is not None and unused.any():
+        ink[unused] = ink_lut(UNUSED_COLOR)[labels[unused]]
+    for column, first in enumerate(range(0, n, rows)):
+        count = min(rows, n - first)
+        block = blocks[:count, :swatch, column]
+        block[:, :, label_width:label_width + n_colors * swatch] = lines[first:first + count, None]
+        block[:, :, :labels.shape[2]] = ink[first:first + count]
+    return sheet.view(np.uint8).reshape(sheet.shape + (4,))
+
+
+# =============================================================================
+# Usage
+# =============================================================================
+
+def level_palette_usage(map_files, n_palettes: int) -> np.ndarray:
+    """Map cells per palette group over all the level maps."""
+    counts = np.zeros(n_palettes, dtype=np.int64)
+    for map_file in map_files:
+        words = np.fromfile(map_file, dtype='<u2')
+        groups = np.bincount((words & BANK_MASK) // CHARS_PER_PALETTE, minlength=n_palettes)
+        counts += groups[:n_palettes]
+    return counts
+
+
+def sprite_palette_usage(assignment_files, n_palettes: int) -> np.ndarray:
+    """Sprites assigned to each palette in sprite palette text files."""
+    from sprite_atlas_numbered import load_palette_assignments
+    counts = np.zeros(n_palettes, dtype=np.int64)
+    for path in assignment_files:
+        numbers = [p for palettes in load_palette_assignments(path).values() for p in palettes]
+        if numbers:
+            counts += np.bincount(numbers, minlength=n_palettes)[:n_palettes]
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Draw a palette sheet and report which palettes are used')
+    parser.add_argument('input_file', help='8-bit RGB palette file')
+    parser.add_argument('output_file', help='Output image')
+    parser.add_argument('--colors', type=int, default=14, help='Colours per palette (default: 14)')
+    parser.add_argument('--columns', type=int, default=1, help='Number of columns (default: 1)')
+    parser.add_argument('--swatch', type=int, default=SWATCH, help=f'Swatch size in pixels (default: {SWATCH})')
+    parser.add_argument('--level-maps', nargs='+', default=[], help='Level maps whose palette groups are counted')
+    parser.add_argument('--sprite-palettes', nargs='+', default=[],
+                        help='Sprite palette assignment files whose palettes are counted')
+    parser.add_argument('--usage-json', help='Write the usage counts as JSON')
+    add_writer_arguments(parser)
+    args = parser.parse_args()
+
+    try:
+        with open(args.input_file, 'rb') as f:
+            palettes = load_palettes(f.read(), args.colors)
+        if args.columns < 1 or args.swatch < 4:
+            raise ValueError("--columns must be 1 or more and --swatch 4 or more")
+        start = time.perf_counter()
+        n = len(palettes)
+        map_usage = level_palette_usage(args.level_maps, n)
+        sprite_usage = sprite_palette_usage(args.sprite_palettes, n)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    counted = bool(args.level_maps or args.sprite_palettes)
+    unused = (map_usage + sprite_usage == 0) if counted else None
+    usage_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    sheet = palette_sheet(palettes, args.columns, args.swatch, unused)
+    sheet_time = time.perf_counter() - start
+    with writer_from_args(args) as writer:
+        output = writer.save(sheet, args.output_file)
+
+    print(f"{n} palettes of {args.colors} colours: {sheet.shape[1]}x{sheet.shape[0]} sheet in "
+          f"{sheet_time * 1000:.1f} ms, saved {output}")
+    if counted:
+        print(f"Usage counted in {usage_time * 1000:.1f} ms: {int((~unused).sum())} used, {int(unused.sum())} unused")
+        if unused.any():
+            print("Unused: " + " ".join(f"{i:02X}" for i in np.flatnonzero(unused)))
+    if args.usage_json:
+        with open(args.usage_json, 'w') as f:
+            json.dump({'palettes': n, 'colors': args.colors,
+                       'map_cells': map_usage.tolist(), 'sprites': sprite_usage.tolist(),
+                       'unused': np.flatnonzero(unused).tolist() if counted else None}, f, indent=1)
+        print(f"Usage saved to {args.usage_json}")
+
+
+if __name__ == '__main__':
+    main()
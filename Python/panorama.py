@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+panorama.py
+
+Lays out many rendered images (level strips, logos, sprite sheets) into one
+poster, row by row, with optional captions and scaling, like Levels_all.jpg.
+
+Unlike combine_images.py nothing is held whole: source PNGs are decoded a
+band of rows at a time, and the poster is written with a streaming PNG
+encoder, so peak memory is a few rows of the output instead of the full
+poster. Images that are already decoded in the same process (PIL images or
+NumPy arrays) can be passed straight in without a PNG round trip.
+
+Usage:
+    python panorama.py Levels_all.png --row Level1/wide_00.png Level1/wide_01.png --row Level2/wide_00.png Level2/wide_01.png --scale 0.5
+    python panorama.py poster.png --row a.png b.png --row c.png --captions "Level 1" "Level 2" --gap 8
+"""
+
+import argparse
+import os
+import struct
+import sys
+import zlib
+
+import numpy as np
+
+from image_writer import PNG_SIGNATURE, PNGStreamWriter, png_chunk
+
+BAND_HEIGHT = 16          # output rows per band
+CAPTION_HEIGHT = 20
+
+
+# =============================================================================
+# Reading: PNG row bands
+# =============================================================================
+
+class PNGRowReader:
+    """
+    Reads a PNG top to bottom a band of rows at a time.
+
+    The IDAT stream is inflated incrementally and split into filtered
+    scanlines here; each band is then wrapped in a tiny stand-alone PNG (led by
+    the previous, already unfiltered row) so Pillow's C decoder undoes the
+    filters. Interlaced or 16-bit files fall back to a normal full decode.
+    """
+
+    CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+    def __init__(self, path):
+        self.path = path
+        self.fp = open(path, 'rb')
+        if self.fp.read(8) != PNG_SIGNATURE:
+            raise ValueError(f"{path}: not a PNG file")
+
+        self.extra_chunks = []     # PLTE / tRNS, copied into every band
+        self.pending = b''         # inflated but not yet consumed bytes
+        self.prev_row = None       # last row, unfiltered, in the file's own mode
+        self.rows_read = 0
+        self.inflater = zlib.decompressobj()
+        self.fallback = None
+
+        while True:
+            chunk_type, payload = self._read_chunk()
+            if chunk_type == b'IHDR':
+                self.header = payload
+                (self.width, self.height, self.bit_depth, self.color_type,
+                 _, _, interlace) = struct.unpack('>IIBBBBB', payload)
+            elif chunk_type in (b'PLTE', b'tRNS'):
+                self.extra_chunks.append(png_chunk(chunk_type, payload))
+            elif chunk_type == b'IDAT':
+                self.compressed = payload
+                break
+            elif chunk_type == b'IEND':
+                raise ValueError(f"{path}: no image data")
+
+        if self.bit_depth != 8 or interlace or self.color_type not in self.CHANNELS:
+            from PIL import Image
+            self.fp.close()
+            self.fallback = np.asarray(Image.open(path).convert('RGBA'))
+            return
+
+        self.stride = self.width * self.CHANNELS[self.color_type] + 1
+
+    def _read_chunk(self):
+        length, chunk_type = struct.unpack('>I4s', self.fp.read(8))
+        payload = self.fp.read(length)
+        self.fp.read(4)  # CRC
+        return chunk_type, payload
+
+    def _filtered_rows(self, count):
+        needed = count * self.stride
+        while len(self.pending) < needed:
+            # inflate no more than about one band ahead, however big the IDAT chunks are
+            if not self.compressed:
+                chunk_type, payload = self._read_chunk()
+                if chunk_type == b'IEND':
+                    self.pending += self.inflater.flush()
+                    if len(self.pending) < needed:
+                        raise ValueError(f"{self.path}: image data truncated")
+                    break
+                if chunk_type == b'IDAT':
+                    self.compressed = payload
+                continue
+            self.pending += self.inflater.decompress(self.compressed, needed - len(self.pending))
+            self.compressed = self.inflater.unconsumed_tail
+        data, self.pending = self.pending[:needed], self.pending[needed:]
+        return data
+
+    def read(self, count):
+        """Return the next `count` rows as an RGBA array (count, width, 4)."""
+        count = min(count, self.height - self.rows_read)
+        if self.fallback is not None:
+            band = self.fallback[self.rows_read:self.rows_read + count]
+            self.rows_read += count
+            return band
+
+        from PIL import Image
+        import io
+
+        raw = self._filtered_rows(count)
+        lead = b'' if self.prev_row is None else b'\x00' + self.prev_row
+        lead_rows = 0 if self.prev_row is None else 1
+
+        header = bytearray(self.header)
+        header[4:8] = struct.pack('>I', count + lead_rows)
+        band_png = (PNG_SIGNATURE + png_chunk(b'IHDR', bytes(header)) + b''.join(self.extra_chunks) +
+                    png_chunk(b'IDAT', zlib.compress(lead + raw, 0)) + png_chunk(b'IEND', b''))
+
+        img = Image.open(io.BytesIO(band_png))
+        img.load()
+        native = np.asarray(img)
+        self.prev_row = native[-1].tobytes()
+        self.rows_read += count
+        return np.asarray(img.convert('RGBA'))[lead_rows:]
+
+    def close(self):
+        if self.fallback is None:
+            self.fp.close()
+
+
+class ArrayRowReader:
+    """Same interface as PNGRowReader for images that are already decoded."""
+
+    def __init__(self, image):
+        if not isinstance(image, np.ndarray):
+            image = np.asarray(image.convert('RGBA') if image.mode != 'RGBA' else image)
+        if image.ndim == 2 or image.shape[2] != 4:
+            from PIL import Image
+            image = np.asarray(Image.fromarray(image).convert('RGBA'))
+        self.image = image
+        self.height, self.width = image.shape[:2]
+        self.rows_read = 0
+
+    def read(self, count):
+        band = self.image[self.rows_read:self.rows_read + count]
+        self.rows_read += len(band)
+        return band
+
+    def close(self):
+        pass
+
+
+def open_source(source):
+    """A PNG path is streamed, anything else is treated as an in-memory image."""
+    if isinstance(source, (str, os.PathLike)):
+        if str(source).lower().endswith('.png'):
+            return PNGRowReader(source)
+        from PIL import Image
+        return ArrayRowReader(Image.open(source))
+    return ArrayRowReader(source)
+
+
+def source_size(source):
+    """(width, height) without decoding any pixel data."""
+    if isinstance(source, (str, os.PathLike)):
+        from PIL import Image
+        with Image.open(source) as img:
+            return img.size
+    if isinstance(source, np.ndarray):
+        return source.shape[1], source.shape[0]
+    return source.size
+
+
+# =============================================================================
+# Layout and composition
+# =============================================================================
+
+def render_caption(text, width, height):
+    """White text with a black outline on a transparent strip."""
+    from PIL import Image, ImageDraw, ImageFont
+    try:
+        font = ImageFont.truetype("arial.ttf", height - 6)
+    except IOError:
+        font = ImageFont.load_default()
+    strip = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(strip)
+    for ox, oy in [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]:
+        draw.text((4 + ox, 2 + oy), text, font=font, fill=(0, 0, 0, 255))
+    draw.text((4, 2), text, font=font, fill=(255, 255, 255, 255))
+    return np.asarray(strip)
+
+
+def compose_panorama(rows, output_file, scale=1.0, gap=0, captions=None, background=(0, 0, 0, 0),
+                     band_height=BAND_HEIGHT, compress_level=6):
+    """
+    Compose rows of images into one PNG.
+    - rows: list of rows, each a list of sources (PNG path, PIL image or RGBA array)
+    - scale: nearest neighbour scale factor applied to every image
+    - gap: pixels between images and between rows
+    - captions: optional caption per row, drawn in a strip above it
+    """
+    # Plan: cell sizes, row heights and the canvas, from the headers only
+    layout = []
+    canvas_width = 0
+    canvas_height = 0
+    for row_num, row in enumerate(rows):
+        cells = []
+        x = 0
+        for source in row:
+            w, h = source_size(source)
+            out_w, out_h = max(1, round(w * scale)), max(1, round(h * scale))
+            cells.append((source, x, w, h, out_w, out_h))
+            x += out_w + gap
+        row_width = x - gap
+        caption = captions[row_num] if captions and row_num < len(captions) and captions[row_num] else None
+        row_height = max(cell[5] for cell in cells)
+        layout.append((cells, caption, row_height))
+        canvas_width = max(canvas_width, row_width)
+        canvas_height += row_height + (CAPTION_HEIGHT if caption else 0)
+    canvas_height += gap * (len(rows) - 1)
+
+    with open(output_file, 'wb') as fp:
+        writer = PNGStreamWriter(fp, canvas_width, canvas_height, compress_level)
+        background = np.array(background, dtype=np.uint8)
+
+        for row_num, (cells, caption, row_height) in enumerate(layout):
+            if caption:
+                band = np.empty((CAPTION_HEIGHT, canvas_width, 4), dtype=np.uint8)
+                band[:] = background
+                label = render_caption(caption, min(canvas_width, 1024), CAPTION_HEIGHT)
+                visible = label[:, :, 3:] > 0
+                band[:, :label.shape[1]] = np.where(visible, label, band[:, :label.shape[1]])
+                writer.write(band)
+
+            readers = [open_source(cell[0]) for cell in cells]
+            buffers = [(0, np.empty((0, cell[2], 4), dtype=np.uint8)) for cell in cells]
+            col_maps = [np.minimum((np.arange(cell[4]) / scale).astype(np.intp), cell[2] - 1) for cell in cells]
+
+            for y0 in range(0, row_height, band_height):
+                y1 = min(y0 + band_height, row_height)
+                band = np.empty((y1 - y0, canvas_width, 4), dtype=np.uint8)
+                band[:] = background
+
+                for i, (source, x, w, h, out_w, out_h) in enumerate(cells):
+                    if y0 >= out_h:
+                        continue
+                    out_rows = np.arange(y0, min(y1, out_h))
+                    src_rows = np.minimum((out_rows / scale).astype(np.intp), h - 1)
+
+                    # keep a window of source rows: drop what's behind, read what's needed
+                    first, buffered = buffers[i]
+                    next_row = first + len(buffered)
+                    if src_rows[0] >= next_row:
+                        # skipped when scaling down, still has to be decoded in order
+                        for _ in range(0, src_rows[0] - next_row, band_height):
+                            readers[i].read(min(band_height, src_rows[0] - readers[i].rows_read))
+                        first, buffered = src_rows[0], buffered[:0]
+                    else:
+                        buffered = buffered[src_rows[0] - first:]
+                        first = src_rows[0]
+                    missing = src_rows[-1] + 1 - (first + len(buffered))
+                    if missing > 0:
+                        buffered = np.concatenate([buffered, readers[i].read(missing)])
+                    buffers[i] = (first, buffered)
+
+                    band[:len(out_rows), x:x + out_w] = buffered[src_rows - first][:, col_maps[i]]
+
+                writer.write(band)
+
+            for reader in readers:
+                reader.close()
+
+            if gap and row_num < len(layout) - 1:
+                band = np.empty((gap, canvas_width, 4), dtype=np.uint8)
+                band[:] = background
+                writer.write(band)
+
+        writer.close()
+
+    print(f"Output: {output_file} ({canvas_width}x{canvas_height}) from "
+          f"{sum(len(row) for row in rows)} images in {len(rows)} rows")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stream many images into one poster PNG')
+    parser.add_argument('output_png', help='Output PNG file')
+    parser.add_argument('--row', nargs='+', action='append', required=True,
+                        help='Images for one row, left to right (repeat for more rows)')
+    parser.add_argument('--captions', nargs='+', help='One caption per row')
+    parser.add_argument('--scale', type=float, default=1.0, help='Scale factor for every image (default: 1)')
+    parser.add_argument('--gap', type=int, default=0, help='Pixels between images and rows (default: 0)')
+    parser.add_argument('--background', default="00000000", help='Background RGBA in hex (default: 00000000)')
+    parser.add_argument('--compress-level', type=int, default=6, help='zlib level (default: 6)')
+    args = parser.parse_args()
+
+    if not args.output_png.lower().endswith('.png'):
+        parser.error("output is written as a streaming PNG, use a .png name")
+    if args.scale <= 0:
+        parser.error("--scale must be positive")
+
+    background = tuple(bytes.fromhex(args.background.ljust(8, 'f')))
+    try:
+        compose_panorama(args.row, args.output_png, args.scale, args.gap, args.captions, background,
+                         compress_level=args.compress_level)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+png_import.py
+
+The other direction of map_renderer_offset.py: turns edited level images back
+into a level map (little-endian words, 64x32 per screen, screens side by side)
+that render_maps and encode_streams.py read.
+
+Every tile number a map word can hold (0-1FFFh) draws one fixed 8x8 RGBA block:
+its char from BG1.bin and palette group tile // 64. Those blocks are hashed
+into a dict once. The input image is cut into 8x8 cells and every cell is
+hashed at once with numpy (64 bit multiply/xor over the cell's bytes), so each
+cell is then a single dict lookup, checked pixel for pixel against the block it
+found.
+
+Transparent pixels are compared as (0, 0, 0, 0) whatever colour they hold, as
+colour 0 of every palette group is drawn transparent.
+
+With --reference (the original levelNmap.bin) a cell that still draws the same
+as the original word keeps that word, priority bits and all; only edited cells
+get a new word (with priority 0). Cells that match no block keep the reference
+word (or 0) and are listed.
+
+Usage:
+    python png_import.py BG1.bin palettes_level1-3.pal level1map_new.bin Level1/wide_00.png Level1/wide_01.png
+    python png_import.py BG1.bin palettes_level4-5.pal level4map_new.bin Level4/wide_00.png Level4/wide_01.png
+        --char-offset 20000 --reference level4map.bin
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from tile_bank import TileBank, build_palette_lut, BANK_MASK, TILE_SIZE
+from level_map import LevelMap, SCREEN_WIDTH, SCREEN_HEIGHT
+
+# odd 64 bit multipliers for the cell hash, one per 8 byte lane of a cell
+_rng = np.random.default_rng(0x16B)
+HASH_MULTIPLIERS = _rng.integers(1, 2**63, size=TILE_SIZE * TILE_SIZE * 4 // 8, dtype=np.uint64) | np.uint64(1)
+
+
+# =============================================================================
+# Blocks and hashing
+# =============================================================================
+
+def normalize(rgba: np.ndarray) -> np.ndarray:
+    """Clear the colour of fully transparent pixels so they all compare equal."""
+    rgba = rgba.copy()
+    rgba[rgba[..., 3] == 0] = 0
+    return rgba
+
+
+def hash_blocks(blocks: np.ndarray) -> np.ndarray:
+    """64 bit hash of every (8, 8, 4) uint8 block in an (n, 8, 8, 4) array."""
+    lanes = np.ascontiguousarray(blocks).reshape(len(blocks), -1).view(np.uint64)
+    mixed = lanes ^ (lanes >> np.uint64(29))
+    return (mixed * HASH_MULTIPLIERS).sum(axis=1, dtype=np.uint64)
+
+
+def cut_cells(image: np.ndarray) -> np.ndarray:
+    """(H, W, 4) image to (H/8, W/8, 8, 8, 4) cells."""
+    rows, cols = image.shape[0] // TILE_SIZE, image.shape[1] // TILE_SIZE
+    return image.reshape(rows, TILE_SIZE, cols, TILE_SIZE, 4).transpose(0, 2, 1, 3, 4)
+
+
+class BlockIndex:
+    """
+    Every tile number's 8x8 RGBA block, hashed for O(1) lookup.
+    - blocks: (n_tiles, 8, 8, 4) normalized RGBA
+    - lookup: hash -> lowest tile number drawing that block
+    """
+
+    def __init__(self, bank: TileBank, palette_lut: np.ndarray):
+        n_tiles = min(len(bank), BANK_MASK + 1)
+        tiles = np.arange(n_tiles, dtype=np.uint16).reshape(1, -1)
+        pixels, _ = bank.render_indexed(tiles)
+        self.blocks = normalize(cut_cells(palette_lut[pixels])[0])
+        self.hashes = hash_blocks(self.blocks)
+        self.lookup = {}
+        for tile, digest in enumerate(self.hashes.tolist()):
+            self.lookup.setdefault(digest, tile)
+
+    def match(self, cells: np.ndarray) -> (np.ndarray, np.ndarray):
+        """
+        Tile number for every (8, 8, 4) cell of an (n, 8, 8, 4) array.
+        Returns (tiles, matched) with tiles -1 where nothing matched.
+        """
+        digests = hash_blocks(cells).tolist()
+        tiles = np.array([self.lookup.get(digest, -1) for digest in digests], dtype=np.int64)
+        found = tiles >= 0
+        # a hash hit has to be the same block, pixel for pixel
+        same = (self.blocks[tiles[found]] == cells[found]).all(axis=(1, 2, 3))
+        found[np.flatnonzero(found)[~same]] = False
+        tiles[~found] = -1
+        return tiles, found
+
+    def closest(self, cell: np.ndarray) -> (int, int):
+        """(tile, differing pixels) of the block nearest to a cell, for the report."""
+        diff = (self.blocks != cell).any(axis=3).reshape(len(self.blocks), -1).sum(axis=1)
+        tile = int(diff.argmin())
+        return tile, int(diff[tile])
+
+
+# =============================================================================
+# Import
+# =============================================================================
+
+def load_images(image_files) -> np.ndarray:
+    """The input images side by side as one (256, W, 4) RGBA array."""
+    from PIL import Image
+    parts = [np.asarray(Image.open(path).convert('RGBA')) for path in image_files]
+    for path, part in zip(image_files, parts):
+        height, width = part.shape[:2]
+        if height != SCREEN_HEIGHT * TILE_SIZE or width % (SCREEN_WIDTH * TILE_SIZE):
+            raise ValueError(f"{path}: {width}x{height} is not a row of whole "
+                             f"{SCREEN_WIDTH * TILE_SIZE}x{SCREEN_HEIGHT * TILE_SIZE} screens")
+    return np.hstack(parts)
+
+
+def import_level(image: np.ndarray, index: BlockIndex, reference=None) -> (np.ndarray, np.ndarray, np.ndarray):
+    """
+    Map words for a (256, W, 4) image of screens side by side.
+    - reference: LevelMap of the original level, whose words are kept where they still match
+    Returns (words, unmatched, cells): (screens, 32, 64) uint16 words, a bool
+    array of the cells nothing matched, and the normalized cells in map order.
+    """
+    cells = cut_cells(normalize(image))                    # (32, screens * 64, 8, 8, 4)
+    n_screens = cells.shape[1] // SCREEN_WIDTH
+    cells = cells.reshape(SCREEN_HEIGHT, n_screens, SCREEN_WIDTH, TILE_SIZE, TILE_SIZE, 4).transpose(1, 0, 2, 3, 4, 5)
+    flat = cells.reshape(-1, TILE_SIZE, TILE_SIZE, 4)
+
+    tiles, found = index.match(flat)
+    words = np.where(found, tiles, 0).astype(np.uint16)
+
+    if reference is not None:
+        ref = reference.words[:n_screens].reshape(-1)
+        ref_tiles = (ref & BANK_MASK).astype(np.intp)
+        usable = ref_tiles < len(index.blocks)
+        # cells that still draw what the original word draws keep it unchanged
+        same = np.zeros(len(words), dtype=bool)
+        same[usable] = (index.blocks[ref_tiles[usable]] == flat[usable]).all(axis=(1, 2, 3))
+        words = np.where(same | ~found, ref, words)
+        found |= same
+
+    shape = (n_screens, SCREEN_HEIGHT, SCREEN_WIDTH)
+    return words.reshape(shape), ~found.reshape(shape), flat
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import level images back into a level map')
+    parser.add_argument('char_file', help='Char data (BG1.bin)')
+    parser.add_argument('palette_file', help='Level palette (.pal)')
+    parser.add_argument('output_map', help='Level map to write (levelNmap.bin format)')
+    parser.add_argument('images', nargs='+', help='Images of whole screens, in order (e.g. wide_00.png wide_01.png)')
+    parser.add_argument('--char-offset', default="0", help='Char offset in hex, 20000 for levels 4 and 5 (default: 0)')
+    parser.add_argument('--reference', help='Original level map: unchanged cells keep their word and priority bits')
+    parser.add_argument('--list', type=int, default=20, help='Unmatched cells listed (default: 20)')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        bank = TileBank.load(args.char_file, int(args.char_offset, 16))
+        with open(args.palette_file, 'rb') as f:
+            palette_lut = build_palette_lut(f.read())
+        image = load_images(args.images)
+        reference = LevelMap.load(args.reference) if args.reference else None
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    index = BlockIndex(bank, palette_lut)
+    indexed = time.perf_counter()
+    if reference is not None and len(reference) * SCREEN_WIDTH * TILE_SIZE < image.shape[1]:
+        print("Error: reference map has fewer screens than the images")
+        sys.exit(1)
+
+    words, unmatched, cells = import_level(image, index, reference)
+    with open(args.output_map, 'wb') as f:
+        f.write(LevelMap(words).tobytes())
+
+    n_screens = len(words)
+    print(f"Index: {len(index.blocks)} tiles, {len(index.lookup)} distinct blocks")
+    print(f"Imported {n_screens} screens ({words.size} cells) to {args.output_map}, "
+          f"{int(unmatched.sum())} cells unmatched")
+
+    for screen, y, x in np.argwhere(unmatched)[:args.list]:
+        cell = cells[(screen * SCREEN_HEIGHT + y) * SCREEN_WIDTH + x]
+        tile, diff = index.closest(cell)
+        print(f"Unmatched: screen {screen} pos [{x:X},{y:X}] pixel ({(screen * SCREEN_WIDTH + x) * TILE_SIZE},"
+              f"{y * TILE_SIZE}), closest tile {tile:X}h ({diff} pixels differ)")
+    if unmatched.sum() > args.list:
+        print(f"... {int(unmatched.sum()) - args.list} more")
+
+    print(f"Index {indexed - start:.2f} s, match {time.perf_counter() - indexed:.2f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+pointer_scan.py
+
+Finds pointer tables in code.bin (or any 68000 program ROM) instead of hunting
+for them by hand: the level table at 0x1CE2, the sprite master table at
+0x255E0 and the tables that lead to the palette blocks all have the same shape,
+a run of entries a fixed number of bytes apart holding a pointer or an offset.
+
+Every even offset is read both ways at once (68000 words and longs have to be
+even, so that covers the 0 and 2 alignments of the longs):
+  · long pointers - big-endian longs below --limit (the program ROM, or the
+                    sprite ROM the master table points into)
+  · word offsets  - big-endian words counted from the start of the table, like
+                    the master table's offsets to its size entries and 68000
+                    jump tables: even, non-zero and below --word-window
+For every entry size (stride) the entries are lined up phase by phase and the
+runs of valid ones found with one diff, then each run is scored with prefix
+sums over the same sequence, no loop over offsets:
+  · changing   - consecutive entries differ (a run of 0000s is padding)
+  · ascending  - targets go up, as tables of data laid out in order do
+  · regular    - the step from one target to the next repeats
+A run sharing bytes with a better run (the same table at twice the stride,
+the low half of its longs) is dropped; of two long columns a word apart, the
+one whose shared word counts up or stays the same as the other's high halves
+ranks lower (a long read a word early, across a counter and a pointer). The other words of each entry of a
+table are then classed as fields: word offsets past the table (the master
+table's size offsets), a counter (the level table's page numbers), a constant
+or any other word.
+
+Usage:
+    python pointer_scan.py code.bin
+    python pointer_scan.py code.bin --top 40 --max-stride 32 --min-entries 6
+    python pointer_scan.py code.bin --limit 80000 --targets
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+MAX_STRIDE = 16          # bytes
+MIN_ENTRIES = 4
+MIN_WORD_ENTRIES = 8     # word offsets are much easier to hit by chance
+POINTER_LIMIT = 0x100000
+WORD_WINDOW = 0x8000
+MIN_SCORE = 3.0
+MIN_ORDERED = 0.8        # share of entries ascending (or evenly stepped) from the last
+
+
+# =============================================================================
+# Reading the ROM as words and longs
+# =============================================================================
+
+def read_columns(rom: bytes) -> (np.ndarray, np.ndarray):
+    """
+    Big-endian words and longs at every even offset: words[i] and longs[i]
+    start at byte 2 * i (the last long is 0, there's no room for it).
+    """
+    words = np.frombuffer(rom, dtype='>u2', count=len(rom) // 2).astype(np.int64)
+    longs = np.zeros(len(words), dtype=np.int64)
+    longs[:-1] = (words[:-1] << 16) | words[1:]
+    return words, longs
+
+
+def long_targets(longs: np.ndarray, limit: int) -> (np.ndarray, np.ndarray):
+    """Targets of longs read as pointers, and which of them are valid."""
+    return longs, (longs > 0) & (longs < limit)
+
+
+def word_targets(words: np.ndarray, window: int) -> (np.ndarray, np.ndarray):
+    """
+    Word offsets and which of them could be valid. The targets are counted
+    from the table start, which isn't known yet, so they're compared as the
+    raw offsets here and checked against the table span once runs are found.
+    """
+    valid = (words > 0) & (words < window) & (words % 2 == 0)
+    return words, valid
+
+
+# =============================================================================
+# Runs at a stride
+# =============================================================================
+
+def stride_runs(values: np.ndarray, valid: np.ndarray, stride: int, min_entries: int) -> dict:
+    """
+    Every run of at least min_entries valid entries `stride` bytes apart.
+    The word positions are laid out phase by phase (0, k, 2k, ... then 1,
+    k+1, ...; k = stride / 2) with a gap after each phase so runs can't join
+    across phases, then runs, step counts and scores come from diffs and
+    prefix sums of that one sequence.
+    Returns arrays: start (byte offset), entries, changing, ascending, regular.
+    """
+    k = stride // 2
+    rows = (len(values) + k - 1) // k
+    index = np.arange(rows * k).reshape(rows, k).T
+    index = np.concatenate([index, np.full((k, 1), -1)], axis=1).ravel()
+    inside = (index >= 0) & (index < len(values))
+    index = np.where(inside, index, 0)
+    v = values[index]
+    ok = valid[index] & inside
+
+    edges = np.diff(np.concatenate(([0], ok.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    long_enough = ends - starts >= min_entries
+    starts, ends = starts[long_enough], ends[long_enough]
+
+    def pair_sums(flags):
+        # sum of flags[j] for j in start .. end - 2 (pairs inside the run)
+        sums = np.concatenate(([0], np.cumsum(flags)))
+        return sums[ends - 1] - sums[starts]
+
+    step = np.diff(v)
+    changing = pair_sums(step != 0)
+    ascending = pair_sums(step > 0)
+    same_step = np.concatenate(([False], step[1:] == step[:-1], [False]))
+    regular = pair_sums(same_step[:-1]) - (ends - starts > 1) * same_step[starts]
+
+    return {
+        'start': index[starts] * 2,
+        'entries': ends - starts,
+        'changing': changing,
+        'ascending': ascending,
+        'regular': regular,
+    }
+
+
+def score_runs(runs: dict) -> np.ndarray:
+    """
+    Entries weighted by how table-like the run is: all entries changing and
+    all ascending (or evenly stepped) scores the entry count, padding 0.
+    Runs that go up no more often than random data (half the time) score 0.
+    """
+    pairs = np.maximum(runs['entries'] - 1, 1)
+    changing = runs['changing'] / pairs
+    ordered = np.maximum(runs['ascending'], runs['regular']) / pairs
+    return np.where(ordered >= MIN_ORDERED, runs['entries'] * changing * ordered, 0.0)
+
+
+def find_runs(values: np.ndarray, valid: np.ndarray, kind: str, strides, min_entries: int,
+              min_score: float) -> list:
+    """Scored runs of one kind ('long' or 'word') at every stride, as dicts."""
+    found = []
+    for stride in strides:
+        runs = stride_runs(values, valid, stride, min_entries)
+        score = score_runs(runs)
+        for i in np.flatnonzero(score >= min_score):
+            found.append({
+                'kind': kind,
+                'start': int(runs['start'][i]),
+                'stride': stride,
+                'entries': int(runs['entries'][i]),
+                'ascending': int(runs['ascending'][i]),
+                'score': float(score[i]),
+            })
+    return found
+
+
+# =============================================================================
+# Candidate tables
+# =============================================================================
+
+def field_values(values: np.ndarray, run: dict) -> np.ndarray:
+    first = run['start'] // 2
+    return values[first:first + run['entries'] * (run['stride'] // 2):run['stride'] // 2]
+
+
+def check_word_targets(words: np.ndarray, runs: list, rom_size: int) -> list:
+    """
+    Word offsets count from the table start, so they have to point past the
+    table (and inside the ROM).
+    """
+    kept = []
+    for run in runs:
+        offsets = field_values(words, run)
+        span = run['entries'] * run['stride']
+        if ((offsets >= span) & (run['start'] + offsets < rom_size)).all():
+            kept.append(run)
+    return kept
+
+
+def extend_to_zero(longs: np.ndarray, runs: list, rom_size: int) -> list:
+    """
+    A table of offsets into another ROM often starts at 0, which isn't a valid
+    pointer on its own. Only columns reaching past this ROM are extended, a 0
+    before pointers into the ROM itself is padding or code.
+    """
+    for run in runs:
+        before = run['start'] // 2 - run['stride'] // 2
+        targets = field_values(longs, run)
+        if before >= 0 and longs[before] == 0 and targets[0] > 0 and targets.max() >= rom_size:
+            run['start'] -= run['stride']
+            run['entries'] += 1
+    return runs
+
+
+FIELD_SIZE = {'word': 2, 'long': 4}
+
+
+def fields_overlap(a: dict, b: dict) -> bool:
+    """Whether column b shares bytes with the entries of column a (b's stride a multiple of a's)."""
+    shift = (b['start'] - a['start']) % a['stride']
+    return shift < FIELD_SIZE[a['kind']] or a['stride'] - shift < FIELD_SIZE[b['kind']]
+
+
+def demote_early_longs(runs: list, words: np.ndarray, rom_size: int) -> list:
+    """
+    Long columns at the same stride a word apart share that word: the low
+    half of the earlier column, the high half of the later one. Pointers that
+    go up have high halves that count up or stay the same, so when the shared
+    word does that the earlier column is a long read a word too early (the
+    level table's page number and the top of its pointer), and it is ranked
+    just below the later column, so that one wins the overlap.
+    """
+    longs = [run for run in runs if run['kind'] == 'long']
+    for early in longs:
+        for late in longs:
+            if (late['stride'] != early['stride'] or (late['start'] - early['start']) % early['stride'] != 2 or
+                    not (late['start'] < early['start'] + early['entries'] * early['stride'] and
+                         early['start'] < late['start'] + late['entries'] * late['stride'])):
+                continue
+            shared = field_values(words, dict(early, start=early['start'] + 2))
+            kind = classify_words(shared, early['start'], early['entries'] * early['stride'], rom_size)['kind']
+            if kind in ('counter', 'constant') and early['score'] >= late['score']:
+                early['score'] = late['score']
+                early['early'] = True
+    return runs
+
+
+def best_columns(runs: list) -> list:
+    """
+    Best first, without the runs that share bytes with a better run of the
+    same stride or a divisor of it: the same table read sparsely, the low
+    half of its longs, a long across two of its words.
+    """
+    accepted = []
+    for run in sorted(runs, key=lambda r: (-r['score'], r.get('early', False))):
+        end = run['start'] + run['entries'] * run['stride']
+        if not any(run['stride'] % a['stride'] == 0 and a['start'] < end and
+                   run['start'] < a['start'] + a['entries'] * a['stride'] and fields_overlap(a, run)
+                   for a in accepted):
+            accepted.append(run)
+    return accepted
+
+
+def classify_words(values: np.ndarray, table_start: int, span: int, rom_size: int) -> dict:
+    """What a word field of a table holds, from its values in every entry."""
+    if ((values > 0) & (values % 2 == 0) & (values >= span) & (table_start + values < rom_size)).all():
+        targets = values + table_start
+        return {'kind': 'word offset', 'low': int(targets.min()), 'high': int(targets.max())}
+    if (values == values[0]).all():
+        return {'kind': 'constant', 'low': int(values[0]), 'high': int(values[0])}
+    steps = np.diff(values)
+    kind = 'counter' if (steps >= 0).all() else 'word'
+    return {'kind': kind, 'low': int(values.min()), 'high': int(values.max())}
+
+
+def build_table(column: dict, words: np.ndarray, longs: np.ndarray, rom_size: int) -> dict:
+    """
+    A table around a pointer column: the other words of each entry become its
+    fields. Where the column doesn't fill the entry, the word before it
+    belongs to the entry if it holds offsets past the table or counts up (the
+    level table's page numbers); otherwise the entry starts at the column.
+    """
+    stride, entries = column['stride'], column['entries']
+    size = FIELD_SIZE[column['kind']]
+    span = stride * entries
+    rows = (column['start'] // 2 + np.arange(entries) * (stride // 2))
+    start = column['start']
+    if stride > size and column['start'] >= 2:
+        before = classify_words(words[rows - 1], column['start'] - 2, span, rom_size)
+        if before['kind'] in ('word offset', 'counter'):
+            start -= 2
+
+    first = start // 2
+    fields = []
+    for slot in range(0, stride, 2):
+        address = start + slot
+        if address == column['start']:
+            targets = (longs if column['kind'] == 'long' else words)[rows]
+            if column['kind'] == 'word':
+                targets = targets + start
+            fields.append({'offset': slot, 'kind': f"{column['kind']} pointer" if column['kind'] == 'long'
+                           else 'word offset', 'low': int(targets.min()), 'high': int(targets.max())})
+        elif column['start'] < address < column['start'] + size:
+            continue
+        else:
+            values = words[first + slot // 2 + np.arange(entries) * (stride // 2)]
+            fields.append(dict(offset=slot, **classify_words(values, start, span, rom_size)))
+    # offsets past the table in another field back the pointers up, once there
+    # are enough entries that they're unlikely to get there by chance
+    if entries >= MIN_WORD_ENTRIES:
+        extra = sum(f['kind'] == 'word offset' for f in fields if f['offset'] != column['start'] - start)
+    else:
+        extra = 0
+    score = column['score'] + extra * entries
+    return {'start': start, 'end': start + span, 'stride': stride, 'entries': entries,
+            'score': score, 'column': column, 'fields': fields}
+
+
+def scan(rom: bytes, limit: int = POINTER_LIMIT, word_window: int = WORD_WINDOW, max_stride: int = MAX_STRIDE,
+         min_entries: int = MIN_ENTRIES, min_word_entries: int = MIN_WORD_ENTRIES,
+         min_score: float = MIN_SCORE) -> list:
+    """Candidate tables in a program ROM, best first."""
+    words, longs = read_columns(rom)
+    pointers, pointer_ok = long_targets(longs, limit)
+    offsets, offset_ok = word_targets(words, word_window)
+
+    runs = find_runs(pointers, pointer_ok, 'long', range(4, max_stride + 1, 2), min_entries, min_score)
+    runs = extend_to_zero(longs, runs, len(rom))
+    # pointers into the ROM itself beat pointers past its end (--limit is there
+    # for the sprite ROM), which also settles a long read a word too early
+    for run in runs:
+        run['score'] *= 0.5 + 0.5 * float((field_values(longs, run) < len(rom)).mean())
+    # a word column on its own has to go up at every entry, like a jump table
+    word_runs = find_runs(offsets, offset_ok, 'word', range(2, max_stride + 1, 2), min_word_entries, min_score)
+    word_runs = [run for run in word_runs if run['ascending'] == run['entries'] - 1]
+    runs += check_word_targets(words, word_runs, len(rom))
+    runs = demote_early_longs(runs, words, len(rom))
+
+    tables = []
+    for column in best_columns(runs):
+        inside = any(t['stride'] == column['stride'] and t['start'] <= column['start'] < t['end'] for t in tables)
+        if not inside:
+            tables.append(build_table(column, words, longs, len(rom)))
+    tables.sort(key=lambda t: -t['score'])
+    return tables
+
+
+def describe_field(field: dict) -> str:
+    if field['kind'] in ('long pointer', 'word offset'):
+        return f"+{field['offset']} {field['kind']} to {field['low']:X}h-{field['high']:X}h"
+    if field['kind'] == 'constant':
+        return f"+{field['offset']} word, always {field['low']:04X}h"
+    return f"+{field['offset']} {field['kind']}, {field['low']:04X}h-{field['high']:04X}h"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Find pointer and offset tables in a 68000 program ROM')
+    parser.add_argument('code_bin', help='Program ROM (code.bin)')
+    parser.add_argument('--limit', default=f"{POINTER_LIMIT:x}",
+                        help=f'Pointers must be below this (hex, default: {POINTER_LIMIT:X})')
+    parser.add_argument('--word-window', default=f"{WORD_WINDOW:x}",
+                        help=f'Word offsets must be below this (hex, default: {WORD_WINDOW:X})')
+    parser.add_argument('--max-stride', type=int, default=MAX_STRIDE,
+                        help=f'Largest entry size tried in bytes (default: {MAX_STRIDE})')
+    parser.add_argument('--min-entries', type=int, default=MIN_ENTRIES,
+                        help=f'Fewest pointers in a table (default: {MIN_ENTRIES}, word offsets {MIN_WORD_ENTRIES})')
+    parser.add_argument('--min-score', type=float, default=MIN_SCORE,
+                        help=f'Lowest table score listed (default: {MIN_SCORE})')
+    parser.add_argument('--top', type=int, default=20, help='Tables listed (default: 20)')
+    parser.add_argument('--targets', action='store_true', help='List every target of the listed tables')
+    args = parser.parse_args()
+
+    try:
+        with open(args.code_bin, 'rb') as f:
+            rom = f.read()
+        limit = int(args.limit, 16)
+        word_window = int(args.word_window, 16)
+        if args.max_stride < 4 or args.max_stride % 2:
+            raise ValueError(f"--max-stride must be even and 4 or more, got {args.max_stride}")
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    tables = scan(rom, limit, word_window, args.max_stride, args.min_entries,
+                  max(args.min_entries, MIN_WORD_ENTRIES), args.min_score)
+    elapsed = time.perf_counter() - start
+
+    print(f"Scanned {len(rom):X}h bytes in {elapsed * 1000:.1f} ms, {len(tables)} candidate tables\n")
+    if not tables:
+        return
+    words, longs = read_columns(rom)
+    print(f"{'Table':>8}  {'Entry':>5}  {'Count':>5}  {'Score':>6}  Fields")
+    for table in tables[:args.top]:
+        fields = [describe_field(f) for f in table['fields']]
+        print(f"{table['start']:>7X}h  {table['stride']:>5}  {table['entries']:>5}  {table['score']:>6.1f}  {fields[0]}")
+        for field in fields[1:]:
+            print(f"{'':>31}{field}")
+        if args.targets:
+            column = table['column']
+            targets = field_values(longs if column['kind'] == 'long' else words, column)
+            if column['kind'] == 'word':
+                targets = targets + table['start']
+            print(f"{'':>31}" + " ".join(f"{t:X}" for t in targets))
+
+if __name__ == '__main__':
+    main()
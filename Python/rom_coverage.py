@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+"""
+rom_coverage.py
+
+Which bytes of code.bin and the sprite ROM the tools account for, and which
+are still unknown.
+
+  · index    - CoverageIndex takes labelled [start, end) ranges, one at a time
+               or as whole arrays. build() sorts them by label and start and
+               merges overlapping or touching ranges of a label with a running
+               maximum of the ends. The merged ranges replace the raw ones and
+               stay in that order, so adding more later sorts only the new ones
+               and slots them in.
+  · segments - the covered bytes cut wherever the set of labels changes. Every
+               merged range adds its label's bit at its start and takes it
+               away at its end; one sort of those edges and a cumulative sum
+               give each segment's label mask (so at most 63 labels).
+               labels_at() is a searchsorted over the segment starts (big
+               batches of offsets are sorted first).
+  · gaps     - what no range covers, up to the end of the file
+  · sources  - the ranges the decoders read:
+                 level table, level streams (where decode_low_plane and
+                 decode_high_plane stop), the savebit palette ranges of
+                 rom_set.py, the master table and its size entries, each
+                 sprite's data span in the sprite ROM (data_ptr + row words,
+                 row words x height), the blocks of a misc_batch.py manifest
+                 (misc images at 26c20/28b84, the beast map at 199a)
+               and a log file: with ALTERED_COVERAGE=<file> set, savebit.py and
+               decode_streams.py append every range they read to it, so a
+               make-everything.bat run records its own coverage.
+
+Outputs: a JSON coverage map (label totals, regions with their labels, gaps)
+and a strip image per file, one pixel per --bytes-per-pixel bytes coloured by
+the first label covering the pixel's first byte, unknown bytes dark grey.
+
+Usage:
+    python rom_coverage.py code.bin swapped_all-sprites.bin coverage.json
+    python rom_coverage.py code.bin swapped_all-sprites.bin coverage.json --manifest misc_images.json --strip coverage.png
+    set ALTERED_COVERAGE=reads.log && make-everything.bat
+    python rom_coverage.py code.bin swapped_all-sprites.bin coverage.json --log reads.log
+    python rom_coverage.py --benchmark 5000000
+"""
+
+import argparse
+import colorsys
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+LOG_VARIABLE = 'ALTERED_COVERAGE'
+MAX_LABELS = 63
+SORT_QUERIES = 1 << 16     # sort query offsets first beyond this many
+STRIP_WIDTH = 1024
+BYTES_PER_PIXEL = 16
+ROW_HEIGHT = 4
+LEGEND_HEIGHT = 20
+UNKNOWN_COLOR = (48, 48, 48)
+
+
+# =============================================================================
+# The log hook
+# =============================================================================
+
+def record(source, start: int, end: int, label: str):
+    """Append a [start, end) range read from `source` to the log named by ALTERED_COVERAGE, if set."""
+    path = os.environ.get(LOG_VARIABLE)
+    if not path:
+        return
+    with open(path, 'a') as f:
+        f.write(f"{os.path.basename(source)}\t{start:X}\t{end:X}\t{label}\n")
+
+
+def read_log(path) -> dict:
+    """{source file name: [(start, end, label), ...]} of a coverage log."""
+    ranges = {}
+    with open(path, 'r') as f:
+        for line_num, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                source, start, end, label = line.rstrip('\n').split('\t')
+                ranges.setdefault(source, []).append((int(start, 16), int(end, 16), label))
+            except ValueError:
+                raise ValueError(f"{path} line {line_num}: expected source, start, end, label")
+    return ranges
+
+
+# =============================================================================
+# The interval index
+# =============================================================================
+
+class CoverageIndex:
+    """
+    Labelled byte ranges of one file.
+    - labels: label names, a label's bit in the segment masks is its index
+    - size: file size, where the last gap ends
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.labels = []
+        self._ids = {}
+        self._single = []
+        self._pending = []
+        self._merged = (np.zeros(0, dtype=np.int64),) * 3
+        self._segments = None
+
+    def label_id(self, label: str) -> int:
+        if label not in self._ids:
+            if len(self.labels) == MAX_LABELS:
+                raise ValueError(f"More than {MAX_LABELS} labels (adding '{label}')")
+            self._ids[label] = len(self.labels)
+            self.labels.append(label)
+        return self._ids[label]
+
+    def add(self, start: int, end: int, label: str):
+        """Register [start, end)."""
+        self._single.append((start, end, self.label_id(label)))
+        self._segments = None
+
+    def add_many(self, starts, ends, label: str):
+        """Register [starts[i], ends[i]) for every i, all with one label."""
+        starts = np.asarray(starts, dtype=np.int64).reshape(-1)
+        ends = np.asarray(ends, dtype=np.int64).reshape(-1)
+        if len(starts) != len(ends):
+            raise ValueError("starts and ends differ in length")
+        self._pending.append((starts, ends, np.full(len(starts), self.label_id(label), dtype=np.int64)))
+        self._segments = None
+
+    def _merge(self):
+        """Fold everything added since the last merge into the merged ranges per label."""
+        if self._single:
+            self._pending.append(tuple(np.array(column, dtype=np.int64) for column in zip(*self._single)))
+            self._single = []
+        if not self._pending:
+            return
+        starts, ends, ids = (np.concatenate(parts) for parts in zip(*self._pending))
+        self._pending = []
+        keep = ends > starts
+        starts, ends, ids = starts[keep], ends[keep], ids[keep]
+        if len(starts) == 0:
+            return
+
+        # sort the new ranges by label then start (labels apart by more than any
+        # end) and slot them in between the merged ones, which are in that order
+        old_starts, old_ends, old_ids = self._merged
+        spread = int(max(ends.max(), old_ends.max(initial=0))) + 1
+        order = np.argsort(ids * spread + starts)
+        starts, ends, ids = starts[order], ends[order], ids[order]
+        if len(old_starts):
+            starts, ends, ids = self._slot_in(spread, starts, ends, ids)
+
+        # running maximum of the ends within each label
+        reach = np.maximum.accumulate(ids * spread + ends) - ids * spread
+        new = np.ones(len(starts), dtype=bool)
+        new[1:] = (ids[1:] != ids[:-1]) | (starts[1:] > reach[:-1])
+        first = np.flatnonzero(new)
+        self._merged = (starts[first], np.maximum.reduceat(ends, first), ids[first])
+
+    def _slot_in(self, spread, starts, ends, ids):
+        """The merged ranges with sorted new ones inserted in order, as (starts, ends, ids)."""
+        old_starts, old_ends, old_ids = self._merged
+        slots = np.searchsorted(old_ids * spread + old_starts, ids * spread + starts) + np.arange(len(starts))
+        is_new = np.zeros(len(old_starts) + len(starts), dtype=bool)
+        is_new[slots] = True
+        columns = []
+        for old, added in ((old_starts, starts), (old_ends, ends), (old_ids, ids)):
+            column = np.empty(len(is_new), dtype=np.int64)
+            column[is_new] = added
+            column[~is_new] = old
+            columns.append(column)
+        return columns
+
+    def build(self):
+        """
+        The segments: (starts, ends, masks), sorted, covered bytes only.
+        Cached until the next add.
+        """
+        if self._segments is not None:
+            return self._segments
+        self._merge()
+        starts, ends, ids = self._merged
+        bits = np.left_shift(np.int64(1), ids)
+        edges = np.concatenate((starts, ends))
+        order = np.argsort(edges, kind='stable')
+        edges = edges[order]
+        masks = np.cumsum(np.concatenate((bits, -bits))[order])
+
+        # the mask after the last edge at each position holds up to the next position
+        last = np.ones(len(edges), dtype=bool)
+        last[:-1] = edges[1:] != edges[:-1]
+        bounds, masks = edges[last], masks[last]
+        covered = masks[:-1] != 0
+        self._segments = (bounds[:-1][covered], bounds[1:][covered], masks[:-1][covered])
+        return self._segments
+
+    def masks_at(self, offsets) -> np.ndarray:
+        """Label mask covering each offset (0 = unknown)."""
+        starts, ends, masks = self.build()
+        offsets = np.asarray(offsets, dtype=np.int64)
+        if len(starts) == 0:
+            return np.zeros(offsets.shape, dtype=np.int64)
+        if offsets.size > SORT_QUERIES:
+            # sorted queries walk the segments in order instead of jumping around memory
+            order = np.argsort(offsets, axis=None)
+            i = np.empty(offsets.size, dtype=np.int64)
+            i[order] = np.searchsorted(starts, offsets.reshape(-1)[order], side='right')
+            i = i.reshape(offsets.shape)
+        else:
+            i = np.searchsorted(starts, offsets, side='right')
+        i = np.maximum(i - 1, 0)
+        return np.where((offsets >= starts[i]) & (offsets < ends[i]), masks[i], 0)
+
+    def labels_at(self, offset: int) -> list:
+        return self.mask_labels(int(self.masks_at([offset])[0]))
+
+    def mask_labels(self, mask: int) -> list:
+        return [label for i, label in enumerate(self.labels) if mask >> i & 1]
+
+    def gaps(self):
+        """(starts, ends) of the bytes no range covers, within the file."""
+        starts, ends, _ = self.build()
+        inside = starts < self.size
+        starts, ends = starts[inside], np.minimum(ends[inside], self.size)
+        gap_starts = np.concatenate(([0], ends))
+        gap_ends = np.concatenate((starts, [self.size]))
+        keep = gap_ends > gap_starts
+        return gap_starts[keep], gap_ends[keep]
+
+    def label_bytes(self) -> dict:
+        """Bytes of the file covered per label."""
+        self.build()
+        starts, ends, ids = self._merged
+        lengths = np.minimum(ends, self.size) - np.minimum(starts, self.size)
+        totals = np.bincount(ids, weights=lengths, minlength=len(self.labels))
+        return {label: int(totals[i]) for i, label in enumerate(self.labels)}
+
+    def to_dict(self) -> dict:
+        starts, ends, masks = self.build()
+        gap_starts, gap_ends = self.gaps()
+        covered = int(np.minimum(ends, self.size).sum() - np.minimum(starts, self.size).sum())
+        return {
+            'size': self.size,
+            'covered': covered,
+            'unknown': self.size - covered,
+            'labels': self.label_bytes(),
+            'regions': [{'start': int(s), 'end': int(e), 'labels': self.mask_labels(int(m))}
+                        for s, e, m in zip(starts, ends, masks)],
+            'gaps': [{'start': int(s), 'end': int(e)} for s, e in zip(gap_starts, gap_ends)],
+        }
+
+
+# =============================================================================
+# What the decoders read
+# =============================================================================
+
+def add_level_streams(index: CoverageIndex, code: bytes):
+    """The level table and both RLE streams of every level."""
+    from decode_streams import (LEVEL_OFFSETS, NUM_ENTRIES, TABLE_BASE_OFFSET, ENTRY_SIZE,
+                                decode_low_plane, decode_high_plane)
+    index.add(TABLE_BASE_OFFSET, TABLE_BASE_OFFSET + ENTRY_SIZE * NUM_ENTRIES, 'level table')
+    for level, offset in enumerate(LEVEL_OFFSETS[:NUM_ENTRIES], start=1):
+        try:
+            _, high_start = decode_low_plane(code, offset)
+            _, end = decode_high_plane(code, high_start)
+        except (ValueError, IndexError):
+            print(f"Level {level} stream at {offset:X}h doesn't decode, left out")
+            continue
+        index.add(offset, high_start, f'level {level} low')
+        index.add(high_start, end, f'level {level} high')
+
+
+def add_palettes(index: CoverageIndex):
+    """The savebit palette ranges make-everything.bat extracts."""
+    from rom_set import BASE_PALETTE, LEVEL_PALETTES, SPRITE_PALETTES
+    ranges = [('base palette', BASE_PALETTE), ('sprite palettes', SPRITE_PALETTES)]
+    ranges += [(f'{name} palette', extent) for name, extent in LEVEL_PALETTES.items()]
+    for label, (offset, length) in ranges:
+        index.add(offset, offset + length, label)
+
+
+def add_sprites(code_index: CoverageIndex, sprite_index: CoverageIndex, code: bytes):
+    """The master table, the size entries it points to, and every sprite's data span."""
+    from asset_db import MASTER_TABLE_OFFSET, MASTER_ENTRY_SIZE
+    from sprite_lines import SPRITE_COUNT, read_table
+    count = min(SPRITE_COUNT, (len(code) - MASTER_TABLE_OFFSET) // MASTER_ENTRY_SIZE)
+    if count <= 0:
+        return
+    code_index.add(MASTER_TABLE_OFFSET, MASTER_TABLE_OFFSET + count * MASTER_ENTRY_SIZE, 'master table')
+    entries = np.frombuffer(code, dtype=np.uint8, count=count * MASTER_ENTRY_SIZE,
+                            offset=MASTER_TABLE_OFFSET).reshape(count, MASTER_ENTRY_SIZE)
+    size_ptrs = MASTER_TABLE_OFFSET + (entries[:, 0].astype(np.int64) << 8 | entries[:, 1])
+    code_index.add_many(size_ptrs, size_ptrs + 2, 'sprite sizes')
+
+    sprites = read_table(code, 0, count - 1)
+    offsets = np.array([offset for _, _, _, offset in sprites], dtype=np.int64)
+    lengths = np.array([xsize // 2 * ysize for _, xsize, ysize, _ in sprites], dtype=np.int64)
+    sprite_index.add_many(offsets, offsets + lengths, 'sprite data')
+
+
+def add_manifest(index: CoverageIndex, code: bytes, manifest_file):
+    """The blocks of a misc_batch.py manifest, one label per block name."""
+    from misc_batch import HEADER_SIZE, read_tile_blocks
+    with open(manifest_file, 'r') as f:
+        manifest = json.load(f)
+    for block in manifest['blocks']:
+        offset = int(block['offset'], 16)
+        if 'count' in block:
+            try:
+                grids = read_tile_blocks(code, offset, block['count'])
+            except ValueError as e:
+                print(f"{block['name']}: {e}, left out")
+                continue
+            length = sum(HEADER_SIZE + grid.size * 2 for grid in grids)
+        else:
+            length = int(block['length'], 16)
+        index.add(offset, offset + length, block['name'])
+
+
+def add_log(indexes: dict, log_file):
+    """Ranges from a coverage log, into the index of the file they were read from."""
+    for source, ranges in read_log(log_file).items():
+        index = indexes.get(source)
+        if index is None:
+            print(f"{log_file}: {len(ranges)} ranges of {source} left out (not one of the files mapped)")
+            continue
+        for start, end, label in ranges:
+            index.add(start, end, label)
+
+
+# =============================================================================
+# Strip
+# =============================================================================
+
+def label_colors(count: int) -> np.ndarray:
+    """(count, 3) well spread colours, golden ratio hue steps."""
+    colors = [colorsys.hsv_to_rgb((i * 0.618034) % 1, 0.65, 0.95) for i in range(count)]
+    return (np.array(colors, dtype=np.float64).reshape(-1, 3) * 255).astype(np.uint8)
+
+
+def render_strip(index: CoverageIndex, width=STRIP_WIDTH, bytes_per_pixel=BYTES_PER_PIXEL,
+                 row_height=ROW_HEIGHT) -> np.ndarray:
+    """RGBA strip of the file followed by a legend of the labels."""
+    from panorama import render_caption
+    rows = max((index.size + width * bytes_per_pixel - 1) // (width * bytes_per_pixel), 1)
+    offsets = np.arange(rows * width, dtype=np.int64) * bytes_per_pixel
+    masks = index.masks_at(offsets)
+
+    # the first label of each mask: the lowest set bit
+    lowest = masks & -masks
+    first = np.where(masks != 0, np.log2(np.maximum(lowest, 1)).astype(np.int64), len(index.labels))
+    lut = np.zeros((len(index.labels) + 2, 4), dtype=np.uint8)
+    lut[:len(index.labels), :3] = label_colors(len(index.labels))
+    lut[len(index.labels), :3] = UNKNOWN_COLOR
+    lut[:, 3] = 255
+    lut[-1] = (0, 0, 0, 255)
+    first = np.where(offsets < index.size, first, len(index.labels) + 1)
+    strip = lut[first.reshape(rows, width)].repeat(row_height, axis=0)
+
+    totals = index.label_bytes()
+    legend = np.zeros(((len(index.labels) + 1) * LEGEND_HEIGHT, width, 4), dtype=np.uint8)
+    legend[..., 3] = 255
+    unknown = int(sum(e - s for s, e in zip(*index.gaps())))
+    entries = [(f"{label}  {totals[label]:,} bytes", lut[i]) for i, label in enumerate(index.labels)]
+    entries.append((f"unknown  {unknown:,} bytes", lut[len(index.labels)]))
+    for i, (text, color) in enumerate(entries):
+        y = i * LEGEND_HEIGHT
+        legend[y + 3:y + LEGEND_HEIGHT - 3, 4:LEGEND_HEIGHT] = color
+        caption = render_caption(text, width - LEGEND_HEIGHT - 4, LEGEND_HEIGHT)
+        alpha = caption[..., 3:4].astype(np.uint16)
+        area = legend[y:y + LEGEND_HEIGHT, LEGEND_HEIGHT + 4:]
+        area[..., :3] = (caption[..., :3] * alpha + area[..., :3] * (255 - alpha)) // 255
+    return np.concatenate((strip, legend))
+
+
+# =============================================================================
+# Main
+# =============================================================================
+
+def benchmark(count: int):
+    """Build and query an index of `count` random ranges over 16 labels."""
+    rng = np.random.default_rng(0)
+    size = 1 << 24
+    index = CoverageIndex(size)
+    starts = rng.integers(0, size, count)
+    lengths = rng.integers(1, 64, count)
+    start = time.perf_counter()
+    for label in range(16):
+        part = slice(label * count // 16, (label + 1) * count // 16)
+        index.add_many(starts[part], starts[part] + lengths[part], f'label {label}')
+    added = time.perf_counter()
+    starts_, _, _ = index.build()
+    built = time.perf_counter()
+    queries = rng.integers(0, size, 1_000_000)
+    index.masks_at(queries)
+    queried = time.perf_counter()
+    index.add_many(starts[:count // 100], starts[:count // 100] + 8, 'label 0')
+    index.build()
+    rebuilt = time.perf_counter()
+    print(f"{count:,} ranges: add {(added - start) * 1000:.1f} ms, build {(built - added) * 1000:.1f} ms "
+          f"({len(starts_):,} segments), 1,000,000 queries {(queried - built) * 1000:.1f} ms, "
+          f"{count // 100:,} more + rebuild {(rebuilt - queried) * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Map which bytes of code.bin and the sprite ROM are accounted for')
+    parser.add_argument('code_bin', nargs='?', help='Game code binary')
+    parser.add_argument('sprite_bin', nargs='?', help='Sprite data binary (swapped_all-sprites.bin)')
+    parser.add_argument('output_json', nargs='?', help='Coverage map JSON')
+    parser.add_argument('--manifest', help='misc_batch.py manifest whose blocks are counted')
+    parser.add_argument('--log', nargs='+', default=[], help=f'Coverage logs written with {LOG_VARIABLE} set')
+    parser.add_argument('--strip', help='Write a strip image per file (<name>_code.png, <name>_sprites.png)')
+    parser.add_argument('--width', type=int, default=STRIP_WIDTH, help=f'Strip width in pixels (default: {STRIP_WIDTH})')
+    parser.add_argument('--bytes-per-pixel', type=int, default=BYTES_PER_PIXEL,
+                        help=f'Bytes per strip pixel (default: {BYTES_PER_PIXEL})')
+    parser.add_argument('--benchmark', type=int, metavar='RANGES', help='Time the index on random ranges and exit')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.benchmark)
+        return
+    if not (args.code_bin and args.sprite_bin and args.output_json):
+        parser.error("code_bin, sprite_bin and output_json are required")
+
+    try:
+        with open(args.code_bin, 'rb') as f:
+            code = f.read()
+        with open(args.sprite_bin, 'rb') as f:
+            sprites = f.read()
+        start = time.perf_counter()
+        indexes = {os.path.basename(args.code_bin): CoverageIndex(len(code)),
+                   os.path.basename(args.sprite_bin): CoverageIndex(len(sprites))}
+        code_index, sprite_index = indexes.values()
+        add_level_streams(code_index, code)
+        add_palettes(code_index)
+        add_sprites(code_index, sprite_index, code)
+        if args.manifest:
+            add_manifest(code_index, code, args.manifest)
+        for log_file in args.log:
+            add_log(indexes, log_file)
+        coverage = {name: index.to_dict() for name, index in indexes.items()}
+        elapsed = time.perf_counter() - start
+
+        with open(args.output_json, 'w') as f:
+            json.dump(coverage, f, indent=1)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    print(f"Coverage mapped in {elapsed * 1000:.1f} ms, saved to {args.output_json}")
+    for name, info in coverage.items():
+        print(f"{name}: {info['covered']:,} of {info['size']:,} bytes accounted for "
+              f"({info['covered'] / max(info['size'], 1):.1%}), {len(info['gaps'])} gaps")
+        for label, count in info['labels'].items():
+            print(f"  {label:<20} {count:>9,} bytes")
+
+    if args.strip:
+        from image_writer import ImageWriter
+        base = os.path.splitext(args.strip)[0]
+        with ImageWriter() as writer:
+            for suffix, index in (('code', code_index), ('sprites', sprite_index)):
+                path = writer.save(render_strip(index, args.width, args.bytes_per_pixel), f"{base}_{suffix}.png")
+                print(f"Strip saved to {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+rom_set.py
+
+Everything make-everything.bat builds from the ROM dumps, built in memory
+instead: code.bin, BG1.bin, swapped_all-sprites.bin, the five level maps and
+the 8-bit palettes. Tools that compare or index whole ROM sets use this so
+nothing has to be written to disk first.
+
+A ROM set is either a folder with the MAME dumps (the Rom folder), or a folder
+where make-everything.bat has already been run (code.bin, BG1.bin and
+swapped_all-sprites.bin there).
+
+Each step matches the batch file:
+  · code.bin        - merge-binaries of epr-11907.a7 and epr-11906.a5, 1 byte each
+  · BG1.bin         - bitplanes.py of opr-11676.a16, opr-11675.a15, opr-11674.a14
+  · sprites         - merge-binaries of the nybble swapped b5/b1, b6/b2, b7/b3,
+                      b8/b4 pairs, joined, then nybble swapped again (the two
+                      swaps cancel out)
+  · levelNmap.bin   - decode_streams.py + merge-binaries of high and low plane
+  · palettes        - savebit + palette5bit_to_8bit.py (+ expand_palettes.py
+                      for the sprite palettes)
+"""
+
+import os
+
+import numpy as np
+
+from decode_streams import LEVEL_OFFSETS, NUM_ENTRIES
+from encode_streams import decode_level
+
+CODE_ROMS = ('epr-11907.a7', 'epr-11906.a5')
+TILE_ROMS = ('opr-11676.a16', 'opr-11675.a15', 'opr-11674.a14')
+SPRITE_ROMS = (('epr-11681.b5', 'epr-11677.b1'), ('epr-11682.b6', 'epr-11678.b2'),
+               ('epr-11683.b7', 'epr-11679.b3'), ('epr-11684.b8', 'epr-11680.b4'))
+
+BUILT_FILES = {'code': 'code.bin', 'chars': 'BG1.bin', 'sprites': 'swapped_all-sprites.bin'}
+
+# savebit ranges in code.bin (offset, length)
+BASE_PALETTE = (0x232A0, 0x400)
+LEVEL_PALETTES = {
+    'level1-3': (0x236A0, 0x400),
+    'level4-5': (0x23AA0, 0x400),
+}
+SPRITE_PALETTES = (0x242A0, 0x1340)
+SPRITE_PALETTE_COLORS = 14
+
+# which palette and char offset each level is rendered with
+LEVEL_PALETTE = ['level1-3', 'level1-3', 'level1-3', 'level4-5', 'level4-5']
+LEVEL_CHAR_OFFSET = [0, 0, 0, 0x20000, 0x20000]
+
+
+# =============================================================================
+# The batch file steps, vectorized
+# =============================================================================
+
+def interleave(first: bytes, second: bytes) -> bytes:
+    """merge-binaries.py with 1 byte chunks: stops at the end of the shorter file."""
+    n = min(len(first), len(second))
+    out = np.empty((n, 2), dtype=np.uint8)
+    out[:, 0] = np.frombuffer(first, dtype=np.uint8, count=n)
+    out[:, 1] = np.frombuffer(second, dtype=np.uint8, count=n)
+    return out.tobytes()
+
+
+def combine_bitplanes(plane1: bytes, plane2: bytes, plane3: bytes) -> bytes:
+    """bitplanes.py: three 1bpp planes to 4bpp linear chars, plane1 is the top bit."""
+    if not (len(plane1) == len(plane2) == len(plane3)):
+        raise ValueError("Bitplane files must be of the same size")
+    bits = [np.unpackbits(np.frombuffer(p, dtype=np.uint8)).reshape(-1, 8) for p in (plane1, plane2, plane3)]
+    pixels = (bits[0] << 2) | (bits[1] << 1) | bits[2]
+    return ((pixels[:, 0::2] << 4) | pixels[:, 1::2]).astype(np.uint8).tobytes()
+
+
+def palette_5bit_to_8bit(data: bytes) -> bytes:
+    """palette5bit_to_8bit.py: System 16B palette words to 8-bit RGB triples."""
+    words = np.frombuffer(data[:len(data) // 2 * 2], dtype='>u2').astype(np.uint16)
+    r = ((words >> 12) & 0x01) | ((words << 1) & 0x1E)
+    g = ((words >> 13) & 0x01) | ((words >> 3) & 0x1E)
+    b = ((words >> 14) & 0x01) | ((words >> 7) & 0x1E)
+    rgb = np.stack((r, g, b), axis=1)
+    return ((rgb << 3) | (rgb >> 2)).astype(np.uint8).tobytes()
+
+
+def expand_palettes(rgb: bytes) -> bytes:
+    """expand_palettes.py: 14 colour palettes to 16, black at colour 0 and 15."""
+    palettes = np.frombuffer(rgb, dtype=np.uint8).reshape(-1, SPRITE_PALETTE_COLORS, 3)
+    out = np.zeros((len(palettes), 16, 3), dtype=np.uint8)
+    out[:, 1:15] = palettes
+    return out.tobytes()
+
+
+# =============================================================================
+# ROM set
+# =============================================================================
+
+class RomSet:
+    """
+    The decoded data of one ROM set.
+    - code, chars, sprites: contents of code.bin, BG1.bin, swapped_all-sprites.bin
+    - level_maps: levelNmap.bin contents for levels 1-5 (None if a stream fails to decode)
+    - palettes: 8-bit RGB palettes by name ('level1-3', 'level4-5', 'sprites')
+    """
+
+    def __init__(self, name, code, chars, sprites):
+        self.name = name
+        self.code = code
+        self.chars = chars
+        self.sprites = sprites
+
+        self.level_maps = []
+        for offset in LEVEL_OFFSETS[:NUM_ENTRIES]:
+            try:
+                low, high, _ = decode_level(code, offset)
+                self.level_maps.append(interleave(high, low))
+            except (ValueError, IndexError):
+                self.level_maps.append(None)
+
+        base = self.savebit(*BASE_PALETTE)
+        self.palettes = {key: palette_5bit_to_8bit(base + self.savebit(*extra))
+                         for key, extra in LEVEL_PALETTES.items()}
+        sprite_rgb = palette_5bit_to_8bit(self.savebit(*SPRITE_PALETTES))
+        usable = len(sprite_rgb) // (SPRITE_PALETTE_COLORS * 3) * SPRITE_PALETTE_COLORS * 3
+        self.palettes['sprites'] = expand_palettes(sprite_rgb[:usable])
+
+    def savebit(self, offset, length) -> bytes:
+        return self.code[offset:offset + length]
+
+    @classmethod
+    def load(cls, path) -> 'RomSet':
+        """Build from a folder of ROM dumps, or read a folder the batch file was run in."""
+        def read(name):
+            with open(os.path.join(path, name), 'rb') as f:
+                return f.read()
+
+        if all(os.path.exists(os.path.join(path, name)) for name in CODE_ROMS):
+            code = interleave(*map(read, CODE_ROMS))
+            chars = combine_bitplanes(*map(read, TILE_ROMS))
+            sprites = b''.join(interleave(read(first), read(second)) for first, second in SPRITE_ROMS)
+        elif os.path.exists(os.path.join(path, BUILT_FILES['code'])):
+            code, chars, sprites = (read(BUILT_FILES[key]) for key in ('code', 'chars', 'sprites'))
+        else:
+            raise FileNotFoundError(f"{path}: no {CODE_ROMS[0]} (ROM dumps) or {BUILT_FILES['code']} (built files)")
+        return cls(os.path.basename(os.path.normpath(path)), code, chars, sprites)
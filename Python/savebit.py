@@ -1,3 +1,4 @@
+import os
 import sys
 
 def savebit(input_filename, output_filename, hex_offset, hex_length):
@@ -11,6 +12,9 @@ def savebit(input_filename, output_filename, hex_offset, hex_length):
         with open(input_filename, 'rb') as infile:
             infile.seek(offset)
             data = infile.read(length)
+        if os.environ.get('ALTERED_COVERAGE'):
+            from rom_coverage import record
+            record(input_filename, offset, offset + len(data), os.path.basename(output_filename))
         
         # Write the read data to the output file
         with open(output_filename, 'wb') as outfile:
@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+"""
+scan_streams.py
+
+Searches the whole of code.bin for level map streams: every offset is treated
+as a possible start of a low plane + high plane pair (the format decode_streams.py
+reads), and the ones that look like real level data are listed, best first.
+
+Decoding at every offset in Python would take hours, so the impossible starts
+are thrown out for all offsets at once first:
+  · run budget      - the low plane pairs from each offset must add up to 0x5000
+                      writes before the end of the file (cumulative sum + searchsorted)
+  · reachability    - the high plane that follows must also reach 0x5000 writes in
+                      the file; its end is found for every start together by
+                      pointer doubling over the token chain
+  · size            - both planes together must fit in --max-size bytes and compress
+                      by at least --min-ratio
+  · encoder sanity  - an RLE packer never writes two low plane pairs with the same
+                      value back to back unless the first one was full (256), nor
+                      two zero run tokens in a row in the high plane
+Starts a few bytes before a real stream usually fall into step with it and end
+in the same place, so survivors are grouped by end. A packer's planes write
+exactly 0x5000 bytes, while a start out of step usually ends on a run the
+decoder cuts short. So a group's start is its latest offset where both planes
+are exact (junk before a stream can fall into step and come out exact too, a
+start inside the stream ends somewhere else), or its lowest offset if none is.
+Groups are ranked on how many planes of that start are exact, then on how many
+of the byte pairs in their data also occur in the 2 KB before (packed maps
+reuse a small set of tiles, random bytes don't; one sort for the whole file),
+and the --decode best are decoded. Those are scored by compression ratio times
+the share of their tile edges that occur more than once in the map: equal
+neighbours aren't edges, so the long runs an RLE decoder makes of any junk
+count for nothing. A candidate inside the data of one that decodes better is
+hidden.
+
+--check fails unless the LEVEL_OFFSETS entries come out on top; --self-test
+runs that check on two synthetic ROMs with made up levels packed at those
+offsets, small skyline levels and textured ones that pack to 11-22 KB.
+
+Usage:
+    python scan_streams.py code.bin
+    python scan_streams.py code.bin --top 20 --save-maps 3
+    python scan_streams.py code.bin --check
+    python scan_streams.py --self-test
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from decode_streams import decode_low_plane, decode_high_plane, LEVEL_OFFSETS, NUM_ENTRIES, INITIAL_D1
+
+STREAM_SIZE = INITIAL_D1 + 1
+SCREEN_WIDTH = 64
+SCREEN_HEIGHT = 32
+REPEAT_WINDOW = 0x800    # bytes looked back for an earlier copy of a byte pair
+
+
+# =============================================================================
+# Vectorized prefilters
+# =============================================================================
+
+def low_plane_ends(data: np.ndarray) -> (np.ndarray, np.ndarray):
+    """
+    For every start offset, where the low plane stream ends, how many of its
+    pairs repeat the previous value after a run shorter than 256, and whether
+    its runs add up to exactly 0x5000 writes (a packer's stream does; a start
+    out of step usually ends on a run the decoder cuts short).
+    Returns (end_offset, redundant_pairs, exact); end_offset is -1 when the
+    stream would run past the end of the data.
+    """
+    n = len(data)
+    ends = np.full(n, -1, dtype=np.int64)
+    redundant = np.zeros(n, dtype=np.int64)
+    exact = np.zeros(n, dtype=bool)
+
+    for parity in (0, 1):
+        runs = data[parity::2].astype(np.int64) + 1
+        values = data[parity + 1::2]
+        n_pairs = len(values)             # pairs that have both bytes
+        runs = runs[:n_pairs]
+        cum = np.concatenate(([0], np.cumsum(runs)))
+
+        # smallest number of pairs from each start that writes STREAM_SIZE bytes
+        last = np.searchsorted(cum, cum[:n_pairs] + STREAM_SIZE, side='left')
+        valid = last <= n_pairs
+
+        wasted = np.zeros(n_pairs, dtype=np.int64)
+        wasted[1:] = (values[1:] == values[:-1]) & (runs[:-1] < 256)
+        wasted_cum = np.concatenate(([0], np.cumsum(wasted)))
+
+        starts = np.arange(n_pairs)
+        offsets = parity + 2 * starts
+        ends[offsets] = np.where(valid, parity + 2 * last, -1)
+        last_pair = np.minimum(last, n_pairs)
+        redundant[offsets] = wasted_cum[last_pair] - wasted_cum[np.minimum(starts + 1, last_pair)]
+        exact[offsets] = valid & (cum[last_pair] - cum[:n_pairs] == STREAM_SIZE)
+
+    return ends, redundant, exact
+
+
+def high_plane_ends(data: np.ndarray, starts: np.ndarray) -> (np.ndarray, np.ndarray):
+    """
+    Where the high plane stream starting at each of `starts` ends (-1 if it
+    runs past the end of the data), how many of its zero run tokens are
+    followed straight away by another one although they weren't full, and
+    whether its tokens write exactly 0x5000 bytes.
+    Uses pointer doubling: level k holds the position 2**k tokens ahead, the
+    bytes written and the wasted tokens on the way.
+    """
+    n = len(data)
+    sentinel = n
+    pos = np.arange(n)
+    follow = np.append(data[1:], 0).astype(np.int64)
+
+    is_literal = data != 0
+    next_pos = np.where(is_literal, pos + 1, pos + 2)
+    writes = np.where(is_literal | (follow == 0), 1, follow + 1)
+    next_pos[(~is_literal) & (pos + 1 >= n)] = sentinel   # [0] with no count byte
+    next_pos = np.minimum(next_pos, sentinel)
+
+    # a short zero run token straight after another zero run token
+    next_is_zero_run = np.append(~is_literal, False)[next_pos]
+    wasted = (~is_literal & next_is_zero_run & (writes < 256)).astype(np.int64)
+
+    # sentinel: stays put and writes nothing, so a chain that falls off never finishes
+    jump = np.append(next_pos, sentinel)
+    gain = np.append(writes, 0).astype(np.int64)
+    waste = np.append(wasted, 0)
+
+    levels = [(jump, gain, waste)]
+    while (1 << len(levels)) < STREAM_SIZE:
+        j, g, w = levels[-1]
+        levels.append((j[j], g + g[j], w + w[j]))
+
+    cur = starts.astype(np.int64).copy()
+    acc = np.zeros(len(starts), dtype=np.int64)
+    acc_waste = np.zeros(len(starts), dtype=np.int64)
+    for j, g, w in reversed(levels):
+        step = acc + g[cur] < STREAM_SIZE
+        acc = np.where(step, acc + g[cur], acc)
+        acc_waste = np.where(step, acc_waste + w[cur], acc_waste)
+        cur = np.where(step, j[cur], cur)
+
+    # one more token takes it to STREAM_SIZE (its own waste flag looks past the end, so leave it out)
+    finished = (cur != sentinel) & (acc + gain[cur] >= STREAM_SIZE)
+    exact = finished & (acc + gain[cur] == STREAM_SIZE)
+    return np.where(finished, jump[cur], -1), acc_waste, exact
+
+
+def repeat_counts(data: np.ndarray, window: int = REPEAT_WINDOW) -> np.ndarray:
+    """
+    Prefix counts of the byte pairs that also occur in the `window` bytes
+    before them: counts[e] - counts[s] is how many pairs of data[s:e] repeat
+    (random bytes: about window / 65536 of them). The previous copy of every
+    pair comes from one stable sort of all the pairs.
+    """
+    keys = (data[:-1].astype(np.int64) << 8) | data[1:]
+    order = np.argsort(keys, kind='stable')
+    previous = np.full(len(keys), -window - 1, dtype=np.int64)
+    same = keys[order[1:]] == keys[order[:-1]]
+    previous[order[1:][same]] = order[:-1][same]
+    repeated = np.arange(len(keys)) - previous <= window
+    return np.concatenate(([0, 0], np.cumsum(repeated)))
+
+
+# =============================================================================
+# Full decode and scoring of survivors
+# =============================================================================
+
+def high_plane_redundancy(data: bytes, start: int, end: int) -> int:
+    """Back to back zero run tokens where the first wasn't full: no packer writes those."""
+    count = 0
+    p = start
+    prev_zero_run = None
+    while p < end:
+        if data[p] != 0:
+            prev_zero_run = None
+            p += 1
+            continue
+        run = data[p + 1] + 1 if data[p + 1] else 1
+        if prev_zero_run is not None and prev_zero_run < 256:
+            count += 1
+        prev_zero_run = run
+        p += 2
+    return count
+
+
+def edge_repeats(screens: np.ndarray) -> float:
+    """
+    Share of the tile edges (two different words side by side or one above
+    the other) that occur more than once in the map: most of a level's edges
+    come back again and again, decoded junk's are random.
+    """
+    words = screens.astype(np.int64)
+    pairs = []
+    for direction, (a, b) in enumerate(((words[:, :, :-1], words[:, :, 1:]), (words[:, :-1], words[:, 1:]))):
+        edge = a != b
+        pairs.append((a[edge] << 17) | (b[edge] << 1) | direction)
+    keys = np.concatenate(pairs)
+    if len(keys) == 0:
+        return 0.0
+    _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    return float((counts[inverse] > 1).mean())
+
+
+def score_candidate(rom: bytes, offset: int) -> dict:
+    """Decode a candidate with the original routines and score how map-like it is."""
+    low, low_end = decode_low_plane(rom, offset)
+    high, high_end = decode_high_plane(rom, low_end)
+
+    words = (np.frombuffer(high, dtype=np.uint8).astype(np.uint16) |
+             (np.frombuffer(low, dtype=np.uint8).astype(np.uint16) << 8))
+    screens = words.reshape(-1, SCREEN_HEIGHT, SCREEN_WIDTH)
+    edges = edge_repeats(screens)
+
+    total = high_end - offset
+    ratio = STREAM_SIZE * 2 / total
+    redundant = high_plane_redundancy(rom, low_end, high_end)
+    return {
+        'offset': offset,
+        'low': low_end - offset,
+        'high': high_end - low_end,
+        'end': high_end,
+        'ratio': ratio,
+        'edges': edges,
+        'distinct': len(np.unique(words & 0x1FFF)),
+        'high_redundant': redundant,
+        'score': ratio * edges / (1 + redundant),
+        'map': np.column_stack((np.frombuffer(high, np.uint8), np.frombuffer(low, np.uint8))).tobytes(),
+    }
+
+
+def scan(rom: bytes, align=2, max_size=0x8000, min_ratio=1.5, max_redundant=0, decode_limit=200):
+    """
+    Scan every aligned offset. Returns (candidates sorted best first, stats).
+    """
+    data = np.frombuffer(rom, dtype=np.uint8)
+    timings = {}
+
+    start = time.perf_counter()
+    low_ends, low_redundant, low_exact = low_plane_ends(data)
+    offsets = np.arange(0, len(data), align)
+    keep = (low_ends[offsets] >= 0) & (low_redundant[offsets] <= max_redundant)
+    survivors = offsets[keep]
+    counts = {'offsets': len(offsets), 'low plane': len(survivors)}
+
+    high_ends, high_redundant, high_exact = high_plane_ends(data, low_ends[survivors])
+    total = high_ends - survivors
+    keep = ((high_ends >= 0) & (high_redundant <= max_redundant) &
+            (total <= max_size) & (STREAM_SIZE * 2 >= min_ratio * total))
+    survivors, total, ends = survivors[keep], total[keep], high_ends[keep]
+    exact = low_exact[survivors].astype(np.int64) + high_exact[keep]
+    repeats = repeat_counts(data)
+    repeat_share = (repeats[ends] - repeats[survivors]) / (ends - survivors)
+    counts['high plane + size'] = len(survivors)
+    counts['exact'] = int((exact == 2).sum())
+    timings['prefilter'] = time.perf_counter() - start
+
+    # starts a few bytes apart usually fall into step and share one end, so group
+    # them by end. A group's start is the latest member whose planes both write
+    # exactly 0x5000 bytes: junk before a stream can fall into step with it and
+    # come out exact too, but a start inside the stream ends somewhere else.
+    # With no exact member, the lowest offset.
+    start = time.perf_counter()
+    order = np.lexsort((np.where(exact == 2, -survivors, survivors), -exact, ends))
+    _, first, members = np.unique(ends[order], return_index=True, return_counts=True)
+    picks = order[first]
+    counts['groups'] = len(picks)
+    ranked = np.lexsort((-repeat_share[picks], -exact[picks]))[:decode_limit]
+
+    candidates = []
+    for i in ranked:
+        cand = score_candidate(rom, int(survivors[picks[i]]))
+        cand['exact'] = int(exact[picks[i]])
+        cand['group'] = int(members[i])
+        candidates.append(cand)
+    candidates.sort(key=lambda c: (-c['exact'], -c['score']))
+    timings['decode'] = time.perf_counter() - start
+    counts['decoded'] = len(candidates)
+
+    # a start inside the data of one that decodes better (more exact planes, or
+    # as many and more repeated edges) is a shifted copy of it, whatever the
+    # scores: junk just before a stream can pack better than the stream itself
+    shown = []
+    for cand in sorted(candidates, key=lambda c: (-c['exact'], -c['edges'])):
+        cand['overlaps'] = next((a['offset'] for a in shown
+                                 if cand['offset'] < a['end'] and a['offset'] < cand['end']), None)
+        if cand['overlaps'] is None:
+            shown.append(cand)
+    return candidates, counts, timings
+
+
+def check_known(candidates: list) -> list:
+    """
+    The LEVEL_OFFSETS entries that aren't the first NUM_ENTRIES candidates
+    shown, as (entry, offset, rank or None). Empty when they all come out on top.
+    """
+    shown = [c['offset'] for c in candidates if c['overlaps'] is None]
+    missing = []
+    for entry, offset in enumerate(LEVEL_OFFSETS[:NUM_ENTRIES]):
+        rank = shown.index(offset) if offset in shown else None
+        if rank is None or rank >= NUM_ENTRIES:
+            missing.append((entry, offset, rank))
+    return missing
+
+
+def skyline_level(rng) -> np.ndarray:
+    """Ground of a few tiles under a random walk skyline, (rows, width) words."""
+    width = STREAM_SIZE // SCREEN_HEIGHT
+    skyline = np.clip(25 + np.cumsum(rng.integers(-1, 2, width // 4)).repeat(4), 18, SCREEN_HEIGHT - 2)
+    rows = np.arange(SCREEN_HEIGHT)[:, None]
+    tiles = rng.integers(0x100, 0x140, 8)[(np.arange(width) // 4) % 8]
+    return np.where(rows > skyline, tiles, np.where(rows == skyline, 0x2180, 0x2000))
+
+
+def textured_level(rng, ground_rows: int) -> np.ndarray:
+    """
+    Closer to real art, (rows, width) words: the bottom ground_rows rows (to
+    a whole metatile) tiled at random with 24 4x4 metatiles of consecutive
+    chars from four char pages, under a sky of 0x2000 with 8x2 clouds in it.
+    Almost every tile is a literal in the high plane, so it packs about as
+    badly as the real levels.
+    """
+    width = STREAM_SIZE // SCREEN_HEIGHT
+    grid = np.full((SCREEN_HEIGHT, width), 0x2000, dtype=np.int64)
+    metatiles = [(page << 8) | (int(rng.integers(1, 15)) * 16 + np.arange(16).reshape(4, 4))
+                 for page in (0x01, 0x02, 0x03, 0x05) * 6]
+    top = SCREEN_HEIGHT - ground_rows // 4 * 4
+    for y in range(top, SCREEN_HEIGHT, 4):
+        for x in range(0, width, 4):
+            grid[y:y + 4, x:x + 4] = metatiles[int(rng.integers(0, len(metatiles)))]
+    cloud = 0x2010 + np.arange(16).reshape(2, 8)
+    for _ in range(30):
+        x, y = int(rng.integers(0, width - 8)), int(rng.integers(0, max(top - 4, 1)))
+        grid[y:y + 2, x:x + 8] = cloud
+    return grid
+
+
+def synthetic_rom(seed: int = 0, size: int = 0x50000, textured: bool = False) -> bytes:
+    """
+    Random bytes with a made up level packed by encode_streams.py at every
+    LEVEL_OFFSETS entry, 10 screens wide like the real levels, for
+    --self-test. Skyline levels pack small; textured ones pack to 11-22 KB,
+    each with as much ground as fits before the next entry.
+    """
+    from encode_streams import encode_level
+
+    def pack(grid):
+        screens = grid.shape[1] // SCREEN_WIDTH
+        level = grid.astype('<u2').reshape(SCREEN_HEIGHT, screens, SCREEN_WIDTH).transpose(1, 0, 2)
+        low, high = encode_level(level.tobytes())
+        return low + high
+
+    rng = np.random.default_rng(seed)
+    rom = bytearray(rng.integers(0, 256, size, dtype=np.uint8).tobytes())
+    for entry, offset in enumerate(LEVEL_OFFSETS[:NUM_ENTRIES]):
+        if textured:
+            room = LEVEL_OFFSETS[entry + 1] - offset
+            for ground_rows in range(SCREEN_HEIGHT - 4, 0, -4):
+                packed = pack(textured_level(rng, ground_rows))
+                if len(packed) <= room:
+                    break
+        else:
+            packed = pack(skyline_level(rng))
+        rom[offset:offset + len(packed)] = packed
+    return bytes(rom)
+
+
+def list_candidates(rom: bytes, args) -> bool:
+    """Scan one ROM and print its candidates; False if --check fails."""
+    candidates, counts, timings = scan(rom, args.align, int(args.max_size, 16), args.min_ratio,
+                                       args.max_redundant, args.decode)
+
+    print(f"Scanned {len(rom)} bytes: " + ", ".join(f"{k} {v}" for k, v in counts.items()))
+    print(f"Prefilter {timings['prefilter']:.2f} s, decode {timings['decode']:.2f} s\n")
+
+    known = {offset: idx for idx, offset in enumerate(LEVEL_OFFSETS, start=1)}
+    shown = [c for c in candidates if args.all or c['overlaps'] is None][:args.top]
+    print(f"{'Offset':>8}  {'Low':>5}  {'High':>5}  {'Total':>5}  {'Ratio':>5}  {'Edges':>5}  "
+          f"{'Tiles':>5}  {'Waste':>5}  {'Exact':>5}  {'Score':>6}  Note")
+    for cand in shown:
+        notes = []
+        if cand['offset'] in known:
+            notes.append(f"LEVEL_OFFSETS entry {known[cand['offset']] - 1}")
+        if cand['overlaps'] is not None:
+            notes.append(f"inside {cand['overlaps']:X}")
+        print(f"{cand['offset']:>8X}  {cand['low']:>5}  {cand['high']:>5}  {cand['low'] + cand['high']:>5}  "
+              f"{cand['ratio']:>5.2f}  {cand['edges']:>5.2f}  {cand['distinct']:>5}  "
+              f"{cand['high_redundant']:>5}  {cand['exact']:>5}  {cand['score']:>6.2f}  {', '.join(notes)}")
+
+    for cand in shown[:args.save_maps]:
+        name = f"candidate_{cand['offset']:X}map.bin"
+        with open(name, 'wb') as f:
+            f.write(cand['map'])
+        print(f"Saved {name}")
+
+    if not args.check:
+        return True
+    missing = check_known(candidates)
+    for entry, offset, rank in missing:
+        where = f"ranked {rank + 1}" if rank is not None else "not listed"
+        print(f"Check failed: LEVEL_OFFSETS entry {entry} ({offset:X}) {where}")
+    if not missing:
+        print(f"Check passed: the {NUM_ENTRIES} LEVEL_OFFSETS entries are the top candidates")
+    return not missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Scan a ROM for RLE level map streams')
+    parser.add_argument('code_bin', nargs='?', help='Game code binary (code.bin)')
+    parser.add_argument('--align', type=int, default=2, help='Start offset alignment (default: 2, 68000 words)')
+    parser.add_argument('--max-size', default="8000", help='Largest packed level in hex bytes (default: 8000)')
+    parser.add_argument('--min-ratio', type=float, default=1.5, help='Minimum compression ratio (default: 1.5)')
+    parser.add_argument('--max-redundant', type=int, default=0,
+                        help='Tokens a packer would have merged allowed per plane (default: 0)')
+    parser.add_argument('--decode', type=int, default=200, help='Groups of survivors to fully decode (default: 200)')
+    parser.add_argument('--top', type=int, default=16, help='Candidates to list (default: 16)')
+    parser.add_argument('--all', action='store_true', help='Also list candidates overlapping a better one')
+    parser.add_argument('--save-maps', type=int, default=0,
+                        help='Write the first N candidates as candidate_<offset>map.bin')
+    parser.add_argument('--check', action='store_true',
+                        help='Exit with an error unless the LEVEL_OFFSETS entries are the top candidates')
+    parser.add_argument('--self-test', type=int, nargs='?', const=0, metavar='SEED',
+                        help='Scan two synthetic ROMs with levels packed at LEVEL_OFFSETS instead (skyline '
+                             'levels in 320 KB, textured ones in 512 KB), implies --check')
+    args = parser.parse_args()
+
+    if args.self_test is not None:
+        args.check = True
+        roms = [(f"Synthetic ROM, skyline levels, seed {args.self_test}", synthetic_rom(args.self_test)),
+                (f"Synthetic ROM, textured levels, seed {args.self_test}",
+                 synthetic_rom(args.self_test, 0x80000, textured=True))]
+    elif args.code_bin is None:
+        parser.error("code_bin is required unless --self-test is given")
+    else:
+        try:
+            with open(args.code_bin, 'rb') as f:
+                roms = [(None, f.read())]
+        except FileNotFoundError:
+            print(f"Error: file not found: {args.code_bin}")
+            sys.exit(1)
+
+    passed = True
+    for i, (title, rom) in enumerate(roms):
+        if title:
+            print(("\n" if i else "") + title)
+        passed = list_candidates(rom, args) and passed
+    if not passed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+scroll_export.py
+
+Renders a level map (levelNmap.bin) once as an indexed strip and exports it
+scrolling past a 320x224 window, the way the game shows it.
+
+Every frame is a slice view of the strip (no pixel copies until the palette
+lookup), and frames are streamed one at a time into the writer, so memory use
+doesn't grow with the number of frames:
+  · apng  - animated PNG, written chunk by chunk
+  · gif   - animated GIF, each frame gets its own local colour table
+  · raw   - packed RGB24/RGBA frames to a file or stdout ("-") for ffmpeg etc.
+
+Usage:
+    python scroll_export.py level1map.bin BG1.bin palettes_level1-3.pal level1.png
+    python scroll_export.py level4map.bin BG1.bin palettes_level4-5.pal level4.gif --char-offset 20000 --speed 2
+    python scroll_export.py level1map.bin BG1.bin palettes_level1-3.pal - --format raw | ffmpeg -f rawvideo -pix_fmt rgb24 -s 320x224 -r 60 -i - level1.mp4
+"""
+
+import argparse
+import struct
+import sys
+import time
+import zlib
+
+import numpy as np
+
+from image_writer import PNG_SIGNATURE, png_chunk
+from tile_bank import TileBank, build_palette_lut
+from level_map import LevelMap, SCREEN_HEIGHT
+
+# =============================================================================
+# Constants: map layout and the visible screen
+# =============================================================================
+
+TILE_SIZE = 8
+
+FRAME_WIDTH = 320        # System 16 visible area
+FRAME_HEIGHT = 224
+FRAME_RATE = 60
+
+
+# =============================================================================
+# Rendering the indexed strip
+# =============================================================================
+
+def render_indexed_strip(level_map: LevelMap, bank: TileBank) -> (np.ndarray, int):
+    """
+    Render every map screen side by side (as map_renderer_offset lays them out)
+    into one indexed strip.
+    Returns:
+      (indexed_strip, invalid_tile_count)
+    """
+    strip, invalid = bank.render_indexed(level_map.strip())
+    return strip, int(invalid.sum())
+
+
+def iter_frames(strip: np.ndarray, speed: int, y_scroll: int = 0):
+    """
+    Yield every 320x224 window of the strip scrolling right by `speed` pixels
+    per frame. Each frame is a view into the strip, nothing is copied.
+    """
+    max_x = strip.shape[1] - FRAME_WIDTH
+    for x in range(0, max_x + 1, speed):
+        yield strip[y_scroll:y_scroll + FRAME_HEIGHT, x:x + FRAME_WIDTH]
+
+
+def frame_count(strip: np.ndarray, speed: int) -> int:
+    return (strip.shape[1] - FRAME_WIDTH) // speed + 1
+
+
+# =============================================================================
+# Streaming writers
+# =============================================================================
+
+class APNGWriter:
+    """
+    Minimal streaming APNG encoder for RGBA frames of a fixed size.
+    Frames are compressed and written as they arrive, nothing is buffered.
+    """
+
+    def __init__(self, fp, width, height, num_frames, fps=FRAME_RATE, compress_level=6):
+        self.fp = fp
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.compress_level = compress_level
+        self.sequence = 0
+        self.frames_written = 0
+
+        fp.write(PNG_SIGNATURE)
+        fp.write(png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)))
+        fp.write(png_chunk(b'acTL', struct.pack('>II', num_frames, 0)))  # 0 = loop forever
+
+    def write(self, rgba: np.ndarray):
+        fp = self.fp
+        fp.write(png_chunk(b'fcTL', struct.pack('>IIIIIHHBB', self.sequence, self.width, self.height,
+                                                  0, 0, 1, self.fps, 0, 0)))
+        self.sequence += 1
+
+        # filter type 0 on every row
+        rows = np.zeros((self.height, self.width * 4 + 1), dtype=np.uint8)
+        rows[:, 1:] = rgba.reshape(self.height, -1)
+        data = zlib.compress(rows.tobytes(), self.compress_level)
+
+        if self.frames_written == 0:
+            fp.write(png_chunk(b'IDAT', data))
+        else:
+            fp.write(png_chunk(b'fdAT', struct.pack('>I', self.sequence) + data))
+            self.sequence += 1
+        self.frames_written += 1
+
+    def close(self):
+        self.fp.write(png_chunk(b'IEND', b''))
+
+
+class GIFWriter:
+    """
+    Streaming animated GIF writer. Pillow does the LZW encoding of each frame,
+    but frames are written straight out with their own colour table instead of
+    being collected for save_all().
+    """
+
+    def __init__(self, fp, width, height, fps=FRAME_RATE):
+        self.fp = fp
+        self.duration = max(20, round(1000 / fps))  # most viewers clamp below 2/100s
+        fp.write(b'GIF89a' + struct.pack('<HHBBB', width, height, 0x70, 0, 0))
+        fp.write(b'!\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00')  # loop forever
+
+    def write_indexed(self, frame: np.ndarray, lut: np.ndarray):
+        from PIL import Image, GifImagePlugin
+
+        used = np.flatnonzero(np.bincount(frame.ravel(), minlength=len(lut)))
+        opaque = used[lut[used, 3] != 0]
+        if len(opaque) <= 255:
+            # exact: slot 0 is the transparent colour, the rest are the used colours
+            remap = np.zeros(len(lut), dtype=np.uint8)
+            remap[opaque] = np.arange(1, len(opaque) + 1)
+            palette = np.zeros((256, 3), dtype=np.uint8)
+            palette[1:len(opaque) + 1] = lut[opaque, :3]
+            img = Image.fromarray(remap[frame], 'P')
+            img.putpalette(palette.tobytes())
+            params = {'transparency': 0}
+        else:
+            img = Image.fromarray(lut[frame][:, :, :3], 'RGB').quantize(256)
+            params = {}
+
+        # disposal 2 clears the frame, so transparent pixels don't show the last one
+        for block in GifImagePlugin.getdata(img, include_color_table=True, duration=self.duration,
+                                            disposal=2, **params):
+            self.fp.write(block)
+
+    def close(self):
+        self.fp.write(b';')
+
+
+# =============================================================================
+# Main script logic
+# =============================================================================
+
+def export_scroll(map_file, char_file, palette_file, output_file, fmt=None, speed=1,
+                  char_offset_hex="0", y_scroll=0, pix_fmt='rgb24', compress_level=6):
+    """
+    Render the level strip once and stream every scroll frame into output_file.
+    - fmt: apng, gif or raw (guessed from the output extension when None)
+    - speed: scroll speed in pixels per frame
+    - y_scroll: vertical offset of the 224-line window inside the 256-line map
+    """
+    char_offset = int(char_offset_hex, 16)
+    # with "-" the frames go to stdout, so every status line goes to stderr
+    to_stdout = output_file == '-'
+    log = sys.stderr if to_stdout else sys.stdout
+    with open(palette_file, 'rb') as f:
+        palette_data = f.read()
+    level_map = LevelMap.load(map_file, char_offset)
+
+    if fmt is None:
+        lower = output_file.lower()
+        fmt = 'gif' if lower.endswith('.gif') else 'apng' if lower.endswith('.png') else 'raw'
+
+    if not 0 <= y_scroll <= SCREEN_HEIGHT * TILE_SIZE - FRAME_HEIGHT:
+        print(f"Error: y scroll {y_scroll} puts the frame outside the map", file=log)
+        return
+
+    start = time.perf_counter()
+    bank = TileBank.load(char_file, char_offset)
+    lut = build_palette_lut(palette_data)
+    strip, invalid_tiles = render_indexed_strip(level_map, bank)
+    render_time = time.perf_counter() - start
+    print(f"Rendered {strip.shape[1]}x{strip.shape[0]} indexed strip in {render_time * 1000:.1f} ms "
+          f"(skipped {invalid_tiles} tiles, char offset {char_offset:04X}h)", file=log)
+
+    if strip.shape[1] < FRAME_WIDTH:
+        print("Error: map is narrower than one frame", file=log)
+        return
+
+    n_frames = frame_count(strip, speed)
+    fp = sys.stdout.buffer if to_stdout else open(output_file, 'wb')
+
+    start = time.perf_counter()
+    try:
+        if fmt == 'apng':
+            writer = APNGWriter(fp, FRAME_WIDTH, FRAME_HEIGHT, n_frames, compress_level=compress_level)
+            for frame in iter_frames(strip, speed, y_scroll):
+                writer.write(lut[frame])
+            writer.close()
+        elif fmt == 'gif':
+            writer = GIFWriter(fp, FRAME_WIDTH, FRAME_HEIGHT)
+            for frame in iter_frames(strip, speed, y_scroll):
+                writer.write_indexed(frame, lut)
+            writer.close()
+        else:
+            channels = lut if pix_fmt == 'rgba' else np.ascontiguousarray(lut[:, :3])
+            for frame in iter_frames(strip, speed, y_scroll):
+                fp.write(channels[frame].tobytes())
+    finally:
+        if not to_stdout:
+            fp.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Wrote {n_frames} {fmt} frames ({FRAME_WIDTH}x{FRAME_HEIGHT}, {speed} px/frame) to {output_file}",
+          file=log)
+    print(f"{elapsed:.2f} s, {n_frames / elapsed if elapsed else 0:.0f} fps "
+          f"({n_frames / elapsed / FRAME_RATE if elapsed else 0:.1f}x real-time)", file=log)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export a level scrolling past the 320x224 screen')
+    parser.add_argument('map_bin', help='Level map binary (levelNmap.bin)')
+    parser.add_argument('char_bin', help='Character data (BG1.bin)')
+    parser.add_argument('palette_pal', help='8-bit RGB palette file')
+    parser.add_argument('output', help='Output .png (APNG), .gif, or raw frame file ("-" for stdout)')
+    parser.add_argument('--format', choices=['apng', 'gif', 'raw'], help='Output format (default: from extension)')
+    parser.add_argument('--speed', type=int, default=1, help='Scroll speed in pixels per frame (default: 1)')
+    parser.add_argument('--y', type=int, default=0, help='Vertical scroll inside the map (default: 0)')
+    parser.add_argument('--char-offset', default="0", help='Character file offset in hex (default: 0)')
+    parser.add_argument('--pix-fmt', choices=['rgb24', 'rgba'], default='rgb24', help='Raw frame pixel format')
+    parser.add_argument('--compress-level', type=int, default=6, help='zlib level for APNG frames (default: 6)')
+    args = parser.parse_args()
+
+    if args.speed < 1:
+        parser.error("--speed must be at least 1")
+
+    export_scroll(args.map_bin, args.char_bin, args.palette_pal, args.output, args.format, args.speed,
+                  args.char_offset, args.y, args.pix_fmt, args.compress_level)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,13 @@
 import argparse
 from PIL import Image, ImageDraw, ImageFont
+from concurrent.futures import ThreadPoolExecutor
+import json
+import numpy as np
+import os
 import sys
+import time
+from image_writer import ImageWriter, add_writer_arguments, writer_from_args
+from upscale import render_scaled, check_scale, add_scale_arguments, upscale
 
 def read_word(data, offset):
     """Read 16-bit big-endian word (68000 format)"""
@@ -48,40 +55,53 @@ def load_palette_assignments(palette_file):
                 palette_map[sprite_num] = [int(p, 16) for p in parts[1:]] if len(parts) > 1 else [0]
     return palette_map
 
+def decode_sprite_pixels(sprite_bytes, xsize, ysize):
+    """Unpack 4-bit sprite data into a (ysize, xsize) array of colour indexes"""
+    if len(sprite_bytes) * 2 < xsize * ysize:
+        raise IndexError("index out of range")
+    raw = np.frombuffer(sprite_bytes, dtype=np.uint8)
+    nibbles = np.empty(len(raw) * 2, dtype=np.uint8)
+    nibbles[0::2] = raw >> 4    # High nibble first
+    nibbles[1::2] = raw & 0x0F
+    return nibbles[:xsize * ysize].reshape(ysize, xsize)
+
+def line_end_table(sprite_data, sprites):
+    """
+    Every distinct sprite row of the (sprite_num, xsize, ysize, data_offset, ...)
+    list decoded once, with a 0xF nibble ending its row as on the hardware
+    (sprite_lines.SpriteTable); all palette variants of a sprite share it
+    """
+    from sprite_lines import SpriteTable
+    return SpriteTable(sprite_data, sorted({tuple(sprite[:4]) for sprite in sprites}))
+
+def sprite_pixels(sprite_data, sprite, table=None):
+    """
+    A sprite's (ysize, xsize) colour indexes, from the line end table when
+    one is given (line_end_table), else the dense nibble rectangle
+    """
+    sprite_num, xsize, ysize, data_offset = sprite[:4]
+    if table is not None:
+        return table.pixels(sprite_num)
+    return decode_sprite_pixels(read_sprite_data(sprite_data, data_offset, xsize, ysize), xsize, ysize)
+
+def sprite_lut(palette):
+    """16 entry RGBA lookup table for a sprite palette, colours 0 and 15 transparent"""
+    lut = np.zeros((16, 4), dtype=np.uint8)   # 0 and 15 stay (0, 0, 0, 0)
+    lut[1:15, :3] = np.array(palette[1:15], dtype=np.uint8)
+    lut[1:15, 3] = 255
+    return lut
+
+def sprite_rgba(sprite_bytes, palette, xsize, ysize):
+    """Sprite as a (ysize, xsize, 4) RGBA array, colours 0 and 15 transparent"""
+    return sprite_lut(palette)[decode_sprite_pixels(sprite_bytes, xsize, ysize)]
+
 def create_sprite_image(sprite_bytes, palette, xsize, ysize):
     """Create image with proper transparency handling"""
-    img = Image.new('RGBA', (xsize, ysize))
-    pixels = []
-    
-    for i in range(xsize * ysize):
-        byte_pos = i // 2
-        if i % 2 == 0:  # High nibble
-            color_index = (sprite_bytes[byte_pos] >> 4) & 0x0F
-        else:  # Low nibble
-            color_index = sprite_bytes[byte_pos] & 0x0F
-        
-        if color_index in (0, 15):
-            pixels.append((0, 0, 0, 0))  # Transparent
-        else:
-            r, g, b = palette[color_index]
-            pixels.append((r, g, b, 255))
-    
-    img.putdata(pixels)
-    return img
+    return Image.fromarray(sprite_rgba(sprite_bytes, palette, xsize, ysize), 'RGBA')
 
-def create_sprite_atlas(code_bin, sprite_bin, palette_bin, output_file, palette_map, padding=4, overlay_file=None, start_sprite=0, end_sprite=None):
-    """Create optimized sprite atlas with all palette variations"""
-    with open(code_bin, 'rb') as f:
-        code_data = f.read()
-    with open(sprite_bin, 'rb') as f:
-        sprite_data = f.read()
-    with open(palette_bin, 'rb') as f:
-        palette_data = f.read()
-    
+def collect_sprites(code_data, palette_map, start_sprite, end_sprite):
+    """List (sprite_num, xsize, ysize, data_offset, palette_num) for every sprite/palette pair"""
     sprites = []
-    if end_sprite is None:
-        end_sprite = max(palette_map.keys()) if palette_map else 647
-    
     for sprite_num in range(start_sprite, end_sprite + 1):
         try:
             xsize, ysize, data_offset = get_sprite_info(code_data, sprite_num)
@@ -91,9 +111,16 @@ def create_sprite_atlas(code_bin, sprite_bin, palette_bin, output_file, palette_
                     sprites.append((sprite_num, xsize, ysize, data_offset, palette_num))
         except (IndexError, TypeError):
             continue
-    
-    # Calculate atlas dimensions including label space
-    label_height = 14 if overlay_file else 0
+    return sprites
+
+def plan_atlas(sprites, sprite_data, palette_data, padding, label_height):
+    """
+    Lay out the single atlas: rows 4096 pixels wide at most, sprites sitting
+    on the bottom edge of their row, a label strip under each row.
+    The size is worked out over every sprite, then sprites whose data or
+    palette can't be read are reported and left out of the rows.
+    Returns (width, height, rows) with rows as [(y, height, [(x, sprite), ...])]
+    """
     row_width = 0
     max_row_width = 0
     current_row_height = 0
@@ -112,70 +139,83 @@ def create_sprite_atlas(code_bin, sprite_bin, palette_bin, output_file, palette_
     max_row_width = max(max_row_width, row_width)
     total_height += current_row_height + label_height
     
-    atlas = Image.new('RGBA', (max_row_width, total_height), (0, 0, 0, 0))
-    
-    overlay = None
-    if overlay_file:
-        overlay = Image.new('RGBA', (max_row_width, total_height), (0, 0, 0, 0))
-        try:
-            font = ImageFont.truetype("arial.ttf", 12)
-        except:
-            font = ImageFont.load_default()
-        draw = ImageDraw.Draw(overlay)
-    
+    rows = []
     x_pos, y_pos = 0, 0
     current_row_height = 0
-    row_start_y = 0
     row_sprites = []
-    last_sprite_num = None
     
-    for sprite_num, xsize, ysize, data_offset, palette_num in sprites:
+    for sprite in sprites:
+        sprite_num, xsize, ysize, data_offset, palette_num = sprite
         if x_pos + xsize > max_row_width:
-            for sx, sy, ssprite_num, ssprite_img, spalette_num in row_sprites:
-                sprite_y = row_start_y + (current_row_height - ssprite_img.height)
-                atlas.paste(ssprite_img, (sx, sprite_y))
-                
-                if overlay:
-                    if ssprite_num != last_sprite_num:
-                        hex_code = f"{ssprite_num:X}:{spalette_num:02X}"
-                    else:
-                        hex_code = f"{spalette_num:02X}"
-                    
-                    last_sprite_num = ssprite_num
-                    
-                    bbox = draw.textbbox((0, 0), hex_code, font=font)
-                    text_width = bbox[2] - bbox[0]
-                    text_x = sx + (ssprite_img.width - text_width) // 2
-                    text_y = row_start_y + current_row_height + 2
-                    
-                    for ox, oy in [(-1,-1),(-1,0),(-1,1),(0,-1),(0,1),(1,-1),(1,0),(1,1)]:
-                        draw.text((text_x+ox, text_y+oy), hex_code, font=font, fill=(0,0,0,255))
-                    draw.text((text_x, text_y), hex_code, font=font, fill=(255,255,255,255))
-            
+            rows.append((y_pos, current_row_height, row_sprites))
             x_pos = 0
             y_pos += current_row_height + padding + label_height
-            row_start_y = y_pos
             current_row_height = 0
             row_sprites = []
-            last_sprite_num = None
         
         try:
-            palette = read_palette(palette_data, palette_num)
-            sprite_bytes = read_sprite_data(sprite_data, data_offset, xsize, ysize)
-            sprite_img = create_sprite_image(sprite_bytes, palette, xsize, ysize)
-            
-            row_sprites.append((x_pos, y_pos, sprite_num, sprite_img, palette_num))
-            current_row_height = max(current_row_height, ysize)
-            x_pos += xsize + padding
-            
+            read_palette(palette_data, palette_num)
+            decode_sprite_pixels(read_sprite_data(sprite_data, data_offset, xsize, ysize), xsize, ysize)
         except Exception as e:
             print(f"Skipping sprite {sprite_num}: {str(e)}")
+            continue
+        row_sprites.append((x_pos, sprite))
+        current_row_height = max(current_row_height, ysize)
+        x_pos += xsize + padding
     
-    for sx, sy, ssprite_num, ssprite_img, spalette_num in row_sprites:
-        sprite_y = row_start_y + (current_row_height - ssprite_img.height)
-        atlas.paste(ssprite_img, (sx, sprite_y))
-        
-        if overlay:
+    rows.append((y_pos, current_row_height, row_sprites))
+    return max_row_width, total_height, rows
+
+def atlas_placements(rows):
+    """(x, y, sprite) of every sprite in the planned rows"""
+    return [(x, row_y + row_height - sprite[2], sprite)
+            for row_y, row_height, row_sprites in rows for x, sprite in row_sprites]
+
+def paint_sprites(atlas, placements, sprite_data, palette_data, table=None):
+    """Decode sprites straight into their rectangles of an RGBA atlas array (clipped to it, like paste)"""
+    height, width = atlas.shape[:2]
+    for x, y, sprite in placements:
+        _, xsize, ysize, _, palette_num = sprite
+        pixels = sprite_pixels(sprite_data, sprite, table)
+        rgba = sprite_lut(read_palette(palette_data, palette_num))[pixels]
+        atlas[y:min(y + ysize, height), x:min(x + xsize, width)] = rgba[:height - y, :width - x]
+
+# below this many placed sprites a process pool costs more to start than the decode takes
+POOL_MIN_SPRITES = 2000
+
+def decode_atlas(width, height, placements, sprite_data, palette_data, jobs=1, table=None):
+    """
+    Decode every placed sprite into a (height, width, 4) RGBA atlas. Sprites
+    never overlap, so each one is written straight into its own rectangle.
+    With more than one job and at least POOL_MIN_SPRITES sprites the
+    placements are split over a process pool that writes into the atlas
+    through shared memory (sprite_decode.py); the result is the same.
+    table: line end table (line_end_table) to take the pixels from.
+    Returns (atlas, processes used).
+    """
+    if jobs > 1 and len(placements) >= POOL_MIN_SPRITES:
+        from sprite_decode import decode_shared
+        return decode_shared(width, height, placements, sprite_data, palette_data, jobs, table), jobs
+    atlas = np.zeros((height, width, 4), dtype=np.uint8)
+    paint_sprites(atlas, placements, sprite_data, palette_data, table)
+    return atlas, 1
+
+def scale_atlas(atlas, scale, scaler='nearest'):
+    """
+    Upscale the painted RGBA atlas (upscale.py) with its pixels as uint32s:
+    equal colours compare equal for epx, and every transparent pixel is 0
+    """
+    if scale == 1:
+        return atlas
+    height, width = atlas.shape[:2]
+    pixels = upscale(atlas.view(np.uint32)[..., 0], scale, scaler)
+    return np.ascontiguousarray(pixels).view(np.uint8).reshape(height * scale, width * scale, 4)
+
+def draw_labels(draw, font, rows, scale=1):
+    """Sprite:palette codes under each row, the sprite number only where it changes, placed at scale x the layout"""
+    for row_y, row_height, row_sprites in rows:
+        last_sprite_num = None
+        for sx, (ssprite_num, xsize, _, _, spalette_num) in row_sprites:
             if ssprite_num != last_sprite_num:
                 hex_code = f"{ssprite_num:X}:{spalette_num:02X}"
             else:
@@ -185,22 +225,202 @@ def create_sprite_atlas(code_bin, sprite_bin, palette_bin, output_file, palette_
             
             bbox = draw.textbbox((0, 0), hex_code, font=font)
             text_width = bbox[2] - bbox[0]
-            text_x = sx + (ssprite_img.width - text_width) // 2
-            text_y = row_start_y + current_row_height + 2
+            text_x = sx * scale + (xsize * scale - text_width) // 2
+            text_y = (row_y + row_height + 2) * scale
             
             for ox, oy in [(-1,-1),(-1,0),(-1,1),(0,-1),(0,1),(1,-1),(1,0),(1,1)]:
-                draw.text((text_x+ox, text_y+oy), hex_code, font=font, fill=(0,0,0,255))
+                draw.text((text_x+ox*scale, text_y+oy*scale), hex_code, font=font, fill=(0,0,0,255))
             draw.text((text_x, text_y), hex_code, font=font, fill=(255,255,255,255))
+
+def create_sprite_atlas(code_bin, sprite_bin, palette_bin, output_file, palette_map, padding=4, overlay_file=None, start_sprite=0, end_sprite=None, writer=None, jobs=1, line_ends=False, scale=1, scaler='nearest'):
+    """
+    Create optimized sprite atlas with all palette variations, in three phases:
+    plan (sizes from the master table, the row layout), decode (on jobs
+    processes for big tables) and assemble (labels, writing out).
+    With scale the atlas is upscaled (upscale.py) and the overlay labels
+    are drawn at the same scale.
+    """
+    check_scale(scale, scaler)
+    with open(code_bin, 'rb') as f:
+        code_data = f.read()
+    with open(sprite_bin, 'rb') as f:
+        sprite_data = f.read()
+    with open(palette_bin, 'rb') as f:
+        palette_data = f.read()
     
-    atlas.save(output_file)
+    if end_sprite is None:
+        end_sprite = max(palette_map.keys()) if palette_map else 647
+    sprites = collect_sprites(code_data, palette_map, start_sprite, end_sprite)
+    
+    label_height = 14 if overlay_file else 0
+    start = time.perf_counter()
+    width, height, rows = plan_atlas(sprites, sprite_data, palette_data, padding, label_height)
+    placements = atlas_placements(rows)
+    planned = time.perf_counter()
+    table = line_end_table(sprite_data, [sprite for _, _, sprite in placements]) if line_ends else None
+    atlas, processes = decode_atlas(width, height, placements, sprite_data, palette_data, jobs or 1, table)
+    atlas = scale_atlas(atlas, scale, scaler)
+    decoded = time.perf_counter()
+    
+    overlay = None
+    if overlay_file:
+        overlay = Image.new('RGBA', (width * scale, height * scale), (0, 0, 0, 0))
+        try:
+            font = ImageFont.truetype("arial.ttf", 12 * scale)
+        except:
+            font = ImageFont.load_default()
+            if scale > 1:
+                try:
+                    font = ImageFont.load_default(12 * scale)   # a sized default font needs Pillow 10.1+
+                except TypeError:
+                    pass
+        draw_labels(ImageDraw.Draw(overlay), font, rows, scale)
+    
+    # atlas and overlay are encoded side by side in the background
+    if writer is None:
+        writer = ImageWriter()
+    output_file = writer.save(atlas, output_file)
     if overlay:
-        overlay.save(overlay_file)
+        overlay_file = writer.save(np.asarray(overlay), overlay_file)
+    writer.close()
     
     print(f"Created atlas with {len(sprites)} sprite variations (sprites {start_sprite:X}-{end_sprite:X})")
-    print(f"Dimensions: {max_row_width}x{total_height}")
+    print(f"Dimensions: {width * scale}x{height * scale}" + (f" ({scale}x {scaler})" if scale > 1 else ""))
+    print(f"Plan {(planned - start) * 1000:.1f} ms, decode {(decoded - planned) * 1000:.1f} ms "
+          f"({len(placements)} sprites, {processes} process{'es' if processes > 1 else ''})")
     if overlay:
         print(f"Code overlay saved to: {overlay_file}")
 
+def plan_pages(sprites, page_size, padding):
+    """
+    Shelf-pack sprites into pages of at most page_size x page_size, keeping
+    their order. Sprites in a row sit on its bottom edge like in the big atlas.
+    A sprite bigger than a page gets a page of its own, sized to fit.
+    Returns a list of pages: {'width', 'height', 'frames': [(x, y, sprite), ...]}
+    """
+    # rows first, as wide as a page allows
+    rows = []
+    row, row_width = [], 0
+    for sprite in sprites:
+        xsize = sprite[1]
+        if row and row_width + xsize > page_size:
+            rows.append(row)
+            row, row_width = [], 0
+        row.append(sprite)
+        row_width += xsize + padding
+    if row:
+        rows.append(row)
+
+    # then stack rows into pages
+    pages = []
+    page = None
+    y = 0
+    for row in rows:
+        row_height = max(sprite[2] for sprite in row)
+        if page is None or (page['frames'] and y + row_height > page_size):
+            page = {'width': 0, 'height': 0, 'frames': []}
+            pages.append(page)
+            y = 0
+        x = 0
+        for sprite in row:
+            xsize, ysize = sprite[1], sprite[2]
+            page['frames'].append((x, y + row_height - ysize, sprite))
+            x += xsize + padding
+        page['width'] = max(page['width'], x - padding)
+        page['height'] = y + row_height
+        y += row_height + padding
+    return pages
+
+def render_page(page, sprite_data, palette_data, scale=1, scaler='nearest', table=None):
+    """
+    Render one atlas page to an RGBA array. The page is drawn as indexes into
+    one LUT of every palette it uses (16 entries each), then upscaled and
+    looked up in one go.
+    """
+    indexed = np.zeros((page['height'], page['width']), dtype=np.uint16)
+    slots = {}
+    for x, y, sprite in page['frames']:
+        _, xsize, ysize, _, palette_num = sprite
+        slot = slots.setdefault(palette_num, len(slots))
+        pixels = sprite_pixels(sprite_data, sprite, table)
+        indexed[y:y + ysize, x:x + xsize] = pixels.astype(np.uint16) + slot * 16
+    lut = np.zeros((max(len(slots), 1) * 16, 4), dtype=np.uint8)
+    for palette_num, slot in slots.items():
+        lut[slot * 16:slot * 16 + 16] = sprite_lut(read_palette(palette_data, palette_num))
+    return render_scaled(indexed, lut, scale, scaler)
+
+def create_atlas_pages(code_bin, sprite_bin, palette_bin, output_file, palette_map, page_size=2048, padding=4,
+                       index_file=None, start_sprite=0, end_sprite=None, jobs=None, writer=None,
+                       scale=1, scaler='nearest', line_ends=False):
+    """
+    Write the atlas as pages of at most page_size x page_size (output_0.png,
+    output_1.png, ...) rendered in parallel, plus a JSON frame index giving the
+    page, rectangle and ROM data offset of every (sprite, palette) pair.
+    With scale the pages are upscaled (upscale.py) and the index gives
+    rectangles in the upscaled pages.
+    """
+    check_scale(scale, scaler)
+    with open(code_bin, 'rb') as f:
+        code_data = f.read()
+    with open(sprite_bin, 'rb') as f:
+        sprite_data = f.read()
+    with open(palette_bin, 'rb') as f:
+        palette_data = f.read()
+
+    if end_sprite is None:
+        end_sprite = max(palette_map.keys()) if palette_map else 647
+
+    # drop what can't be drawn before packing, so it doesn't leave holes in a page
+    sprites = []
+    for sprite in collect_sprites(code_data, palette_map, start_sprite, end_sprite):
+        sprite_num, xsize, ysize, data_offset, palette_num = sprite
+        try:
+            read_palette(palette_data, palette_num)
+            decode_sprite_pixels(read_sprite_data(sprite_data, data_offset, xsize, ysize), xsize, ysize)
+        except Exception as e:
+            print(f"Skipping sprite {sprite_num}: {str(e)}")
+            continue
+        if xsize * scale > page_size or ysize * scale > page_size:
+            print(f"Warning: sprite {sprite_num:X} ({xsize}x{ysize}) is bigger than a page")
+        sprites.append(sprite)
+
+    pages = plan_pages(sprites, page_size // scale, padding)
+    table = line_end_table(sprite_data, sprites) if line_ends else None
+
+    if writer is None:
+        writer = ImageWriter()
+    base, ext = os.path.splitext(output_file)
+    page_files = [writer.output_path(f"{base}_{i}{ext or '.png'}") for i in range(len(pages))]
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        for page_file, pixels in zip(page_files, pool.map(render_page, pages, [sprite_data] * len(pages),
+                                                          [palette_data] * len(pages), [scale] * len(pages),
+                                                          [scaler] * len(pages), [table] * len(pages))):
+            writer.save(pixels, page_file)
+            print(f"Saved page {page_file}")
+    writer.close()
+
+    index = {
+        'page_size': page_size,
+        'padding': padding * scale,
+        'scale': scale,
+        'pages': [{'file': os.path.basename(page_file), 'width': page['width'] * scale,
+                   'height': page['height'] * scale}
+                  for page, page_file in zip(pages, page_files)],
+        'frames': [{'sprite': sprite_num, 'palette': palette_num, 'page': page_idx,
+                    'x': x * scale, 'y': y * scale, 'width': xsize * scale, 'height': ysize * scale,
+                    'rom_offset': data_offset}
+                   for page_idx, page in enumerate(pages)
+                   for x, y, (sprite_num, xsize, ysize, data_offset, palette_num) in page['frames']],
+    }
+    if index_file is None:
+        index_file = base + '.json'
+    with open(index_file, 'w') as f:
+        json.dump(index, f, indent=1)
+
+    print(f"Created {len(pages)} atlas pages (max {page_size}x{page_size}) with {len(sprites)} sprite variations "
+          f"(sprites {start_sprite:X}-{end_sprite:X})")
+    print(f"Frame index saved to: {index_file}")
+
 def main():
     parser = argparse.ArgumentParser(description='Create sprite atlas with palette variations')
     parser.add_argument('code_bin', help='Game code binary')
@@ -212,9 +432,47 @@ def main():
     parser.add_argument('--overlay', help='Generate code overlay PNG')
     parser.add_argument('--start', type=int, default=0, help='First sprite number to include (default: 0)')
     parser.add_argument('--end', type=int, help='Last sprite number to include (default: all defined sprites)')
+    parser.add_argument('--page-size', type=int,
+                        help='Write pages of at most this many pixels square plus a JSON frame index, '
+                             'instead of one atlas')
+    parser.add_argument('--line-ends', action='store_true',
+                        help='Hardware line ends: a 0xF nibble ends the sprite row (default: dense rectangles)')
+    parser.add_argument('--index', help='Frame index JSON for --page-size (default: output name with .json)')
+    parser.add_argument('--jobs', type=int,
+                        help='Pages rendered at once (default: CPU count), or processes decoding the single '
+                             f'atlas when it has {POOL_MIN_SPRITES} sprites or more (default: 1)')
+    add_writer_arguments(parser)
+    add_scale_arguments(parser)
     
     args = parser.parse_args()
     palette_map = load_palette_assignments(args.palette_txt)
+    try:
+        check_scale(args.scale, args.scaler)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    
+    if args.page_size:
+        if args.overlay:
+            print("Note: --overlay is ignored with --page-size, the labels are in the frame index")
+        create_atlas_pages(
+            args.code_bin,
+            args.sprite_bin,
+            args.palette_bin,
+            args.output_png,
+            palette_map,
+            page_size=args.page_size,
+            padding=args.padding,
+            index_file=args.index,
+            start_sprite=args.start,
+            end_sprite=args.end,
+            jobs=args.jobs,
+            writer=writer_from_args(args),
+            scale=args.scale,
+            scaler=args.scaler,
+            line_ends=args.line_ends
+        )
+        return
     
     create_sprite_atlas(
         args.code_bin,
@@ -225,7 +483,12 @@ def main():
         padding=args.padding,
         overlay_file=args.overlay,
         start_sprite=args.start,
-        end_sprite=args.end
+        end_sprite=args.end,
+        writer=writer_from_args(args),
+        jobs=args.jobs,
+        line_ends=args.line_ends,
+        scale=args.scale,
+        scaler=args.scaler
     )
 
 if __name__ == '__main__':
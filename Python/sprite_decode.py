@@ -0,0 +1,69 @@
+"""
+sprite_decode.py
+
+The process pool side of the single sprite atlas (sprite_atlas_numbered.py
+--jobs N). The workers live in this module rather than in the atlas script so
+they pickle by name and are found again in the workers whatever started the
+script (python, altered, fork or spawn).
+
+  · shared memory - the sprite ROM and the (height, width, 4) atlas are
+                    copied into shared memory once; every worker maps both,
+                    so no sprite data is sent to it and no pixels come back
+  · chunks        - the placements are dealt out round robin in jobs * 4
+                    chunks, so big and small sprites spread evenly; sprites
+                    never overlap, so the workers write their rectangles in
+                    place and the atlas is the same as a one process decode
+
+Not a command of its own, decode_shared() is called by decode_atlas().
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# worker state, set up once per process by attach_shared
+_shared = {}
+
+
+def attach_shared(sprite_name, sprite_size, atlas_name, atlas_shape, palette_data, table):
+    """Pool initializer: map the sprite ROM and the atlas from shared memory."""
+    from sprite_atlas_numbered import paint_sprites
+    _shared['sprite_shm'] = shared_memory.SharedMemory(name=sprite_name)
+    _shared['atlas_shm'] = shared_memory.SharedMemory(name=atlas_name)
+    _shared['sprite_data'] = _shared['sprite_shm'].buf[:sprite_size]
+    _shared['atlas'] = np.ndarray(atlas_shape, dtype=np.uint8, buffer=_shared['atlas_shm'].buf)
+    _shared['palette_data'] = palette_data
+    _shared['table'] = table
+    _shared['paint'] = paint_sprites
+
+
+def paint_shared(placements) -> int:
+    """Paint one chunk of placements into the shared atlas."""
+    _shared['paint'](_shared['atlas'], placements, _shared['sprite_data'], _shared['palette_data'],
+                     _shared['table'])
+    return len(placements)
+
+
+def decode_shared(width, height, placements, sprite_data, palette_data, jobs, table=None) -> np.ndarray:
+    """(height, width, 4) RGBA atlas of the placed sprites, decoded by `jobs` processes."""
+    shape = (height, width, 4)
+    sprite_shm = shared_memory.SharedMemory(create=True, size=max(len(sprite_data), 1))
+    atlas_shm = shared_memory.SharedMemory(create=True, size=max(height * width * 4, 1))
+    try:
+        sprite_shm.buf[:len(sprite_data)] = sprite_data
+        atlas = np.ndarray(shape, dtype=np.uint8, buffer=atlas_shm.buf)
+        atlas[:] = 0
+        chunks = [placements[i::jobs * 4] for i in range(jobs * 4)]
+        with ProcessPoolExecutor(max_workers=jobs, initializer=attach_shared,
+                                 initargs=(sprite_shm.name, len(sprite_data), atlas_shm.name, shape,
+                                           palette_data, table)) as pool:
+            list(pool.map(paint_shared, [chunk for chunk in chunks if chunk]))
+        result = atlas.copy()
+        del atlas
+        return result
+    finally:
+        sprite_shm.close()
+        sprite_shm.unlink()
+        atlas_shm.close()
+        atlas_shm.unlink()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+sprite_lines.py
+
+Sprite decoding the way the System 16 sprite hardware reads the data, next to
+the dense nibble rectangles read_sprite_data() assumes:
+
+  · line ends   - a 0xF nibble ends the row: it isn't drawn and neither is
+                  anything after it on that row (the dense decode draws those
+                  pixels, only 0 and 15 are transparent there). The first 0xF
+                  of every row is found for all rows at once (argmax over the
+                  row axis), then everything from it on is set to 0xF.
+  · shared rows - row r of a sprite starts at data_offset + r * pitch (pitch =
+                  the row bytes from the size entry). Sprites whose data ranges
+                  overlap share rows, so the rows of the whole master table are
+                  gathered by start address and each distinct row is decoded
+                  once, one gather for the lot, however many sprites use it.
+
+decode_table() decodes every sprite of the table that way, and
+sprite_atlas_numbered.py --line-ends takes every sprite's pixels from such a
+table; terminate_rows() is the line end rule on its own, for callers that
+already have the pixels.
+
+The report lists how many rows the table has, how many are distinct, how many
+end early, and which sprites share data.
+
+Usage:
+    python sprite_lines.py code.bin swapped_all-sprites.bin
+    python sprite_lines.py code.bin swapped_all-sprites.bin --start 100 --end 1ff --overlaps
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from sprite_atlas_numbered import get_sprite_info
+
+END_OF_LINE = 0x0F
+SPRITE_COUNT = 648
+
+
+# =============================================================================
+# Line ends
+# =============================================================================
+
+def line_ends(pixels: np.ndarray) -> np.ndarray:
+    """Index of the first 0xF nibble of every row, the row width where there is none."""
+    is_end = pixels == END_OF_LINE
+    return np.where(is_end.any(axis=-1), is_end.argmax(axis=-1), pixels.shape[-1])
+
+
+def terminate_rows(pixels: np.ndarray) -> np.ndarray:
+    """(..., width) nibbles with everything from the first 0xF of each row on set to 0xF."""
+    ends = line_ends(pixels)
+    return np.where(np.arange(pixels.shape[-1]) >= ends[..., None], END_OF_LINE, pixels).astype(np.uint8)
+
+
+# =============================================================================
+# The whole table, shared rows decoded once
+# =============================================================================
+
+def read_table(code_data: bytes, start: int = 0, end: int = SPRITE_COUNT - 1) -> list:
+    """(sprite_num, xsize, ysize, data_offset) of every sprite with a size."""
+    sprites = []
+    for sprite_num in range(start, end + 1):
+        try:
+            xsize, ysize, data_offset = get_sprite_info(code_data, sprite_num)
+        except IndexError:
+            continue
+        if xsize > 0 and ysize > 0:
+            sprites.append((sprite_num, xsize, ysize, data_offset))
+    return sprites
+
+
+def find_overlaps(sprites: list) -> list:
+    """
+    Pairs of sprites whose data ranges overlap, as (sprite_a, sprite_b,
+    first shared byte, end of the shared bytes), sorted by address.
+    """
+    ranges = sorted((offset, offset + xsize // 2 * ysize, num) for num, xsize, ysize, offset in sprites)
+    overlaps = []
+    active = []
+    for start, end, num in ranges:
+        active = [a for a in active if a[1] > start]
+        for a_start, a_end, a_num in active:
+            overlaps.append((a_num, num, start, min(a_end, end)))
+        active.append((start, end, num))
+    return overlaps
+
+
+class SpriteTable:
+    """
+    Every sprite of a table decoded with line ends, each distinct row once.
+    - rows: (distinct rows, widest row) uint8 nibbles, line ends applied
+    - row_of: for every row of every sprite (in table order), its index in rows
+    - ends: where each distinct row ends (its width if it runs to the edge)
+    """
+
+    def __init__(self, sprite_data: bytes, sprites: list):
+        self.sprites = sprites
+        data = np.frombuffer(sprite_data, dtype=np.uint8)
+        pitches = np.array([xsize // 2 for _, xsize, _, _ in sprites], dtype=np.int64)
+        heights = np.array([ysize for _, _, ysize, _ in sprites], dtype=np.int64)
+        offsets = np.array([offset for _, _, _, offset in sprites], dtype=np.int64)
+
+        # start address and width of every row of every sprite
+        self.first_row = np.concatenate(([0], np.cumsum(heights)))
+        owner = np.repeat(np.arange(len(sprites)), heights)
+        row_number = np.arange(len(owner)) - self.first_row[owner]
+        addresses = offsets[owner] + row_number * pitches[owner]
+        self.total_rows = len(addresses)
+
+        unique, self.row_of = np.unique(addresses, return_inverse=True)
+        self.row_of = self.row_of.reshape(-1)
+        widest = int(pitches.max()) if len(sprites) else 0
+
+        # one gather of every distinct row, bytes past the data end read as line ends
+        index = unique[:, None] + np.arange(widest)
+        inside = index < len(data)
+        raw = np.where(inside, data[np.minimum(index, len(data) - 1)], 0xFF).astype(np.uint8)
+        nibbles = np.empty((len(unique), widest * 2), dtype=np.uint8)
+        nibbles[:, 0::2] = raw >> 4
+        nibbles[:, 1::2] = raw & 0x0F
+        self.ends = line_ends(nibbles)
+        self.rows = terminate_rows(nibbles)
+        self.index = {sprite[0]: i for i, sprite in enumerate(sprites)}
+        self.row_width = np.zeros(len(unique), dtype=np.int64)
+        np.maximum.at(self.row_width, self.row_of, pitches[owner] * 2)
+
+    def __len__(self):
+        return len(self.sprites)
+
+    def pixels(self, sprite_num: int) -> np.ndarray:
+        """(ysize, xsize) nibbles of a sprite, 0xF from each row's line end on."""
+        i = self.index[sprite_num]
+        _, xsize, _, _ = self.sprites[i]
+        return self.rows[self.row_of[self.first_row[i]:self.first_row[i + 1]], :xsize]
+
+    def stats(self) -> dict:
+        shared = np.bincount(self.row_of, minlength=len(self.rows))
+        return {
+            'sprites': len(self.sprites),
+            'rows': self.total_rows,
+            'distinct rows': len(self.rows),
+            'shared rows': int((shared > 1).sum()),
+            'rows ending early': int((self.ends < self.row_width).sum()),
+        }
+
+
+def decode_table(sprite_data: bytes, sprites: list) -> SpriteTable:
+    return SpriteTable(sprite_data, sprites)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Decode the sprite table with hardware line ends')
+    parser.add_argument('code_bin', help='Game code binary (the master table)')
+    parser.add_argument('sprite_bin', help='Sprite data binary')
+    parser.add_argument('--start', default="0", help='First sprite number (hex, default: 0)')
+    parser.add_argument('--end', default=f"{SPRITE_COUNT - 1:x}",
+                        help=f'Last sprite number (hex, default: {SPRITE_COUNT - 1:X})')
+    parser.add_argument('--overlaps', action='store_true', help='List every pair of sprites sharing data')
+    args = parser.parse_args()
+
+    try:
+        with open(args.code_bin, 'rb') as f:
+            code_data = f.read()
+        with open(args.sprite_bin, 'rb') as f:
+            sprite_data = f.read()
+        start_num, end_num = int(args.start, 16), int(args.end, 16)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    sprites = read_table(code_data, start_num, end_num)
+    if not sprites:
+        print(f"No sprites with a size between {start_num:X} and {end_num:X}")
+        sys.exit(1)
+    table = decode_table(sprite_data, sprites)
+    overlaps = find_overlaps(sprites)
+    elapsed = time.perf_counter() - start
+
+    stats = table.stats()
+    print(f"Decoded sprites {start_num:X}-{end_num:X} in {elapsed * 1000:.1f} ms:")
+    for key, value in stats.items():
+        print(f"  {key:<18} {value}")
+    sharing = sorted({num for pair in overlaps for num in pair[:2]})
+    print(f"  {'overlapping pairs':<18} {len(overlaps)} ({len(sharing)} sprites)")
+    if args.overlaps:
+        for a, b, first, last in overlaps:
+            print(f"  {a:>4X} / {b:<4X} share {first:06X}h-{last - 1:06X}h ({last - first} bytes)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+sprite_transform.py
+
+Flipped and zoomed versions of decoded sprites, as the sprite hardware draws
+them in game, for previews of the in-game poses.
+
+  · flips  - horizontal/vertical flips are reversed views, nothing is copied
+  · zoom   - the hardware shrinks a sprite by stepping an accumulator by the
+             zoom value for every source pixel and dropping the pixel each time
+             it carries past ZOOM_STEPS. Which rows and columns survive only
+             depends on the size and zoom value, so the index maps are worked
+             out once per (size, zoom) and cached.
+
+A sprite is converted to RGBA once; after that every variant, whatever mix of
+flips and zoom, is a single gather (rgba[rows[:, None], cols]) through its
+index maps.
+
+Usage:
+    python sprite_transform.py code.bin swapped_all-sprites.bin sprite_palettes16.pal 1A out.png
+    python sprite_transform.py code.bin swapped_all-sprites.bin sprite_palettes16.pal 1A out.png
+        --palette 08 --flips none h v hv --zoom 0 16 32 48
+"""
+
+import argparse
+import itertools
+import sys
+from functools import lru_cache
+
+import numpy as np
+
+from sprite_atlas_numbered import get_sprite_info, read_sprite_data, read_palette, sprite_rgba
+from image_writer import ImageWriter
+
+ZOOM_STEPS = 64          # zoom 0 = full size, ZOOM_STEPS - 1 = smallest
+FLIPS = {'none': (False, False), 'h': (True, False), 'v': (False, True), 'hv': (True, True)}
+GAP = 4
+
+
+# =============================================================================
+# Index maps and transforms
+# =============================================================================
+
+@lru_cache(maxsize=None)
+def zoom_index(size: int, zoom: int) -> np.ndarray:
+    """
+    Source positions (0..size-1) left after shrinking `size` pixels by `zoom`:
+    the accumulator is stepped by zoom for every source pixel and that pixel is
+    dropped whenever it carries.
+    """
+    if not 0 <= zoom < ZOOM_STEPS:
+        raise ValueError(f"Zoom must be 0-{ZOOM_STEPS - 1}, got {zoom}")
+    acc = np.arange(size + 1) * zoom // ZOOM_STEPS
+    index = np.flatnonzero(acc[1:] == acc[:-1])
+    index.flags.writeable = False
+    return index
+
+
+@lru_cache(maxsize=None)
+def variant_index(size: int, zoom: int, flip: bool) -> np.ndarray:
+    """Zoom index map, reversed for a flip (the hardware flips after shrinking)."""
+    index = zoom_index(size, zoom)
+    return index[::-1] if flip else index
+
+
+def flip_view(bitmap: np.ndarray, hflip=False, vflip=False) -> np.ndarray:
+    """A flipped view of a (height, width, ...) bitmap, no copy."""
+    return bitmap[::-1 if vflip else 1, ::-1 if hflip else 1]
+
+
+def transform(bitmap: np.ndarray, hflip=False, vflip=False, hzoom=0, vzoom=0) -> np.ndarray:
+    """
+    One variant of a (height, width, ...) bitmap. Without zoom this is a view;
+    with zoom it's a single gather through the cached index maps.
+    """
+    if hzoom == 0 and vzoom == 0:
+        return flip_view(bitmap, hflip, vflip)
+    height, width = bitmap.shape[:2]
+    rows = variant_index(height, vzoom, vflip)
+    cols = variant_index(width, hzoom, hflip)
+    return bitmap[rows[:, None], cols]
+
+
+def batch_transform(bitmap: np.ndarray, variants) -> list:
+    """Every (hflip, vflip, hzoom, vzoom) variant of one bitmap."""
+    return [transform(bitmap, *variant) for variant in variants]
+
+
+# =============================================================================
+# Preview sheet
+# =============================================================================
+
+def variant_sheet(images: list, columns: int) -> np.ndarray:
+    """Lay variants out in a grid, each cell bottom aligned like in the atlas."""
+    cell_w = max(image.shape[1] for image in images)
+    cell_h = max(image.shape[0] for image in images)
+    rows = (len(images) + columns - 1) // columns
+    sheet = np.zeros((rows * (cell_h + GAP) - GAP, columns * (cell_w + GAP) - GAP, 4), dtype=np.uint8)
+    for i, image in enumerate(images):
+        y = (i // columns) * (cell_h + GAP) + cell_h - image.shape[0]
+        x = (i % columns) * (cell_w + GAP)
+        sheet[y:y + image.shape[0], x:x + image.shape[1]] = image
+    return sheet
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render flipped and zoomed variants of a sprite')
+    parser.add_argument('code_bin', help='Game code binary')
+    parser.add_argument('sprite_bin', help='Sprite data binary (swapped_all-sprites.bin)')
+    parser.add_argument('palette_bin', help='16 colour sprite palettes (sprite_palettes16.pal)')
+    parser.add_argument('sprite', help='Sprite number (hex)')
+    parser.add_argument('output_png', help='Output sheet, one row per zoom, one column per flip')
+    parser.add_argument('--palette', default="0", help='Palette number (hex, default: 0)')
+    parser.add_argument('--flips', nargs='+', choices=FLIPS, default=list(FLIPS),
+                        help='Flips to render (default: none h v hv)')
+    parser.add_argument('--zoom', nargs='+', type=int, default=[0, 16, 32, 48],
+                        help=f'Zoom values 0-{ZOOM_STEPS - 1}, used for both axes (default: 0 16 32 48)')
+    parser.add_argument('--vzoom', nargs='+', type=int,
+                        help='Separate vertical zoom values, paired with --zoom')
+    args = parser.parse_args()
+
+    try:
+        with open(args.code_bin, 'rb') as f:
+            code_data = f.read()
+        with open(args.sprite_bin, 'rb') as f:
+            sprite_data = f.read()
+        with open(args.palette_bin, 'rb') as f:
+            palette_data = f.read()
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    sprite_num, palette_num = int(args.sprite, 16), int(args.palette, 16)
+    vzooms = args.vzoom or args.zoom
+    if len(vzooms) != len(args.zoom):
+        print("Error: --vzoom needs as many values as --zoom")
+        sys.exit(1)
+
+    try:
+        xsize, ysize, data_offset = get_sprite_info(code_data, sprite_num)
+        sprite_bytes = read_sprite_data(sprite_data, data_offset, xsize, ysize)
+        rgba = sprite_rgba(sprite_bytes, read_palette(palette_data, palette_num), xsize, ysize)
+    except (IndexError, ValueError) as e:
+        print(f"Error: sprite {sprite_num:X} can't be drawn: {e}")
+        sys.exit(1)
+
+    variants = [FLIPS[flip] + zoom for zoom, flip in
+                itertools.product(zip(args.zoom, vzooms), args.flips)]
+    try:
+        images = batch_transform(rgba, variants)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    with ImageWriter() as writer:
+        writer.save(variant_sheet(images, len(args.flips)), args.output_png)
+
+    print(f"Sprite {sprite_num:X} ({xsize}x{ysize}) palette {palette_num:02X}: {len(images)} variants")
+    for (hzoom, vzoom) in zip(args.zoom, vzooms):
+        print(f"  zoom {hzoom:>2}/{vzoom:>2}: {len(zoom_index(xsize, hzoom))}x{len(zoom_index(ysize, vzoom))}")
+    print(f"Saved {args.output_png}")
+
+
+if __name__ == '__main__':
+    main()
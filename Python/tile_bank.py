@@ -0,0 +1,137 @@
+"""
+tile_bank.py
+
+The decoded char set (BG1.bin) shared by every renderer.
+
+BG1.bin holds 8x8 chars at 4bpp, 32 bytes each, two pixels per byte (high
+nybble first). TileBank unpacks the whole file once into an (n_chars, 8, 8)
+uint8 array and saves it as an .npy next to the source, keyed by a hash of the
+file contents. Later runs (and other processes at the same time) open that
+.npy with mmap_mode='r', so there is nothing left to decode and the pages are
+shared through the OS cache.
+
+A char offset (e.g. the 20000 remap used by levels 4 and 5) is a slice of the
+same array when it is a whole number of chars.
+
+Map words are rendered to indexed pixels: palette_group * 8 + colour, where
+palette_group = (tile_number & 0x1FFF) // 64. build_palette_lut() turns those
+indexes into RGBA in one gather.
+"""
+
+import hashlib
+import os
+
+import numpy as np
+
+TILE_SIZE = 8            # 8x8 pixels
+CHAR_SIZE = 32           # 8x8 4bpp
+BANK_MASK = 0x1FFF
+CHARS_PER_PALETTE = 64
+COLORS_PER_PALETTE = 8
+PALETTE_GROUPS = BANK_MASK // CHARS_PER_PALETTE + 1
+
+# LUT index used for tiles that fall outside the char data, always transparent
+INVALID_INDEX = PALETTE_GROUPS * COLORS_PER_PALETTE
+
+
+def decode_chars(chars: bytes, char_offset: int = 0) -> np.ndarray:
+    """
+    Unpack 4bpp linear char data into an (n_chars, 8, 8) array of pixel values
+    (the full nybble, 0-15), starting char_offset bytes into the data.
+    """
+    raw = np.frombuffer(chars, dtype=np.uint8, offset=char_offset)
+    raw = raw[:len(raw) // CHAR_SIZE * CHAR_SIZE].reshape(-1, TILE_SIZE, TILE_SIZE // 2)
+    pixels = np.empty((raw.shape[0], TILE_SIZE, TILE_SIZE), dtype=np.uint8)
+    pixels[:, :, 0::2] = raw >> 4
+    pixels[:, :, 1::2] = raw & 0x0F
+    return pixels
+
+
+def build_palette_lut(palette_data: bytes, n_groups: int = PALETTE_GROUPS) -> np.ndarray:
+    """
+    Build an RGBA lookup table for indexed pixels (palette_group * 8 + colour).
+    Colour 0 of every group is transparent, missing entries get the magenta
+    error colour, and the extra last entry is fully transparent for invalid tiles.
+    """
+    n_colors = n_groups * COLORS_PER_PALETTE
+    lut = np.empty((n_colors + 1, 4), dtype=np.uint8)
+    lut[:] = (255, 0, 255, 255)
+    rgb = np.frombuffer(palette_data, dtype=np.uint8)
+    available = min(len(rgb) // 3, n_colors)
+    lut[:available, :3] = rgb[:available * 3].reshape(-1, 3)
+    lut[:available, 3] = 255
+    lut[0:available:COLORS_PER_PALETTE, 3] = 0
+    lut[n_colors] = (0, 0, 0, 0)
+    return lut
+
+
+class TileBank:
+    """
+    Decoded chars as an (n_chars, 8, 8) uint8 array, usually memory-mapped
+    from the .npy cache.
+    - tiles: the array, starting at the requested char offset
+    - char_offset: byte offset into the char file the bank starts at
+    """
+
+    def __init__(self, tiles: np.ndarray, char_offset: int = 0):
+        self.tiles = tiles
+        self.char_offset = char_offset
+
+    def __len__(self):
+        return len(self.tiles)
+
+    @staticmethod
+    def cache_path(char_file: str, digest: str) -> str:
+        base, _ = os.path.splitext(char_file)
+        return f"{base}.{digest}.tiles.npy"
+
+    @classmethod
+    def load(cls, char_file: str, char_offset: int = 0, cache: bool = True) -> 'TileBank':
+        """
+        Open the char bank for char_file, decoding it only if there's no cache
+        for these exact file contents yet.
+        """
+        with open(char_file, 'rb') as f:
+            chars = f.read()
+
+        if char_offset % CHAR_SIZE:
+            # not on a char boundary, so not a slice of the cached bank
+            return cls(decode_chars(chars, char_offset), char_offset)
+
+        if not cache:
+            return cls(decode_chars(chars)[char_offset // CHAR_SIZE:], char_offset)
+
+        digest = hashlib.sha1(chars).hexdigest()[:16]
+        path = cls.cache_path(char_file, digest)
+        if not os.path.exists(path):
+            # write under a temporary name so a concurrent run never maps half a file
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.save(f, decode_chars(chars))
+            os.replace(tmp_path, path)
+
+        tiles = np.load(path, mmap_mode='r')
+        return cls(tiles[char_offset // CHAR_SIZE:], char_offset)
+
+    def render_indexed(self, grid: np.ndarray, tile_mask: int = BANK_MASK) -> (np.ndarray, np.ndarray):
+        """
+        Render a (rows, cols) grid of map words into a uint16 array of palette
+        LUT indexes, 8 pixels per tile each way. Only the low 3 bits of each
+        pixel are used, as in the game's 3 bitplane chars.
+        - tile_mask: mask giving the char number (the palette group always
+          comes from tile_number & 0x1FFF)
+        Returns:
+          (indexed_pixels, invalid_tiles) where invalid_tiles is a (rows, cols)
+          bool array of tiles past the end of the char data
+        """
+        rows, cols = grid.shape
+        char_numbers = (grid & tile_mask).astype(np.intp)
+        invalid = char_numbers >= len(self.tiles)
+        group_base = ((grid & BANK_MASK) // CHARS_PER_PALETTE * COLORS_PER_PALETTE).astype(np.uint16)
+
+        # gather the 8x8 blocks, then interleave tile rows/columns into pixel rows
+        blocks = self.tiles[np.where(invalid, 0, char_numbers)] & 0x07
+        pixels = blocks.astype(np.uint16) | group_base[:, :, None, None]
+        pixels[invalid] = INVALID_INDEX
+        pixels = pixels.transpose(0, 2, 1, 3).reshape(rows * TILE_SIZE, cols * TILE_SIZE)
+        return pixels, invalid
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+tiled_export.py
+
+Exports a level map as a Tiled map (TMX or JSON) instead of a multi-megabyte
+RGBA strip: the level stays what it is, a grid of map words over the char
+set, and opens in Tiled (or any engine that reads its formats) straight away.
+
+  · tileset  - only the (char, palette group) combinations the level uses.
+               Both come from the tile number (word & 0x1FFF; the group is
+               tile // 64), so one np.unique over the masked words finds them
+               all, and its inverse is the whole layer's tile ids at once.
+               Tiles that draw nothing get id 0 (empty) and aren't in the image.
+               Each tileset tile keeps its tile number as a 'tile' property.
+  · layer    - one tile layer the width of all screens side by side, 32 high,
+               base64 + zlib encoded as Tiled does by default
+  · image    - the tileset PNG, written next to the map as <name>_tiles.png
+
+The priority bits (word >> 13) are left out, Tiled has nothing to put them in.
+
+Usage:
+    python tiled_export.py level1map.bin BG1.bin palettes_level1-3.pal level1.tmx
+    python tiled_export.py level4map.bin BG1.bin palettes_level4-5.pal level4.json --char-offset 20000
+"""
+
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+import zlib
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from image_writer import ImageWriter
+from level_map import LevelMap
+from tile_bank import TileBank, build_palette_lut, COLORS_PER_PALETTE, TILE_SIZE
+
+TILESET_COLUMNS = 32
+TILED_VERSION = "1.10"
+
+
+# =============================================================================
+# Tileset
+# =============================================================================
+
+def build_tileset(grid: np.ndarray, bank: TileBank, lut: np.ndarray, columns: int = TILESET_COLUMNS):
+    """
+    The tileset of a grid of map words.
+    Returns:
+      (tiles, image, gids): tile numbers in the tileset, its RGBA image
+      (columns tiles wide) and the grid's Tiled ids (0 = empty, first tile 1)
+    """
+    tile_numbers, inverse = np.unique(grid & 0x1FFF, return_inverse=True)
+    pixels, _ = bank.render_indexed(tile_numbers[None, :].astype(np.uint16))
+    blocks = pixels.reshape(TILE_SIZE, -1, TILE_SIZE).transpose(1, 0, 2)
+    drawn = (blocks % COLORS_PER_PALETTE != 0).any(axis=(1, 2))
+
+    # id per unique tile: empty ones 0, the rest numbered from 1 in tile order
+    ids = np.where(drawn, np.cumsum(drawn), 0).astype(np.uint32)
+    gids = ids[inverse.reshape(grid.shape)]
+
+    blocks = blocks[drawn]
+    rows = max((len(blocks) + columns - 1) // columns, 1)
+    sheet = np.zeros((rows * columns, TILE_SIZE, TILE_SIZE), dtype=blocks.dtype)
+    sheet[:len(blocks)] = blocks
+    sheet = sheet.reshape(rows, columns, TILE_SIZE, TILE_SIZE).transpose(0, 2, 1, 3)
+    image = lut[sheet.reshape(rows * TILE_SIZE, columns * TILE_SIZE)]
+    return tile_numbers[drawn], image, gids
+
+
+def encode_layer(gids: np.ndarray) -> str:
+    """Tiled's base64 + zlib layer data: little-endian uint32 ids, row by row."""
+    return base64.b64encode(zlib.compress(gids.astype('<u4').tobytes(), 9)).decode('ascii')
+
+
+# =============================================================================
+# Map files
+# =============================================================================
+
+def tileset_info(name: str, image_file: str, image: np.ndarray, tiles: np.ndarray, columns: int) -> dict:
+    return {
+        'firstgid': 1,
+        'name': name,
+        'tilewidth': TILE_SIZE,
+        'tileheight': TILE_SIZE,
+        'tilecount': len(tiles),
+        'columns': columns,
+        'image': image_file,
+        'imagewidth': image.shape[1],
+        'imageheight': image.shape[0],
+        'margin': 0,
+        'spacing': 0,
+        'tiles': [{'id': i, 'properties': [{'name': 'tile', 'type': 'int', 'value': int(tile)}]}
+                  for i, tile in enumerate(tiles)],
+    }
+
+
+def write_json(path: str, name: str, gids: np.ndarray, tileset: dict):
+    height, width = gids.shape
+    document = {
+        'type': 'map',
+        'version': TILED_VERSION,
+        'orientation': 'orthogonal',
+        'renderorder': 'right-down',
+        'width': width,
+        'height': height,
+        'tilewidth': TILE_SIZE,
+        'tileheight': TILE_SIZE,
+        'infinite': False,
+        'nextlayerid': 2,
+        'nextobjectid': 1,
+        'tilesets': [tileset],
+        'layers': [{
+            'id': 1,
+            'name': name,
+            'type': 'tilelayer',
+            'x': 0,
+            'y': 0,
+            'width': width,
+            'height': height,
+            'opacity': 1,
+            'visible': True,
+            'encoding': 'base64',
+            'compression': 'zlib',
+            'data': encode_layer(gids),
+        }],
+    }
+    with open(path, 'w') as f:
+        json.dump(document, f, indent=1)
+
+
+def write_tmx(path: str, name: str, gids: np.ndarray, tileset: dict):
+    height, width = gids.shape
+    root = ET.Element('map', version=TILED_VERSION, orientation='orthogonal', renderorder='right-down',
+                      width=str(width), height=str(height), tilewidth=str(TILE_SIZE), tileheight=str(TILE_SIZE),
+                      infinite='0', nextlayerid='2', nextobjectid='1')
+    ts = ET.SubElement(root, 'tileset', {key: str(tileset[key]) for key in
+                                         ('firstgid', 'name', 'tilewidth', 'tileheight', 'tilecount', 'columns')})
+    ET.SubElement(ts, 'image', source=tileset['image'], width=str(tileset['imagewidth']),
+                  height=str(tileset['imageheight']))
+    for tile in tileset['tiles']:
+        element = ET.SubElement(ts, 'tile', id=str(tile['id']))
+        properties = ET.SubElement(element, 'properties')
+        for prop in tile['properties']:
+            ET.SubElement(properties, 'property', name=prop['name'], type=prop['type'], value=str(prop['value']))
+    layer = ET.SubElement(root, 'layer', id='1', name=name, width=str(width), height=str(height))
+    data = ET.SubElement(layer, 'data', encoding='base64', compression='zlib')
+    data.text = encode_layer(gids)
+    ET.indent(root)
+    ET.ElementTree(root).write(path, encoding='UTF-8', xml_declaration=True)
+
+
+def export_tiled(map_file, char_file, palette_file, output_file, char_offset_hex="0", fmt=None,
+                 columns=TILESET_COLUMNS):
+    """
+    Write output_file (TMX or JSON, from the extension when fmt is None) and
+    its tileset image. Returns the paths written.
+    """
+    char_offset = int(char_offset_hex, 16)
+    if fmt is None:
+        fmt = 'json' if output_file.lower().endswith('.json') else 'tmx'
+    with open(palette_file, 'rb') as f:
+        lut = build_palette_lut(f.read())
+    level_map = LevelMap.load(map_file, char_offset)
+    if level_map.screens == 0:
+        raise ValueError(f"{map_file} holds no whole screen")
+    bank = TileBank.load(char_file, char_offset)
+
+    name = os.path.splitext(os.path.basename(output_file))[0]
+    image_path = os.path.join(os.path.dirname(output_file), f"{name}_tiles.png")
+
+    start = time.perf_counter()
+    grid = level_map.strip()
+    tiles, image, gids = build_tileset(grid, bank, lut, columns)
+    tileset = tileset_info(f"{name}_tiles", os.path.basename(image_path), image, tiles, columns)
+    with ImageWriter() as writer:
+        writer.save(image, image_path)
+        if fmt == 'json':
+            write_json(output_file, name, gids, tileset)
+        else:
+            write_tmx(output_file, name, gids, tileset)
+    elapsed = time.perf_counter() - start
+
+    size = os.path.getsize(output_file) + os.path.getsize(image_path)
+    pixels = grid.size * TILE_SIZE * TILE_SIZE * 4
+    print(f"{map_file}: {grid.shape[1]}x{grid.shape[0]} tiles, {len(tiles)} tileset tiles "
+          f"({int((gids == 0).sum())} cells empty)")
+    print(f"Wrote {output_file} + {image_path}: {size:,} bytes "
+          f"({size / pixels:.2%} of the {pixels:,} byte RGBA strip) in {elapsed * 1000:.1f} ms")
+    return output_file, image_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export a level map as a Tiled TMX/JSON map with its tileset')
+    parser.add_argument('map_bin', help='Level map binary (levelNmap.bin)')
+    parser.add_argument('char_bin', help='Character data (BG1.bin)')
+    parser.add_argument('palette_pal', help='8-bit RGB palette file')
+    parser.add_argument('output', help='Output .tmx or .json (the tileset PNG is written next to it)')
+    parser.add_argument('--map-format', choices=['tmx', 'json'], help='Map format (default: from extension)')
+    parser.add_argument('--char-offset', default="0", help='Character file offset in hex (default: 0)')
+    parser.add_argument('--columns', type=int, default=TILESET_COLUMNS,
+                        help=f'Tiles per row of the tileset image (default: {TILESET_COLUMNS})')
+    args = parser.parse_args()
+
+    try:
+        export_tiled(args.map_bin, args.char_bin, args.palette_pal, args.output, args.char_offset,
+                     args.map_format, args.columns)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
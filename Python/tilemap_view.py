@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+tilemap_view.py
+
+A frame renderer that works like the System 16 tilemap hardware instead of
+drawing a finished PNG: two layers (foreground over background), each a plane
+of 2x2 pages picked by four page registers, and an X/Y scroll register per
+layer. A page is 64x32 tiles (512x256 pixels), the same shape as one screen
+of a levelNmap.bin, so the screens of a level are the pages.
+
+  · plane      - each layer keeps its 1024x512 plane pre-rendered as palette
+                 LUT indexes, padded on the right and bottom with a copy of its
+                 left and top edges (one frame's worth), so the window at any
+                 scroll position is a plain slice: no wrap-around, no copy
+  · pages      - changing a page register re-renders that quarter of the plane
+                 and nothing else; writing one map word re-renders one tile.
+                 Scrolling through a level swaps in the next screen the way the
+                 game does, a page at a time, while the window just moves
+  · frames     - 320x224: the background window, the opaque pixels of the
+                 foreground window over it (np.copyto with a mask kept next to
+                 the plane), then one uint32 palette gather, all into buffers
+                 allocated once
+
+Priority bits are not modelled, the foreground is always on top.
+
+Modes:
+  · --benchmark  - scroll through the level and report frames per second
+  · --dump       - raw RGB24/RGBA frames to a file or stdout ("-") for ffmpeg
+  · --snapshot   - one frame as a PNG
+  · --window     - play the level in a Tk window (needs tkinter)
+
+Usage:
+    python tilemap_view.py level1map.bin BG1.bin palettes_level1-3.pal --benchmark
+    python tilemap_view.py level1map.bin BG1.bin palettes_level1-3.pal --background level2map.bin --parallax 0.5 --window
+    python tilemap_view.py level4map.bin BG1.bin palettes_level4-5.pal --char-offset 20000 --snapshot frame.png --x 1200
+    python tilemap_view.py level1map.bin BG1.bin palettes_level1-3.pal --dump - | ffmpeg -f rawvideo -pix_fmt rgb24 -s 320x224 -r 60 -i - level1.mp4
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from tile_bank import TileBank, build_palette_lut, BANK_MASK, COLORS_PER_PALETTE, TILE_SIZE
+from level_map import LevelMap, SCREEN_WIDTH, SCREEN_HEIGHT
+from scroll_export import FRAME_WIDTH, FRAME_HEIGHT, FRAME_RATE
+
+PAGE_WIDTH = SCREEN_WIDTH * TILE_SIZE      # 512 pixels
+PAGE_HEIGHT = SCREEN_HEIGHT * TILE_SIZE    # 256
+PLANE_WIDTH = PAGE_WIDTH * 2
+PLANE_HEIGHT = PAGE_HEIGHT * 2
+QUADRANTS = ((0, 0), (0, 1), (1, 0), (1, 1))   # (row, column) of the page each register selects
+BLANK_PAGE = -1
+
+
+# =============================================================================
+# One layer
+# =============================================================================
+
+class Layer:
+    """
+    A tilemap layer: page registers, scroll registers and the pre-rendered plane.
+    - pages: (n, 32, 64) map words, one page each (a LevelMap's words)
+    - plane: (512 + 224, 1024 + 320) uint16 LUT indexes, edges repeated
+    - opaque: bool mask of the plane, False where the colour is transparent
+    - page_renders / tile_renders: how much re-rendering the updates needed
+    """
+
+    def __init__(self, pages: np.ndarray, bank: TileBank, tile_mask: int = BANK_MASK):
+        self.pages = np.array(pages, dtype=np.uint16)
+        self.bank = bank
+        self.tile_mask = tile_mask
+        self.select = [None] * len(QUADRANTS)
+        self.scroll_x = 0
+        self.scroll_y = 0
+        self.plane = np.zeros((PLANE_HEIGHT + FRAME_HEIGHT, PLANE_WIDTH + FRAME_WIDTH), dtype=np.uint16)
+        self.opaque = np.zeros(self.plane.shape, dtype=bool)
+        self.page_renders = 0
+        self.tile_renders = 0
+
+    def _store(self, y: int, x: int, pixels: np.ndarray):
+        """Put indexed pixels at (y, x) of the plane and into every padding copy of that spot."""
+        height, width = pixels.shape
+        opaque = pixels % COLORS_PER_PALETTE != 0   # colour 0 of every group and INVALID_INDEX
+        for dy in (0, PLANE_HEIGHT):
+            top, bottom = y + dy, min(y + dy + height, self.plane.shape[0])
+            if top >= bottom:
+                continue
+            for dx in (0, PLANE_WIDTH):
+                left, right = x + dx, min(x + dx + width, self.plane.shape[1])
+                if left >= right:
+                    continue
+                self.plane[top:bottom, left:right] = pixels[:bottom - top, :right - left]
+                self.opaque[top:bottom, left:right] = opaque[:bottom - top, :right - left]
+
+    def _render_page(self, page: int) -> np.ndarray:
+        if page == BLANK_PAGE or page >= len(self.pages):
+            return np.zeros((PAGE_HEIGHT, PAGE_WIDTH), dtype=np.uint16)
+        self.page_renders += 1
+        pixels, _ = self.bank.render_indexed(self.pages[page], self.tile_mask)
+        return pixels
+
+    def set_pages(self, select):
+        """Load the four page registers; only quadrants whose page changed are re-rendered."""
+        rendered = {}
+        for quadrant, page in enumerate(select):
+            if self.select[quadrant] == page:
+                continue
+            if page not in rendered:
+                rendered[page] = self._render_page(page)
+            row, col = QUADRANTS[quadrant]
+            self._store(row * PAGE_HEIGHT, col * PAGE_WIDTH, rendered[page])
+            self.select[quadrant] = page
+
+    def write_word(self, page: int, x: int, y: int, word: int):
+        """Change one map word and re-render its tile wherever that page is shown."""
+        self.pages[page, y, x] = word
+        pixels = None
+        for quadrant, selected in enumerate(self.select):
+            if selected != page:
+                continue
+            if pixels is None:
+                pixels, _ = self.bank.render_indexed(self.pages[page, y:y + 1, x:x + 1], self.tile_mask)
+                self.tile_renders += 1
+            row, col = QUADRANTS[quadrant]
+            self._store(row * PAGE_HEIGHT + y * TILE_SIZE, col * PAGE_WIDTH + x * TILE_SIZE, pixels)
+
+    def follow(self, x: int):
+        """
+        Point the page registers at the level screens under a window at level
+        x, like the game streaming a level through the plane: screen s goes in
+        column s % 2 of both page rows.
+        """
+        screen = x // PAGE_WIDTH
+        columns = {screen % 2: screen, (screen + 1) % 2: screen + 1}
+        self.set_pages([columns[col] if columns[col] < len(self.pages) else BLANK_PAGE
+                        for _, col in QUADRANTS])
+        self.scroll_x = x
+
+    def window(self) -> (np.ndarray, np.ndarray):
+        """The 320x224 views of the plane and its mask at the current scroll."""
+        y = self.scroll_y % PLANE_HEIGHT
+        x = self.scroll_x % PLANE_WIDTH
+        return (self.plane[y:y + FRAME_HEIGHT, x:x + FRAME_WIDTH],
+                self.opaque[y:y + FRAME_HEIGHT, x:x + FRAME_WIDTH])
+
+
+# =============================================================================
+# Frames
+# =============================================================================
+
+class Tilemap:
+    """Foreground over an optional background, composed into reused frame buffers."""
+
+    def __init__(self, foreground: Layer, lut: np.ndarray, background: Layer = None):
+        self.foreground = foreground
+        self.background = background
+        self.lut32 = np.ascontiguousarray(lut).view(np.uint32).reshape(-1)
+        self.indexed = np.zeros((FRAME_HEIGHT, FRAME_WIDTH), dtype=np.uint16)
+        self.rgba = np.zeros((FRAME_HEIGHT, FRAME_WIDTH), dtype=np.uint32)
+
+    def follow(self, x: int, parallax: float = 0.5):
+        self.foreground.follow(x)
+        if self.background is not None:
+            self.background.follow(int(x * parallax))
+
+    def render_indexed(self) -> np.ndarray:
+        """The frame as LUT indexes (a reused buffer)."""
+        pixels, opaque = self.foreground.window()
+        if self.background is None:
+            np.copyto(self.indexed, pixels)
+        else:
+            np.copyto(self.indexed, self.background.window()[0])
+            np.copyto(self.indexed, pixels, where=opaque)
+        return self.indexed
+
+    def render(self) -> np.ndarray:
+        """The frame as (224, 320, 4) RGBA (a view of a reused buffer)."""
+        np.take(self.lut32, self.render_indexed(), out=self.rgba)
+        return self.rgba.view(np.uint8).reshape(FRAME_HEIGHT, FRAME_WIDTH, 4)
+
+
+def load_layer(map_file: str, char_file: str, char_offset: int) -> Layer:
+    level_map = LevelMap.load(map_file, char_offset)
+    if level_map.screens == 0:
+        raise ValueError(f"{map_file} holds no whole screen")
+    return Layer(level_map.words, TileBank.load(char_file, char_offset))
+
+
+def scroll_positions(tilemap: Tilemap, speed: int) -> range:
+    return range(0, max(len(tilemap.foreground.pages) * PAGE_WIDTH - FRAME_WIDTH, 0) + 1, speed)
+
+
+def benchmark(tilemap: Tilemap, speed: int, parallax: float):
+    """Scroll through the level twice, indexed frames only and then with colours, and report fps."""
+    positions = scroll_positions(tilemap, speed)
+    for label, step in (('indexed', tilemap.render_indexed), ('rgba', tilemap.render)):
+        layer = tilemap.foreground
+        renders = layer.page_renders
+        start = time.perf_counter()
+        for x in positions:
+            tilemap.follow(x, parallax)
+            step()
+        elapsed = time.perf_counter() - start
+        fps = len(positions) / elapsed if elapsed else 0
+        print(f"{label:>8}: {len(positions)} frames in {elapsed:.3f} s, {fps:,.0f} fps "
+              f"({fps / FRAME_RATE:.1f}x real-time), {layer.page_renders - renders} page renders")
+
+
+def play_window(tilemap: Tilemap, speed: int, parallax: float, fps: int = FRAME_RATE):
+    """Scroll through the level in a Tk window, looping at the end."""
+    try:
+        import tkinter as tk
+    except ImportError:
+        print("Error: --window needs tkinter, use --dump or --snapshot instead")
+        sys.exit(1)
+
+    root = tk.Tk()
+    root.title("tilemap_view")
+    photo = tk.PhotoImage(width=FRAME_WIDTH, height=FRAME_HEIGHT)
+    tk.Label(root, image=photo, bd=0).pack()
+    header = f"P6 {FRAME_WIDTH} {FRAME_HEIGHT} 255\n".encode()
+    positions = scroll_positions(tilemap, speed)
+    state = {'frame': 0}
+
+    def tick():
+        start = time.perf_counter()
+        tilemap.follow(positions[state['frame'] % len(positions)], parallax)
+        rgb = tilemap.render()[:, :, :3]
+        photo.configure(data=header + rgb.tobytes(), format='PPM')
+        state['frame'] += 1
+        delay = 1000 / fps - (time.perf_counter() - start) * 1000
+        root.after(max(1, int(delay)), tick)
+
+    root.bind('<Escape>', lambda _: root.destroy())
+    tick()
+    root.mainloop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render level frames through a System 16 style tilemap')
+    parser.add_argument('map_bin', help='Foreground level map (levelNmap.bin)')
+    parser.add_argument('char_bin', help='Character data (BG1.bin)')
+    parser.add_argument('palette_pal', help='8-bit RGB palette file')
+    parser.add_argument('--char-offset', default="0", help='Character file offset in hex (default: 0)')
+    parser.add_argument('--background', help='Level map for the background layer')
+    parser.add_argument('--bg-char-offset', help='Char offset of the background (hex, default: --char-offset)')
+    parser.add_argument('--parallax', type=float, default=0.5,
+                        help='Background scroll per foreground pixel (default: 0.5)')
+    parser.add_argument('--speed', type=int, default=1, help='Scroll speed in pixels per frame (default: 1)')
+    parser.add_argument('--x', type=int, default=0, help='Scroll position for --snapshot (default: 0)')
+    parser.add_argument('--y', type=int, default=0, help='Vertical scroll of both layers (default: 0)')
+    parser.add_argument('--benchmark', action='store_true', help='Report frames per second')
+    parser.add_argument('--dump', help='Write raw frames to a file ("-" for stdout)')
+    parser.add_argument('--pix-fmt', choices=['rgb24', 'rgba'], default='rgb24', help='Raw frame pixel format')
+    parser.add_argument('--snapshot', help='Write the frame at --x as a PNG')
+    parser.add_argument('--window', action='store_true', help='Play the level in a window (tkinter)')
+    args = parser.parse_args()
+
+    if args.speed < 1:
+        parser.error("--speed must be at least 1")
+
+    try:
+        char_offset = int(args.char_offset, 16)
+        with open(args.palette_pal, 'rb') as f:
+            lut = build_palette_lut(f.read())
+        start = time.perf_counter()
+        foreground = load_layer(args.map_bin, args.char_bin, char_offset)
+        background = None
+        if args.background:
+            bg_offset = int(args.bg_char_offset, 16) if args.bg_char_offset else char_offset
+            background = load_layer(args.background, args.char_bin, bg_offset)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    tilemap = Tilemap(foreground, lut, background)
+    for layer in (foreground, background):
+        if layer is not None:
+            layer.scroll_y = args.y
+    tilemap.follow(args.x, args.parallax)
+    log = sys.stderr if args.dump == '-' else sys.stdout
+    print(f"{len(foreground.pages)} foreground pages"
+          + (f", {len(background.pages)} background pages" if background else "")
+          + f", first frame ready in {(time.perf_counter() - start) * 1000:.1f} ms", file=log)
+
+    if args.snapshot:
+        from image_writer import ImageWriter
+        with ImageWriter() as writer:
+            output = writer.save(tilemap.render().copy(), args.snapshot)
+        print(f"Frame at x={args.x} saved to {output}", file=log)
+
+    if args.dump:
+        positions = scroll_positions(tilemap, args.speed)
+        to_stdout = args.dump == '-'
+        fp = sys.stdout.buffer if to_stdout else open(args.dump, 'wb')
+        start = time.perf_counter()
+        try:
+            for x in positions:
+                tilemap.follow(x, args.parallax)
+                rgba = tilemap.render()
+                fp.write((rgba if args.pix_fmt == 'rgba' else rgba[:, :, :3]).tobytes())
+        finally:
+            if not to_stdout:
+                fp.close()
+        elapsed = time.perf_counter() - start
+        print(f"Wrote {len(positions)} {args.pix_fmt} frames to {args.dump} in {elapsed:.2f} s", file=log)
+
+    if args.benchmark:
+        benchmark(tilemap, args.speed, args.parallax)
+
+    if args.window:
+        play_window(tilemap, args.speed, args.parallax)
+
+
+if __name__ == '__main__':
+    main()
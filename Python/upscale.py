@@ -0,0 +1,159 @@
+"""
+upscale.py
+
+Upscaling of indexed pixels (palette LUT indexes, before the colours are
+looked up), so renderers can write 2x/3x/4x images directly and the palette
+gather runs once, on the final array.
+
+  · nearest - any whole factor, every pixel repeated factor x factor times
+  · epx     - Scale2x/Scale3x (AdvMAME2x/3x): each pixel becomes 2x2 or 3x3 and
+              corners take a neighbour's colour where two neighbours agree,
+              which rounds off diagonal edges without inventing colours.
+              4x is Scale2x twice.
+
+The EPX rules compare neighbours as whole shifted arrays, no per-pixel loop.
+Transparent entries of the LUT (colour 0 of every group, 0 and 15 of sprites)
+can be passed in so they all compare equal, as they all draw the same.
+
+The palette lookup gathers whole RGBA pixels as uint32 (about 3x faster than
+indexing the (n, 4) LUT). For nearest it's cheaper still to look the colours
+up at 1x and repeat the uint32 pixels, so render_scaled() does that; epx has
+to compare indexes, so there the lookup runs on the upscaled array.
+
+Usage (from another script):
+    pixels, invalid = bank.render_indexed(grid)
+    rgba = render_scaled(pixels, palette_lut, 3, 'epx')
+"""
+
+import numpy as np
+
+SCALERS = ('nearest', 'epx')
+
+
+# =============================================================================
+# Scalers
+# =============================================================================
+
+def nearest(pixels: np.ndarray, factor: int) -> np.ndarray:
+    """Repeat every pixel factor x factor times (one copy, via a broadcast view)."""
+    height, width = pixels.shape
+    view = np.broadcast_to(pixels[:, None, :, None], (height, factor, width, factor))
+    return view.reshape(height * factor, width * factor)
+
+
+def neighbours(pixels: np.ndarray) -> dict:
+    """
+    The 3x3 neighbourhood of every pixel as shifted views, edges repeated:
+        A B C
+        D E F
+        G H I
+    """
+    padded = np.pad(pixels, 1, mode='edge')
+    height, width = pixels.shape
+    names = 'ABCDEFGHI'
+    return {names[dy * 3 + dx]: padded[dy:dy + height, dx:dx + width] for dy in range(3) for dx in range(3)}
+
+
+def interleave(blocks: list, factor: int) -> np.ndarray:
+    """Put factor*factor (h, w) sub-pixel arrays together as one (h*factor, w*factor) array."""
+    height, width = blocks[0].shape
+    out = np.empty((height * factor, width * factor), dtype=blocks[0].dtype)
+    for i, block in enumerate(blocks):
+        out[i // factor::factor, i % factor::factor] = block
+    return out
+
+
+def scale2x(pixels: np.ndarray, keys: np.ndarray = None) -> np.ndarray:
+    """
+    Scale2x of an indexed image. `keys` (same shape) is what's compared, the
+    colours come from `pixels`; by default they're the same.
+    """
+    if keys is None:
+        keys = pixels
+    k, v = neighbours(keys), neighbours(pixels)
+    B, D, F, H = k['B'], k['D'], k['F'], k['H']
+    core = (B != H) & (D != F)
+    e0 = np.where(core & (D == B), v['D'], pixels)
+    e1 = np.where(core & (B == F), v['F'], pixels)
+    e2 = np.where(core & (D == H), v['D'], pixels)
+    e3 = np.where(core & (H == F), v['F'], pixels)
+    return interleave([e0, e1, e2, e3], 2)
+
+
+def scale3x(pixels: np.ndarray, keys: np.ndarray = None) -> np.ndarray:
+    """Scale3x of an indexed image, `keys` as for scale2x."""
+    if keys is None:
+        keys = pixels
+    k, v = neighbours(keys), neighbours(pixels)
+    A, B, C, D, E, F, G, H, I = (k[name] for name in 'ABCDEFGHI')
+    core = (B != H) & (D != F)
+    db, bf, dh, hf = core & (D == B), core & (B == F), core & (D == H), core & (H == F)
+    blocks = [
+        np.where(db, v['D'], pixels),
+        np.where((db & (E != C)) | (bf & (E != A)), v['B'], pixels),
+        np.where(bf, v['F'], pixels),
+        np.where((db & (E != G)) | (dh & (E != A)), v['D'], pixels),
+        pixels,
+        np.where((bf & (E != I)) | (hf & (E != C)), v['F'], pixels),
+        np.where(dh, v['D'], pixels),
+        np.where((dh & (E != I)) | (hf & (E != G)), v['H'], pixels),
+        np.where(hf, v['F'], pixels),
+    ]
+    return interleave(blocks, 3)
+
+
+def check_scale(factor: int, scaler: str):
+    """Raise ValueError for a factor/scaler pair upscale() can't do, so renderers can check up front."""
+    if factor < 1:
+        raise ValueError(f"Scale must be 1 or more, got {factor}")
+    if scaler not in SCALERS:
+        raise ValueError(f"Unknown scaler '{scaler}', expected one of {', '.join(SCALERS)}")
+    if scaler == 'epx' and factor not in (1, 2, 3, 4):
+        raise ValueError(f"The epx scaler does 2x, 3x or 4x, not {factor}x")
+
+
+def upscale(pixels: np.ndarray, factor: int, scaler: str = 'nearest', transparent: np.ndarray = None) -> np.ndarray:
+    """
+    Upscale a (height, width) array of LUT indexes.
+    - factor: 1 returns the array as it is; epx takes 2, 3 or 4
+    - transparent: optional bool per LUT entry, True where it draws nothing;
+      epx then treats all of those as the same colour
+    """
+    check_scale(factor, scaler)
+    if factor == 1:
+        return pixels
+    if scaler == 'nearest':
+        return nearest(pixels, factor)
+
+    keys = None
+    if transparent is not None:
+        keys = np.where(transparent[pixels], -1, pixels.astype(np.int32))
+    if factor == 3:
+        return scale3x(pixels, keys)
+    out = scale2x(pixels, keys)
+    if factor == 4:
+        out = scale2x(out, None if keys is None else scale2x(keys))
+    return out
+
+
+def colorize(pixels: np.ndarray, lut: np.ndarray) -> np.ndarray:
+    """lut[pixels] for an (n, 4) uint8 LUT, gathered as uint32."""
+    lut32 = np.ascontiguousarray(lut).view(np.uint32).reshape(-1)
+    return np.take(lut32, pixels).view(np.uint8).reshape(*pixels.shape, 4)
+
+
+def render_scaled(pixels: np.ndarray, lut: np.ndarray, factor: int = 1, scaler: str = 'nearest') -> np.ndarray:
+    """RGBA of an indexed image upscaled by factor, whichever order is cheaper."""
+    check_scale(factor, scaler)
+    if scaler == 'nearest':
+        rgba = colorize(pixels, lut)
+        return nearest(rgba.view(np.uint32)[..., 0], factor).view(np.uint8).reshape(
+            pixels.shape[0] * factor, pixels.shape[1] * factor, 4)
+    return colorize(upscale(pixels, factor, scaler, lut[:, 3] == 0), lut)
+
+
+def add_scale_arguments(parser):
+    """The --scale and --scaler options every renderer takes."""
+    parser.add_argument('--scale', type=int, default=1, help='Upscale the output by this whole factor (default: 1)')
+    parser.add_argument('--scaler', choices=SCALERS, default='nearest',
+                        help='nearest (any factor) or epx (Scale2x/3x, 2-4) (default: nearest)')
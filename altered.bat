@@ -0,0 +1 @@
+@python "%~dp0Python\altered.py" %*
@@ -36,59 +36,14 @@ REM Note levels4 & 5 both re-programme the memory controller so the offset to th
 python python\map_renderer_offset.py level4map.bin BG1.bin palettes_level4-5.pal Level4 20000
 python python\map_renderer_offset.py level5map.bin BG1.bin palettes_level4-5.pal Level5 20000
 
-REM This generates a table of all small screen images used in game title, and beast transformation
-python python\tile_extractor.py code.bin misc_images 26c20 14
-
-python python\swapbytes.py misc_images_1_20x20.bin 01
-python python\swapbytes.py misc_images_2_20x20.bin 01
-python python\swapbytes.py misc_images_3_20x20.bin 01
-python python\swapbytes.py misc_images_4_20x20.bin 01
-python python\swapbytes.py misc_images_5_20x18.bin 01
-python python\swapbytes.py misc_images_6_20x18.bin 01
-python python\swapbytes.py misc_images_7_24x18.bin 01
-python python\swapbytes.py misc_images_8_12x18.bin 01
-python python\swapbytes.py misc_images_9_14x18.bin 01
-python python\swapbytes.py misc_images_10_20x15.bin 01
-python python\swapbytes.py misc_images_11_10x15.bin 01
-python python\swapbytes.py misc_images_12_24x13.bin 01
-python python\swapbytes.py misc_images_13_20x20.bin 01
-python python\swapbytes.py misc_images_14_20x20.bin 01
-
-python python\generic_plotter.py misc_images_1_20x20.bin BG1.bin palettes_level1-3.pal tile1.png 20
-python python\generic_plotter.py misc_images_2_20x20.bin BG1.bin palettes_level1-3.pal tile2.png 20
-python python\generic_plotter.py misc_images_3_20x20.bin BG1.bin palettes_level1-3.pal tile3.png 20
-python python\generic_plotter.py misc_images_4_20x20.bin BG1.bin palettes_level1-3.pal tile4.png 20
-python python\generic_plotter.py misc_images_5_20x18.bin BG1.bin palettes_level1-3.pal tile5.png 20
-python python\generic_plotter.py misc_images_6_20x18.bin BG1.bin palettes_level1-3.pal tile6.png 20
-python python\generic_plotter.py misc_images_7_24x18.bin BG1.bin palettes_level1-3.pal tile7.png 24
-python python\generic_plotter.py misc_images_8_12x18.bin BG1.bin palettes_level1-3.pal tile8.png 12
-python python\generic_plotter.py misc_images_9_14x18.bin BG1.bin palettes_level1-3.pal tile9.png 14
-python python\generic_plotter.py misc_images_10_20x15.bin BG1.bin palettes_level1-3.pal tile10.png 20
-python python\generic_plotter.py misc_images_11_10x15.bin BG1.bin palettes_level1-3.pal tile11.png 10
-python python\generic_plotter.py misc_images_12_24x13.bin BG1.bin palettes_level1-3.pal green_eyeball.png 24
-python python\generic_plotter.py misc_images_13_20x20.bin BG1.bin palettes_level1-3.pal tile13.png 20
-python python\generic_plotter.py misc_images_14_20x20.bin BG1.bin palettes_level1-3.pal tile14.png 20
-
-python python\combine_images.py tile1.png tile2.png altered_logo.png
-python python\combine_images.py tile3.png tile4.png altered_logo_bg.png
-python python\combine_images.py tile5.png tile6.png tile7.png tile8.png tile9.png altered_eyeball.png
-python python\combine_images.py tile11.png tile10.png blue_eyeball.png
-
-python python\tile_extractor.py code.bin misc 28b84 2
-python python\swapbytes.py misc_1_20x20.bin 01
-python python\swapbytes.py misc_2_20x20.bin 01
-python python\generic_plotter.py misc_1_20x20.bin BG1.bin palettes_level1-3.pal tile1.png 20
-python python\generic_plotter.py misc_2_20x20.bin BG1.bin palettes_level1-3.pal tile2.png 20
-python python\combine_images.py tile1.png tile2.png mural_background.png
-
-REM when beast transforms into beast mode saved as low byte only single characters
-python python\savebit.py code.bin beast_front.bin 199a 320
-REM we create the high byte for character code, as they save only low byt to save memory!
-REM they use $a5 in code but we only need $25 below as the top bits are priority bits
-python python\dummy.py beast_high.bin 320 A5
-REM interleave the two to make 16-bit character map
-python python\merge-binaries.py beast_front.bin beast_high.bin beast_image_map.bin 01
-python python\generic_plotter.py beast_image_map.bin BG1.bin palettes_level1-3.pal beast.png 40
+REM Optional: a scrolling preview of a level as it moves across the 320x224 screen (.png = APNG, .gif, or raw frames)
+REM python python\scroll_export.py level1map.bin BG1.bin palettes_level1-3.pal level1_scroll.png --speed 2
+
+REM This generates all small screen images used in game title, and beast transformation
+REM misc_images.json lists every block (ROM offset, count, palette) and which ones get combined into each image
+REM it used to be one tile_extractor.py, swapbytes.py, generic_plotter.py and combine_images.py run per block, those still work on their own
+REM the beast is saved as low byte only single characters, they use $a5 in code for the high byte (top bits are priority bits)
+python python\misc_batch.py code.bin misc_images.json
 
 
 REM Build up palettes for Sprites, as they are in internal table
@@ -130,6 +85,8 @@ REM using mame developer tools to output a watchpint on the paletee routing, and
 REM we create a transparent 8-bit rgb image of all sprites with associated palette (almost perfectly)
 REM also if you load both into photoshop, there is the overlay of the sprite numbers, note image is big 4k size!
 python python\sprite_atlas_numbered.py code.bin swapped_all-sprites.bin sprite_palettes16.pal all_sprite_palettes.txt Altered_beast_sprites_pallette_all.png --overlay Altered_beast_sprites_palettes_all_overlay.png
+REM Optional: the same sprites as 2048x2048 pages plus Altered_beast_sprites_pages.json listing page, rect and ROM offset of each sprite/palette
+REM python python\sprite_atlas_numbered.py code.bin swapped_all-sprites.bin sprite_palettes16.pal all_sprite_palettes.txt Altered_beast_sprites_pages.png --page-size 2048
 
 
 REM Deletes all the working files which as not needed removed below if you want to keep them to look at.
@@ -145,6 +102,7 @@ del beast_*.bin
 del palettes_level*.pal
 del code.bin
 del BG1.BIN
+del BG1.*.tiles.npy
 del sprite*.*
 del all-sprites.bin
 del sprites*.bin